@@ -0,0 +1,17 @@
+# adk_server.py — the `adk` CLI with the sqlitewal:// session service registered
+#   python adk_server.py api_server . --session_service_uri sqlitewal:///tmp/farmagent/sessions.sqlite
+# Same arguments as `adk`; without --session_service_uri sessions stay in memory.
+# STUB_LLM=true swaps the model for src/agent/stubs.StubLlm (replay / load tests).
+import os
+
+from google.adk.cli.cli_tools_click import main
+
+from src.agent.session_store import register
+
+register()
+if os.getenv("STUB_LLM", "false").lower() == "true":
+    from src.agent.stubs import install_llm
+    install_llm()
+
+if __name__ == "__main__":
+    main()
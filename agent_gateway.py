@@ -1,13 +1,22 @@
 # agent_gateway.py — ADK connector (Cloud Run–safe, no proxy inheritance)
-import os, json, base64, mimetypes
+import os, json, time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 import requests
 from pathlib import Path
 
+from frontend.streaming import JSONStreamBody, inline_image
+from src.agent.journal import record_turn
+
 ADK_SERVER_URL = os.getenv("ADK_SERVER_URL", "http://127.0.0.1:8000").rstrip("/")
 APP_NAME   = os.getenv("ADK_APP", "src").split(".", 1)[0]
 USER_ID    = os.getenv("ADK_USER_ID", "user")
 SESSION_ID = os.getenv("ADK_SESSION_ID", "s_cloud")
+ADK_STREAMING = os.getenv("ADK_STREAMING", "false").lower() == "true"
+MAX_IMAGES    = int(os.getenv("MAX_IMAGES", "8"))
+INLINE_MAX_PX = int(os.getenv("INLINE_MAX_PX", "1024"))
+_INLINE_POOL  = ThreadPoolExecutor(max_workers=MAX_IMAGES or 1, thread_name_prefix="inline")
+PHASH_SKIP_INLINE = os.getenv("PHASH_SKIP_INLINE", "true").lower() == "true"
 
 SESSION = requests.Session()
 SESSION.trust_env = False
@@ -66,7 +75,7 @@ def _normalize_events(events: List[dict]) -> dict:
             errors.append({"code": e.get("errorCode"), "message": e.get("errorMessage") or e.get("errorCode")})
 
         content = e.get("content"); author = e.get("author")
-        if isinstance(content, dict):
+        if isinstance(content, dict) and not e.get("partial"):
             for p in content.get("parts", []):
                 if isinstance(p, dict) and "text" in p:
                     messages.append({"who": "assistant", "author": author, "text": p["text"]})
@@ -104,6 +113,7 @@ def _normalize_events(events: List[dict]) -> dict:
             "tool_calls": len(tool_calls),
             "receipts": receipts_count,
             "gen_time_ms": gen_time_ms,
+            "invocation_id": next((e["invocationId"] for e in events if e.get("invocationId")), None),
         },
     }
 
@@ -147,6 +157,7 @@ def _build_synth_receipts(norm: dict) -> List[dict]:
 def _aggregate(norm: dict) -> dict:
     plan_str, gov_log = "", []
     state_receipts = []
+    planner_stats = {}
 
     for sd in norm.get("state_updates", []):
         if isinstance(sd.get("current_plan"), str) and sd["current_plan"].strip():
@@ -155,6 +166,8 @@ def _aggregate(norm: dict) -> dict:
             gov_log.extend(sd["governor_log"])
         if isinstance(sd.get("receipts"), list):
             state_receipts = sd["receipts"]
+        if isinstance(sd.get("planner_stats"), dict):
+            planner_stats = sd["planner_stats"]
 
     rows = _flatten_run_plan_receipts(norm.get("tool_calls", []))
     if not rows and state_receipts:
@@ -176,34 +189,52 @@ def _aggregate(norm: dict) -> dict:
         "final_output": final_out or "...",
         "governor_log": gov_log or [],
         "receipts": rows or [],
-        "metrics": norm.get("metrics", {}),
+        "metrics": {**norm.get("metrics", {}), "planner_iterations": planner_stats.get("iterations", 0)},
         "error": err,
     }
 
-def _new_message_parts(query: str, image_uri: Optional[str]) -> List[dict]:
-    parts = [{"text": query or ""}]
-    if not image_uri:
-        return parts
-
+def _inline_part(image_uri: str) -> dict:
     p: Optional[Path] = None
     if image_uri.startswith("file://"):
         p = Path(image_uri.replace("file://", ""))
     elif image_uri.startswith("/"):
         p = Path(image_uri)
-    if p and p.exists():
-        parts.append({
-            "inlineData": {
-                "mimeType": mimetypes.guess_type(str(p))[0] or "image/jpeg",
-                "data": base64.b64encode(p.read_bytes()).decode("ascii"),
-            }
-        })
+    if not (p and p.exists()):
+        return {"text": f"(Attached: {image_uri})"}
+    if PHASH_SKIP_INLINE:
+        # Already diagnosed near-duplicate: a text note instead of image bytes
+        try:
+            from src.agent.vision.phash import lookup_file
+            hit = lookup_file(str(p))
+        except Exception:
+            hit = None
+        if hit and hit.get("probs") and not hit.get("heuristic", True):   # trained diagnoses only
+            k = max(range(len(hit["probs"])), key=hit["probs"].__getitem__)
+            return {"text": f"(Attached: {image_uri} — near-duplicate of an earlier photo, "
+                            f"diagnosed {hit['labels'][k]} at confidence {hit['probs'][k]:.2f})"}
+    return inline_image(p, INLINE_MAX_PX)
+
+def _new_message_parts(query: str, image_uris: List[str]) -> List[dict]:
+    parts = [{"text": query or ""}]
+    if len(image_uris) > 1:
+        parts.extend(_INLINE_POOL.map(_inline_part, image_uris))
     else:
-        parts.append({"text": f"(Attached: {image_uri})"})
+        parts.extend(_inline_part(u) for u in image_uris)
     return parts
 
 def _post_events(payload: dict, prefer_sse: bool) -> dict:
+    body = JSONStreamBody(payload)
+    if payload.get("streaming"):
+        try:
+            rs = SESSION.post(f"{ADK_SERVER_URL}/run_sse", data=body, stream=True, timeout=None)
+            if rs.ok:
+                text = "\n".join(line for line in rs.iter_lines(decode_unicode=True) if line)
+                return _aggregate(_normalize_events(_parse_sse(text)))
+        except Exception:
+            pass
+
     try:
-        r = SESSION.post(f"{ADK_SERVER_URL}/run", json=payload, timeout=120)
+        r = SESSION.post(f"{ADK_SERVER_URL}/run", data=body, timeout=120)
         if r.ok:
             data = r.json() if r.headers.get("content-type", "").startswith("application/json") else json.loads(r.text or "[]")
             return _aggregate(_normalize_events(data))
@@ -213,30 +244,42 @@ def _post_events(payload: dict, prefer_sse: bool) -> dict:
         pass
 
     try:
-        rs = SESSION.post(f"{ADK_SERVER_URL}/run_sse", json=payload, stream=True, timeout=None)
+        rs = SESSION.post(f"{ADK_SERVER_URL}/run_sse", data=body, stream=True, timeout=None)
         if rs.ok:
             text = "\n".join(line for line in rs.iter_lines(decode_unicode=True) if line)
             return _aggregate(_normalize_events(_parse_sse(text)))
     except Exception:
         pass
 
-    r2 = SESSION.post(f"{ADK_SERVER_URL}/run", json=payload, timeout=240)
+    r2 = SESSION.post(f"{ADK_SERVER_URL}/run", data=body, timeout=240)
     if r2.ok:
         data = r2.json() if r2.headers.get("content-type", "").startswith("application/json") else json.loads(r2.text or "[]")
         return _aggregate(_normalize_events(data))
     r2.raise_for_status()
 
-def run_agent_once(query: str, image_uri: Optional[str] = None, prefer_sse: bool = False) -> dict:
+def run_agent_once(query: str, image_uri: Optional[str] = None, prefer_sse: bool = False,
+                   image_uris: Optional[List[str]] = None) -> dict:
+    uris = list(dict.fromkeys(u for u in (image_uris or [image_uri]) if u))[:MAX_IMAGES]
     payload = {
         "app_name": APP_NAME,
         "user_id": USER_ID,
         "session_id": SESSION_ID,
-        "new_message": {"role": "user", "parts": _new_message_parts(query, image_uri)},
-        "streaming": False,
+        "new_message": {"role": "user", "parts": _new_message_parts(query, uris)},
+        "state_delta": {"image_uris": uris, "uploaded_image_uri": uris[0] if uris else None},
+        "streaming": ADK_STREAMING,
     }
-    return _post_events(payload, prefer_sse=bool(image_uri) or prefer_sse)
+    t0, out, err = time.perf_counter(), None, None
+    try:
+        out = _post_events(payload, prefer_sse=bool(uris) or prefer_sse)
+        return out
+    except Exception as e:
+        err = e
+        raise
+    finally:
+        record_turn("gateway", t0, out, err, session_id=SESSION_ID, images=len(uris))
 
-def run_once(*, query: str, image_uri: Optional[str] = None, prefer_sse: bool = False) -> dict:
-    return run_agent_once(query=query, image_uri=image_uri, prefer_sse=prefer_sse)
+def run_once(*, query: str, image_uri: Optional[str] = None, prefer_sse: bool = False,
+             image_uris: Optional[List[str]] = None) -> dict:
+    return run_agent_once(query=query, image_uri=image_uri, prefer_sse=prefer_sse, image_uris=image_uris)
 
 __all__ = ["ensure_session", "run_agent_once", "run_once"]
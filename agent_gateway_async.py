@@ -0,0 +1,282 @@
+# agent_gateway_async.py — asyncio ADK connector + ASGI entry point
+#
+# Same contract as agent_gateway.py (ensure_session / run_agent_once / streaming),
+# but on one pooled httpx.AsyncClient with keep-alive (optionally HTTP/2), so a
+# few event-loop workers can hold hundreds of in-flight agent turns:
+#   uvicorn agent_gateway_async:app --port 8090 --workers 2
+import os, json, time, asyncio, contextlib, importlib.util
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from frontend.streaming import JSONStreamBody
+from frontend.warmup import KEEPALIVE_S, WARMUP, WARMUP_CONNECTIONS
+from src.agent.journal import record_turn
+from agent_gateway import (
+    ADK_SERVER_URL, APP_NAME, USER_ID, SESSION_ID, ADK_STREAMING, DEFAULT_STATE, MAX_IMAGES,
+    _aggregate, _new_message_parts, _normalize_events, _parse_sse,
+)
+
+ADK_POOL_SIZE      = int(os.getenv("ADK_POOL_SIZE", "200"))          # max concurrent connections to ADK
+ADK_POOL_KEEPALIVE = int(os.getenv("ADK_POOL_KEEPALIVE", "50"))      # idle connections kept open
+ADK_HTTP2          = os.getenv("ADK_HTTP2", "false").lower() == "true"
+ADK_RUN_TIMEOUT_S  = float(os.getenv("ADK_RUN_TIMEOUT_S", "240"))
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def client() -> httpx.AsyncClient:
+    """Process-wide pooled client (created on first use inside the running loop)."""
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        # HTTP/2 needs the optional 'h2' package (pip install httpx[http2]); HTTP/1.1 otherwise
+        http2 = ADK_HTTP2 and importlib.util.find_spec("h2") is not None
+        _CLIENT = httpx.AsyncClient(
+            base_url=ADK_SERVER_URL,
+            http2=http2,
+            trust_env=False,
+            limits=httpx.Limits(max_connections=ADK_POOL_SIZE, max_keepalive_connections=ADK_POOL_KEEPALIVE),
+            timeout=httpx.Timeout(ADK_RUN_TIMEOUT_S, connect=10.0),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+    return _CLIENT
+
+
+async def aclose() -> None:
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
+async def ensure_session() -> Dict[str, Any]:
+    r = await client().post(f"/apps/{APP_NAME}/users/{USER_ID}/sessions/{SESSION_ID}",
+                            json={"state": DEFAULT_STATE}, timeout=10)
+    r.raise_for_status()
+    return r.json()
+
+
+async def _payload(query: str, image_uris: List[str]) -> dict:
+    # Reading / downscaling images is blocking file + Pillow work: keep it off the loop
+    parts = await asyncio.to_thread(_new_message_parts, query, image_uris)
+    return {
+        "app_name": APP_NAME,
+        "user_id": USER_ID,
+        "session_id": SESSION_ID,
+        "new_message": {"role": "user", "parts": parts},
+        "state_delta": {"image_uris": image_uris, "uploaded_image_uri": image_uris[0] if image_uris else None},
+        "streaming": ADK_STREAMING,
+    }
+
+
+async def stream_events(payload: dict) -> AsyncIterator[dict]:
+    """ADK events from /run_sse as they arrive (one parsed JSON object per SSE event)."""
+    body = JSONStreamBody(payload)
+    # aiter(): httpx picks a sync iterator over an async one, and AsyncClient only sends async bodies
+    async with client().stream("POST", "/run_sse", content=aiter(body), headers=body.headers(),
+                               timeout=httpx.Timeout(None, connect=10.0)) as rs:
+        rs.raise_for_status()
+        data = ""
+        async for line in rs.aiter_lines():
+            if line.startswith("data:"):
+                data += line[5:].strip()
+            elif not line.strip() and data:
+                try:
+                    yield json.loads(data)
+                except json.JSONDecodeError:
+                    pass
+                data = ""
+        if data:
+            try:
+                yield json.loads(data)
+            except json.JSONDecodeError:
+                pass
+
+
+async def _collect(payload: dict) -> dict:
+    return _aggregate(_normalize_events([e async for e in stream_events(payload)]))
+
+
+async def _post_events(payload: dict, prefer_sse: bool) -> dict:
+    """Mirrors agent_gateway._post_events: streaming first when enabled, /run, then /run_sse."""
+    body = JSONStreamBody(payload)
+    if payload.get("streaming"):
+        try:
+            return await _collect(payload)
+        except Exception:
+            pass
+
+    try:
+        r = await client().post("/run", content=aiter(body), headers=body.headers(), timeout=120)
+        if r.is_success:
+            data = r.json() if r.headers.get("content-type", "").startswith("application/json") else json.loads(r.text or "[]")
+            return _aggregate(_normalize_events(data))
+        if r.status_code not in (404, 405):
+            r.raise_for_status()
+    except Exception:
+        pass
+
+    try:
+        return await _collect(payload)
+    except Exception:
+        pass
+
+    r2 = await client().post("/run", content=aiter(body), headers=body.headers(), timeout=ADK_RUN_TIMEOUT_S)
+    r2.raise_for_status()
+    data = r2.json() if r2.headers.get("content-type", "").startswith("application/json") else _parse_sse(r2.text)
+    return _aggregate(_normalize_events(data))
+
+
+def _uris(image_uri: Optional[str], image_uris: Optional[List[str]]) -> List[str]:
+    return list(dict.fromkeys(u for u in (image_uris or [image_uri]) if u))[:MAX_IMAGES]
+
+
+async def run_agent_once(query: str, image_uri: Optional[str] = None, prefer_sse: bool = False,
+                         image_uris: Optional[List[str]] = None) -> dict:
+    uris = _uris(image_uri, image_uris)
+    t0, out, err = time.perf_counter(), None, None
+    try:
+        out = await _post_events(await _payload(query, uris), prefer_sse=bool(uris) or prefer_sse)
+        return out
+    except Exception as e:
+        err = e
+        raise
+    finally:
+        record_turn("gateway_async", t0, out, err, session_id=SESSION_ID, images=len(uris))
+
+
+async def run_once(*, query: str, image_uri: Optional[str] = None, prefer_sse: bool = False,
+                   image_uris: Optional[List[str]] = None) -> dict:
+    return await run_agent_once(query=query, image_uri=image_uri, prefer_sse=prefer_sse, image_uris=image_uris)
+
+
+# ---- ASGI entry point ---------------------------------------------------------
+_INFLIGHT = {"now": 0, "peak": 0, "total": 0}
+
+
+@contextlib.contextmanager
+def _track():
+    _INFLIGHT["now"] += 1  # single event loop per worker: no lock needed
+    _INFLIGHT["total"] += 1
+    _INFLIGHT["peak"] = max(_INFLIGHT["peak"], _INFLIGHT["now"])
+    try:
+        yield
+    finally:
+        _INFLIGHT["now"] -= 1
+
+
+async def _health(request: Request) -> JSONResponse:
+    """Liveness (always 200) with readiness alongside; /health/ready is the 503-until-warm probe."""
+    return JSONResponse({"ok": True, "live": True, "ready": _READY["ready"] or not WARMUP,
+                         "warmup_error": _READY["error"], "adk": ADK_SERVER_URL, "pool_size": ADK_POOL_SIZE,
+                         "http2": ADK_HTTP2 and importlib.util.find_spec("h2") is not None,
+                         "in_flight": _INFLIGHT["now"], "in_flight_peak": _INFLIGHT["peak"],
+                         "turns": _INFLIGHT["total"]})
+
+
+async def _ready(request: Request) -> JSONResponse:
+    ready = _READY["ready"] or not WARMUP
+    return JSONResponse({"ok": ready, "ready": ready, "error": _READY["error"]}, status_code=200 if ready else 503)
+
+
+async def _session(request: Request) -> JSONResponse:
+    try:
+        return JSONResponse({"ok": True, "session": await ensure_session()})
+    except Exception as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=502)
+
+
+async def _body(request: Request) -> Dict[str, Any]:
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return await request.json()
+    form = await request.form()
+    uris = json.loads(form.get("image_uris") or "[]")
+    return {"query": form.get("query"), "image_uris": uris, "image_uri": form.get("image_uri")}
+
+
+async def _run(request: Request) -> JSONResponse:
+    body = await _body(request)
+    try:
+        with _track():
+            out = await run_agent_once((body.get("query") or "").strip(), body.get("image_uri"),
+                                       image_uris=body.get("image_uris"))
+        return JSONResponse({"ok": True, **out})
+    except Exception as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=502)
+
+
+async def _run_sse(request: Request) -> StreamingResponse:
+    """Relays ADK events as they arrive, then one 'result' event with the aggregated turn."""
+    body = await _body(request)
+    payload = await _payload((body.get("query") or "").strip(), _uris(body.get("image_uri"), body.get("image_uris")))
+
+    async def relay() -> AsyncIterator[str]:
+        events: List[dict] = []
+        with _track():
+            try:
+                async for e in stream_events(payload):
+                    events.append(e)
+                    yield f"event: adk\ndata: {json.dumps(e)}\n\n"
+                yield f"event: result\ndata: {json.dumps(_aggregate(_normalize_events(events)), default=str)}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(relay(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+_READY = {"ready": False, "error": None}
+
+
+async def _warm_and_keepalive() -> None:
+    """Same warm-up as the Flask UI (frontend/warmup.py), as a task on this worker's loop."""
+    backoff = 1.0
+    while True:
+        try:
+            if not _READY["ready"]:
+                r = await client().post(f"/apps/{APP_NAME}/users/{USER_ID}/sessions/{SESSION_ID}",
+                                        json={"state": DEFAULT_STATE}, timeout=10)
+                if r.status_code not in (400, 409):   # 409: already exists
+                    r.raise_for_status()
+            # Concurrent pings open / keep WARMUP_CONNECTIONS pooled sockets
+            for r in await asyncio.gather(*(client().get("/list-apps", timeout=5)
+                                            for _ in range(max(1, WARMUP_CONNECTIONS)))):
+                r.raise_for_status()
+            _READY.update(ready=True, error=None)
+            backoff = 1.0
+        except Exception as e:
+            _READY.update(ready=False, error=f"{type(e).__name__}: {e}")
+        if not _READY["ready"]:
+            await asyncio.sleep(backoff)
+            backoff = min(30.0, backoff * 2)
+        elif KEEPALIVE_S > 0:
+            await asyncio.sleep(KEEPALIVE_S)
+        else:
+            return
+
+
+@contextlib.asynccontextmanager
+async def _lifespan(app: Starlette):
+    task = asyncio.create_task(_warm_and_keepalive()) if WARMUP else None
+    yield
+    if task:
+        task.cancel()
+    await aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/health", _health, methods=["GET"]),
+        Route("/health/ready", _ready, methods=["GET"]),
+        Route("/session", _session, methods=["POST"]),
+        Route("/run", _run, methods=["POST"]),
+        Route("/run_sse", _run_sse, methods=["POST"]),
+    ],
+    lifespan=_lifespan,
+)
+
+__all__ = ["app", "client", "ensure_session", "run_agent_once", "run_once", "stream_events"]
@@ -0,0 +1,124 @@
+# admission.py — adaptive concurrency limit + priority queue in front of ADK
+#
+# The in-flight limit follows observed ADK latency (gradient method): while the
+# short-term latency average stays within ADMIT_TOLERANCE of the unloaded baseline
+# (the best recent latency, drifting up slowly so a genuinely slower backend is
+# re-learned) the limit grows, when ADK queues up it shrinks proportionally, and
+# errors cut it by 10%. Requests beyond the limit wait in a short priority queue
+# (text-only turns ahead of image turns); once the queue is full or a wait times
+# out they are rejected at once with a Retry-After hint. All numbers are per
+# worker process.
+import heapq, itertools, math, os, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+ADMIT_INITIAL_LIMIT = float(os.getenv("ADMIT_INITIAL_LIMIT", "8"))
+ADMIT_MIN_LIMIT     = float(os.getenv("ADMIT_MIN_LIMIT", "2"))
+ADMIT_MAX_LIMIT     = float(os.getenv("ADMIT_MAX_LIMIT", "64"))
+ADMIT_QUEUE_MAX     = int(os.getenv("ADMIT_QUEUE_MAX", "16"))
+ADMIT_QUEUE_TIMEOUT_S = float(os.getenv("ADMIT_QUEUE_TIMEOUT_S", "10"))
+ADMIT_TOLERANCE     = float(os.getenv("ADMIT_TOLERANCE", "2.0"))   # latency / baseline ratio tolerated before shrinking
+ADMIT_BASELINE_DRIFT = float(os.getenv("ADMIT_BASELINE_DRIFT", "0.005"))  # upward drift of the baseline, per second
+
+PRIORITY_TEXT, PRIORITY_IMAGE = 0, 1
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status, self.reason, self.retry_after = status, reason, retry_after
+
+
+class AdmissionController:
+    def __init__(self, initial: float = ADMIT_INITIAL_LIMIT, min_limit: float = ADMIT_MIN_LIMIT,
+                 max_limit: float = ADMIT_MAX_LIMIT, queue_max: int = ADMIT_QUEUE_MAX,
+                 queue_timeout_s: float = ADMIT_QUEUE_TIMEOUT_S):
+        self.limit = initial
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self.queue_max, self.queue_timeout_s = queue_max, queue_timeout_s
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[int, int, threading.Event]] = []   # (priority, seq, wake)
+        self._seq = itertools.count()
+        self._short = 0.0          # latency EWMA over the last few turns (s)
+        self._baseline = 0.0       # unloaded latency estimate (s)
+        self._baseline_at = time.monotonic()
+        self.counts = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0, "errors": 0}
+
+    # --- limit ----------------------------------------------------------------
+    def _observe(self, latency_s: float, ok: bool) -> None:
+        if not ok:
+            self.counts["errors"] += 1
+            self.limit = max(self.min_limit, self.limit * 0.9)
+            return
+        self._short = latency_s if not self._short else 0.7 * self._short + 0.3 * latency_s
+        now = time.monotonic()
+        drift = (1 + ADMIT_BASELINE_DRIFT) ** (now - self._baseline_at)
+        self._baseline = self._short if not self._baseline else min(self._baseline * drift, self._short)
+        self._baseline_at = now
+        gradient = max(0.5, min(1.0, ADMIT_TOLERANCE * self._baseline / self._short))
+        # Grow only while the limit is actually in use; sqrt(limit) of headroom lets it probe upwards
+        headroom = math.sqrt(self.limit) if self.in_flight + 1 >= self.limit * 0.8 else 0.0
+        target = self.limit * gradient + headroom
+        self.limit = max(self.min_limit, min(self.max_limit, 0.8 * self.limit + 0.2 * target))
+
+    def _wake_next(self) -> None:
+        while self._queue and self.in_flight < int(self.limit):
+            _, _, wake = heapq.heappop(self._queue)
+            if not wake.is_set():
+                self.in_flight += 1
+                wake.set()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely: queued turns ahead divided by throughput."""
+        per_turn = self._short or 5.0
+        return int(max(1, min(60, math.ceil(per_turn * (len(self._queue) + 1) / max(1.0, self.limit)))))
+
+    # --- API --------------------------------------------------------------------
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_TEXT) -> Iterator[None]:
+        """Hold one in-flight slot for the body; raises Rejected (429 full / 503 timed out)."""
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._queue:
+                self.in_flight += 1
+                wake = None
+            elif len(self._queue) >= self.queue_max:
+                self.counts["rejected_full"] += 1
+                raise Rejected(429, "admission queue full", self.retry_after())
+            else:
+                wake = threading.Event()
+                heapq.heappush(self._queue, (priority, next(self._seq), wake))
+                self.counts["queued"] += 1
+        if wake is not None and not wake.wait(self.queue_timeout_s):
+            with self._lock:
+                if not wake.is_set():
+                    wake.set()  # marks the entry dead; _wake_next skips it
+                    self._queue = [q for q in self._queue if q[2] is not wake]
+                    heapq.heapify(self._queue)
+                    self.counts["rejected_timeout"] += 1
+                    raise Rejected(503, "ADK backend saturated", self.retry_after())
+        with self._lock:
+            self.counts["admitted"] += 1
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._observe(time.monotonic() - start, ok)
+                self._wake_next()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            by_priority = {"text": 0, "image": 0}
+            for p, _, wake in self._queue:
+                if not wake.is_set():
+                    by_priority["text" if p == PRIORITY_TEXT else "image"] += 1
+            return {
+                "limit": round(self.limit, 2), "in_flight": self.in_flight,
+                "queue_depth": sum(by_priority.values()), "queue_by_priority": by_priority,
+                "queue_max": self.queue_max, "latency_short_s": round(self._short, 3),
+                "latency_baseline_s": round(self._baseline, 3), "retry_after_s": self.retry_after(), **self.counts,
+            }
@@ -1,9 +1,9 @@
 # app.py  — Flask UI ↔ ADK bridge (Cloud Run–ready)
-import os, json, base64, mimetypes, pathlib, uuid, sys
+import os, json, pathlib, re, threading, time, sys
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 from pathlib import Path
-import requests
-from flask import Flask, render_template, request, send_from_directory, jsonify
+from flask import Flask, Response, render_template, request, send_from_directory, jsonify
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import HTTPException
@@ -13,12 +13,19 @@ from werkzeug.exceptions import HTTPException
 load_dotenv()
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
+from frontend.admission import AdmissionController, Rejected, PRIORITY_IMAGE, PRIORITY_TEXT
+from frontend.warmup import WARMUP, Warmer
+from src.agent.profiling import list_profiles, profile_path, profiled, requested
+from src.agent.journal import journal, record, record_turn
+from frontend.streaming import JSONStreamBody, MAX_UPLOAD_BYTES, StreamingUploadRequest, inline_image, save_stream
 
 # ---- ADK wiring -------------------------------------------------------------
 ADK_URL    = os.getenv("ADK_SERVER_URL", "http://127.0.0.1:8000").rstrip("/")
 APP_NAME   = os.getenv("ADK_APP", "src").split(".", 1)[0]  # accepts "src.agent" -> "src"
 USER_ID    = os.getenv("ADK_USER_ID", "user")
 SESSION_ID = os.getenv("ADK_SESSION_ID", "s_cloud")
+# Stream model output over /run_sse (lets the planner pipeline plan steps)
+ADK_STREAMING = os.getenv("ADK_STREAMING", "false").lower() == "true"
 
 # ---- Paths ------------------------------------------------------------------
 BASE_DIR = pathlib.Path(__file__).parent.resolve()
@@ -29,38 +36,62 @@ STATIC_DIR    = BASE_DIR  / "static"
 UPLOAD_DIR    = pathlib.Path(os.getenv("UPLOAD_DIR", "/tmp/uploads"))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Images per turn; each is inlined (downscaled to INLINE_MAX_PX on its long side, 0 = as-is)
+MAX_IMAGES     = int(os.getenv("MAX_IMAGES", "8"))
+INLINE_MAX_PX  = int(os.getenv("INLINE_MAX_PX", "1024"))
+_INLINE_POOL   = ThreadPoolExecutor(max_workers=MAX_IMAGES or 1, thread_name_prefix="inline")
+# Near-duplicates of already diagnosed photos are sent as a text note instead of image bytes
+PHASH_SKIP_INLINE = os.getenv("PHASH_SKIP_INLINE", "true").lower() == "true"
+
 # ---- Flask ------------------------------------------------------------------
 app = Flask(__name__, template_folder=str(TEMPLATES_DIR), static_folder=str(STATIC_DIR))
+# Multipart file parts stream straight into UPLOAD_DIR (hashed + size-checked), never spooled in memory
+StreamingUploadRequest.upload_dir = UPLOAD_DIR
+app.request_class = StreamingUploadRequest
 @app.errorhandler(Exception)
 def _json_errors(e):
     code = e.code if isinstance(e, HTTPException) else 500
     return jsonify(ok=False, error=str(e)), code
 
 app.config["UPLOAD_FOLDER"] = str(UPLOAD_DIR)
-app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024  # 25 MB
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 64 * 1024  # image plus multipart overhead
 
 # ---- HTTP session (no proxy inheritance in prod) ----------------------------
-SESSION = requests.Session()
-SESSION.headers.update({"Accept": "application/json"})
-SESSION.trust_env = False
-SESSION.proxies = {"http": None, "https": None}
-SESSION.headers.update({"Content-Type": "application/json"})
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+# Built on first use: requests is ~40% of this module's import time, and a cold
+# Cloud Run instance can already serve / and /static while it loads.
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def _http():
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                import requests
+                s = requests.Session()
+                s.headers.update({"Accept": "application/json"})
+                s.trust_env = False
+                s.proxies = {"http": None, "https": None}
+                s.headers.update({"Content-Type": "application/json"})
+                # Enough pooled keep-alive connections for every gunicorn thread + job worker
+                adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _SESSION = s
+    return _SESSION
 
 # ---- Bootstrap (Flask 3-safe) ----------------------------------------------
-_BOOTED = False
+# Session creation, pooled connections and keep-alive run on a background thread
+# started with each worker; requests never wait on it (turns wait at most 8 s,
+# and only while the session is still being created).
+WARMER = Warmer(_http, ADK_URL, APP_NAME, USER_ID, SESSION_ID, {"receipts": [], "governor_log": []})
 
 @app.before_request
 def _boot_once():
-    """Ensure the ADK session exists once per process."""
-    global _BOOTED
-    if _BOOTED:
-        return
-    try:
-        url = f"{ADK_URL}/apps/{APP_NAME}/users/{USER_ID}/sessions/{SESSION_ID}"
-        SESSION.post(url, json={"state": {"receipts": [], "governor_log": []}}, timeout=8)
-    except Exception as e:
-        print(f"[WARN] ensure_session failed: {e}")
-    _BOOTED = True
+    """Start warm-up once per process (workers forked after import start their own)."""
+    if WARMUP:
+        WARMER.ensure_started()
 
 # ---- SSE helpers ------------------------------------------------------------
 def _parse_sse(s: str):
@@ -117,9 +148,9 @@ def _normalize_events(events):
         if ("errorMessage" in e) or ("errorCode" in e):
             errors.append({"code": e.get("errorCode"), "message": e.get("errorMessage") or e.get("errorCode")})
 
-        # content/messages
+        # content/messages (partial chunks are repeated in the final aggregated event)
         content = e.get("content"); author = e.get("author")
-        if isinstance(content, dict):
+        if isinstance(content, dict) and not e.get("partial"):
             for p in content.get("parts", []):
                 if isinstance(p, dict) and "text" in p:
                     messages.append({"who": "assistant", "author": author, "text": p["text"]})
@@ -157,6 +188,7 @@ def _normalize_events(events):
             "tool_calls": len(tool_calls),
             "receipts": receipts_count,
             "gen_time_ms": gen_time_ms,
+            "invocation_id": next((e["invocationId"] for e in events if e.get("invocationId")), None),
         },
     }
 
@@ -242,6 +274,7 @@ def _build_synth_receipts(norm):
 def _aggregate(norm):
     plan_str, gov_log = "", []
     state_receipts = []
+    planner_stats = {}
 
     for sd in norm.get("state_updates", []):
         if isinstance(sd.get("current_plan"), str) and sd["current_plan"].strip():
@@ -250,6 +283,8 @@ def _aggregate(norm):
             gov_log.extend(sd["governor_log"])
         if isinstance(sd.get("receipts"), list):
             state_receipts = sd["receipts"]
+        if isinstance(sd.get("planner_stats"), dict):
+            planner_stats = sd["planner_stats"]
 
     rows = _rows_from_state_receipts(state_receipts) if state_receipts else []
     if not rows:
@@ -269,37 +304,68 @@ def _aggregate(norm):
         "final_output": final_out or "...",
         "governor_log": gov_log or [],
         "receipts": rows or [],
-        "metrics": norm.get("metrics", {}),
+        "metrics": {**norm.get("metrics", {}), "planner_iterations": planner_stats.get("iterations", 0)},
         "error": err,
     }
 
-# ---- Build message with optional inline image -------------------------------
+# ---- Build message with optional inline images ------------------------------
+def _image_path(image_uri: str) -> Optional[pathlib.Path]:
+    if image_uri.startswith("file://"):
+        return pathlib.Path(image_uri.replace("file://", ""))
+    if image_uri.startswith("/"):
+        return pathlib.Path(image_uri)
+    return None
+
+def _cached_diagnosis_part(image_uri: str, p: pathlib.Path):
+    if not PHASH_SKIP_INLINE:
+        return None
+    try:
+        from src.agent.vision.phash import lookup_file
+        hit = lookup_file(str(p))
+    except Exception:
+        return None
+    if not hit or not hit.get("probs") or hit.get("heuristic", True):
+        return None   # only a trained model's diagnosis stands in for the photo
+    labels, probs = hit["labels"], hit["probs"]
+    k = max(range(len(probs)), key=probs.__getitem__)
+    return {"text": f"(Attached: {image_uri} — near-duplicate of an earlier photo, "
+                    f"diagnosed {labels[k]} at confidence {probs[k]:.2f})"}
+
 def _inline_bytes_from_uri(image_uri: str):
     """Support file:// and /tmp/uploads/ paths for inlineData."""
-    p: Optional[pathlib.Path] = None
-    if image_uri.startswith("file://"):
-        p = pathlib.Path(image_uri.replace("file://", ""))
-    elif image_uri.startswith("/"):
-        p = pathlib.Path(image_uri)
+    p = _image_path(image_uri)
     if p and p.exists():
-        return {
-            "inlineData": {
-                "mimeType": mimetypes.guess_type(str(p))[0] or "image/jpeg",
-                "data": base64.b64encode(p.read_bytes()).decode("ascii"),
-            }
-        }
+        cached = _cached_diagnosis_part(image_uri, p)
+        if cached:
+            return cached
+        return inline_image(p, INLINE_MAX_PX)   # base64-encoded chunk by chunk while the request is sent
     return None
 
-def _new_message_with_optional_image(user_text: str, image_uri: Optional[str]):
+def _new_message_with_optional_image(user_text: str, image_uris):
+    if isinstance(image_uris, str):
+        image_uris = [image_uris]
+    image_uris = [u for u in (image_uris or []) if u]
     parts = [{"text": user_text or ""}]
-    if image_uri:
-        inline = _inline_bytes_from_uri(image_uri)
-        if inline:
-            parts.append(inline)
-        else:
-            parts.append({"text": f"(Attached: {image_uri})"})
+    inlines = list(_INLINE_POOL.map(_inline_bytes_from_uri, image_uris)) if len(image_uris) > 1 \
+        else [_inline_bytes_from_uri(u) for u in image_uris]
+    for uri, inline in zip(image_uris, inlines):
+        parts.append(inline or {"text": f"(Attached: {uri})"})
     return {"role": "user", "parts": parts}
 
+def _image_state(image_uris: List[str]) -> dict:
+    """Session state for the turn: every upload reaches diagnose_leaf_tool, not just the first."""
+    return {"image_uris": list(image_uris), "uploaded_image_uri": image_uris[0] if image_uris else None}
+
+def _image_uris_from_form(form) -> List[str]:
+    try:
+        uris = json.loads(form.get("image_uris") or "[]")
+        uris = [str(u).strip() for u in uris if str(u).strip()] if isinstance(uris, list) else []
+    except Exception:
+        uris = []
+    if not uris and (form.get("image_uri") or "").strip():
+        uris = [form.get("image_uri").strip()]
+    return list(dict.fromkeys(uris))[:MAX_IMAGES]
+
 # ---- Wire to ADK ------------------------------------------------------------
 def _post_events(payload: dict, *, prefer_sse: bool):
     """
@@ -307,12 +373,23 @@ def _post_events(payload: dict, *, prefer_sse: bool):
     Always raise on non-2xx so we never pass HTML back to the UI.
     """
     run_timeout = 180 if prefer_sse else 120
+    body = JSONStreamBody(payload)  # re-iterable: every fallback below streams the images again
 
     base = f"{ADK_URL}/apps/{APP_NAME}/users/{USER_ID}/sessions/{SESSION_ID}"
 
+    # 0) Streaming requested: only /run_sse streams model output
+    if payload.get("streaming"):
+        try:
+            rs = _http().post(f"{ADK_URL}/run_sse", data=body, stream=True, timeout=None)
+            if rs.ok:
+                text = "\n".join(line for line in rs.iter_lines(decode_unicode=True) if line)
+                return _normalize_events(_parse_sse(text))
+        except Exception:
+            pass
+
     # 1) Try namespaced JSON /run first
     try:
-        r = SESSION.post(f"{base}:run", json=payload, timeout=run_timeout)
+        r = _http().post(f"{base}:run", data=body, timeout=run_timeout)
         if r.ok:
             ct = r.headers.get("content-type", "")
             if ct.startswith("application/json"):
@@ -326,7 +403,7 @@ def _post_events(payload: dict, *, prefer_sse: bool):
 
     # 2) Try namespaced SSE stream
     try:
-        rs = SESSION.post(f"{base}:run_sse", json=payload, stream=True, timeout=None)
+        rs = _http().post(f"{base}:run_sse", data=body, stream=True, timeout=None)
         if rs.ok:
             text = "\n".join(line for line in rs.iter_lines(decode_unicode=True) if line)
             return _normalize_events(_parse_sse(text))
@@ -337,7 +414,7 @@ def _post_events(payload: dict, *, prefer_sse: bool):
 
     # 3) Fall back to flat /run (what your Cloud Run ADK served)
     try:
-        r2 = SESSION.post(f"{ADK_URL}/run", json=payload, timeout=240)
+        r2 = _http().post(f"{ADK_URL}/run", data=body, timeout=240)
         if r2.ok:
             ct = r2.headers.get("content-type", "")
             if ct.startswith("application/json"):
@@ -347,7 +424,7 @@ def _post_events(payload: dict, *, prefer_sse: bool):
     except Exception as e:
         # last resort flat SSE
         try:
-            rs2 = SESSION.post(f"{ADK_URL}/run_sse", json=payload, stream=True, timeout=None)
+            rs2 = _http().post(f"{ADK_URL}/run_sse", data=body, stream=True, timeout=None)
             if rs2.ok:
                 text = "\n".join(line for line in rs2.iter_lines(decode_unicode=True) if line)
                 return _normalize_events(_parse_sse(text))
@@ -360,7 +437,7 @@ def _post_events(payload: dict, *, prefer_sse: bool):
     run_timeout = 180 if prefer_sse else 120
 
     try:
-        r = SESSION.post(f"{ADK_URL}/run", json=payload, timeout=run_timeout)
+        r = _http().post(f"{ADK_URL}/run", data=body, timeout=run_timeout)
         if r.ok:
             if r.headers.get("content-type", "").startswith("application/json"):
                 return _normalize_events(r.json())
@@ -371,29 +448,31 @@ def _post_events(payload: dict, *, prefer_sse: bool):
         pass
 
     try:
-        rs = SESSION.post(f"{ADK_URL}/run_sse", json=payload, stream=True, timeout=None)
+        rs = _http().post(f"{ADK_URL}/run_sse", data=body, stream=True, timeout=None)
         if rs.ok:
             text = "\n".join(line for line in rs.iter_lines(decode_unicode=True) if line)
             return _normalize_events(_parse_sse(text))
     except Exception:
         pass
 
-    r2 = SESSION.post(f"{ADK_URL}/run", json=payload, timeout=240)
+    r2 = _http().post(f"{ADK_URL}/run", data=body, timeout=240)
     if r2.ok:
         if r2.headers.get("content-type", "").startswith("application/json"):
             return _normalize_events(r2.json())
         return _normalize_events(json.loads(r2.text or "[]"))
     r2.raise_for_status()
 
-def _run_once(query: str, image_uri: Optional[str]):
+def _run_once(query: str, image_uri: Optional[str], image_uris: Optional[List[str]] = None):
+    uris = list(image_uris or ([image_uri] if image_uri else []))[:MAX_IMAGES]
     payload = {
         "app_name": APP_NAME,
         "user_id": USER_ID,
         "session_id": SESSION_ID,
-        "new_message": _new_message_with_optional_image(query, image_uri),
-        "streaming": False,
+        "new_message": _new_message_with_optional_image(query, uris),
+        "state_delta": _image_state(uris),
+        "streaming": ADK_STREAMING,
     }
-    return _post_events(payload, prefer_sse=bool(image_uri))
+    return _post_events(payload, prefer_sse=bool(uris))
 
 def _rows_from_plan_receipts(tool_calls):
     return []
@@ -422,65 +501,227 @@ def index():
 def send_static(path: str):
     return send_from_directory(app.static_folder, path)
 
-@app.route("/upload", methods=["POST"])
+@app.route("/upload", methods=["POST", "PUT"])
 def upload():
-    f = request.files.get("image")
-    if not f:
-        return jsonify(ok=False, error="No image field 'image'"), 400
+    """Multipart field 'image', or a raw image body (Content-Type: image/*, ?filename=)."""
+    if (request.content_type or "").startswith("image/"):
+        name = secure_filename(request.args.get("filename") or "image")
+        try:
+            up = save_stream(request.stream, UPLOAD_DIR)
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify(ok=False, error=f"Save failed: {e}"), 500
+    else:
+        f = request.files.get("image")
+        if not f:
+            return jsonify(ok=False, error="No image field 'image'"), 400
+        name = secure_filename(f.filename or "image")
+        up = f.stream  # HashingUpload: already on disk
 
-    name = secure_filename(f.filename or "image")
     stem, ext = (name.rsplit(".", 1) + [""])[:2]
     ext = f".{ext}" if ext else ""
-    fname = f"{stem}-{uuid.uuid4().hex[:8]}{ext}"
-    fpath = UPLOAD_DIR / fname
+    if up.size == 0:
+        up.discard()
+        return jsonify(ok=False, error="Empty upload"), 400
+    # Content-addressed name: a resent photo maps to the same file
+    fpath = UPLOAD_DIR / f"{stem}-{up.sha256[:12]}{ext}"
     try:
-        f.save(str(fpath))
+        up.commit(fpath)
     except Exception as e:
+        up.discard()
         return jsonify(ok=False, error=f"Save failed: {e}"), 500
 
     # Return a file:// URI so it can be inlined on next call
-    return jsonify(ok=True, uri="file://" + str(fpath))
+    return jsonify(ok=True, uri="file://" + str(fpath), sha256=up.sha256, size=up.size)
 
-@app.route("/run_plan", methods=["POST"])
-def run_plan():
-    query = (request.form.get("query") or "").strip()
-    image_uri = None
-    try:
-        image_uris = json.loads(request.form.get("image_uris") or "[]")
-        image_uri = image_uris[0] if image_uris else None
-    except Exception:
-        image_uri = (request.form.get("image_uri") or "").strip() or None
+# Adaptive in-flight limit + short priority queue in front of ADK (per worker process)
+ADMISSION = AdmissionController()
+JOB_ADMIT_WAIT_S = float(os.getenv("JOB_ADMIT_WAIT_S", "300"))
 
+def _run_turn(query: str, image_uris: List[str], profile: Optional[str] = None) -> dict:
+    """One agent turn, shaped for the UI (shared by /run_plan and /jobs). Raises Rejected when shed."""
+    t0, out, err = time.perf_counter(), None, None
     try:
+        with profiled("ui_turn", profile) as prof:
+            out = _run_turn_inner(query, image_uris, profile)
+    except Exception as e:
+        err = e
+        raise
+    finally:
+        record_turn("ui", t0, out, err and (f"rejected: {err.reason}" if isinstance(err, Rejected) else err),
+                    session_id=SESSION_ID, images=len(image_uris), profiled=bool(profile))
+    if prof.get("files"):
+        out["metrics"] = {**out.get("metrics", {}),
+                          "profile": {**prof, "links": [f"/profiles/{f}" for f in prof["files"]]}}
+    return out
+
+def _run_turn_inner(query: str, image_uris: List[str], profile: Optional[str]) -> dict:
+    if not WARMER.session_ready.is_set():
+        if WARMUP:
+            WARMER.ensure_started()
+            WARMER.wait_session(8)
+        else:
+            WARMER.ensure_session()   # nothing else creates it with warm-up off
+    with ADMISSION.slot(PRIORITY_IMAGE if image_uris else PRIORITY_TEXT):
         norm = _aggregate_for_ui(_post_events({
             "app_name": APP_NAME,
             "user_id": USER_ID,
             "session_id": SESSION_ID,
-            "new_message": _new_message_with_optional_image(query, image_uri),
-            "streaming": False,
-        }, prefer_sse=bool(image_uri)))
-        if not isinstance(norm, dict):
-            raise ValueError("Aggregator returned non-dict result")
-
-        return jsonify(
-            ok=True,
-            final_output=norm.get("final_output", "..."),
-            plan=norm.get("plan", ""),
-            receipts=norm.get("receipts", []),
-            governor_log=norm.get("governor_log", []),
-            metrics=norm.get("metrics", {}),
-        )
+            "new_message": _new_message_with_optional_image(query, image_uris),
+            # 'profile' is set every turn so one profiled request does not stick to the session
+            "state_delta": {**_image_state(image_uris), "profile": profile},
+            "streaming": ADK_STREAMING,
+        }, prefer_sse=bool(image_uris)))
+    if not isinstance(norm, dict):
+        raise ValueError("Aggregator returned non-dict result")
+    return dict(
+        ok=True,
+        final_output=norm.get("final_output", "..."),
+        plan=norm.get("plan", ""),
+        receipts=norm.get("receipts", []),
+        governor_log=norm.get("governor_log", []),
+        metrics=norm.get("metrics", {}),
+    )
+
+def _profile_mode() -> Optional[str]:
+    """X-Profile: 1 | sample | cprofile (or ?profile=...) profiles this turn; PROFILE_SAMPLE_RATE samples the rest."""
+    return requested(request.headers.get("X-Profile") or request.args.get("profile"))
+
+_UPLOAD_SHA = re.compile(r"-([0-9a-f]{12})(?:\.\w+)?$")   # content-addressed upload names (see /upload)
+
+def _journal_request(route: str, query: str, image_uris: List[str]) -> None:
+    """A turn's inputs at arrival: the journal's 'request' records are what replay.py re-drives."""
+    images = []
+    for u in image_uris:
+        m = _UPLOAD_SHA.search(u)
+        images.append({"uri": u, "sha": m.group(1) if m else None})
+    record("request", route=route, query=query, images=images)
+
+@app.route("/run_plan", methods=["POST"])
+def run_plan():
+    query = (request.form.get("query") or "").strip()
+    image_uris = _image_uris_from_form(request.form)
+    _journal_request("run_plan", query, image_uris)
+
+    try:
+        return jsonify(**_run_turn(query, image_uris, _profile_mode()))
+    except Rejected as e:
+        return jsonify(ok=False, error=f"Busy: {e.reason}", retry_after=e.retry_after), e.status, \
+            {"Retry-After": str(e.retry_after)}
     except Exception as e:
         return jsonify(ok=False, error=str(e)), 500
 
+# ---- Async jobs ---------------------------------------------------------------
+# Same turn as /run_plan, but the request returns a job id at once and a bounded
+# pool runs it; clients poll GET /jobs/<id> or subscribe to /jobs/<id>/events.
+_JOBS = None  # frontend.jobs (sqlite, worker pool) is imported with the first job request
+
+def _run_job(req: dict) -> dict:
+    """Jobs already wait in their own queue, so a shed turn is retried rather than failed."""
+    deadline = time.monotonic() + JOB_ADMIT_WAIT_S
+    while True:
+        try:
+            return _run_turn(req.get("query", ""), req.get("image_uris", []), req.get("profile"))
+        except Rejected as e:
+            if time.monotonic() + e.retry_after > deadline:
+                raise
+            time.sleep(e.retry_after)
+
+def _jobs():
+    global _JOBS
+    if _JOBS is None:  # created lazily so gunicorn's preload/fork never copies pool threads
+        from frontend.jobs import JobQueue
+        _JOBS = JobQueue(_run_job)
+    return _JOBS
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    data = request.form if request.form else (request.get_json(silent=True) or {})
+    query = (data.get("query") or "").strip()
+    if not query:
+        return jsonify(ok=False, error="Query is required"), 400
+    image_uris = _image_uris_from_form(data) if request.form else \
+        [str(u) for u in (data.get("image_uris") or [])][:MAX_IMAGES]
+    _journal_request("jobs", query, image_uris)
+    from frontend.jobs import QueueFull
+    try:
+        job_id = _jobs().submit({"query": query, "image_uris": image_uris, "profile": _profile_mode()})
+    except QueueFull as e:
+        return jsonify(ok=False, error=f"Busy: {e}"), 429, {"Retry-After": "5"}
+    return jsonify(ok=True, job_id=job_id, status_url=f"/jobs/{job_id}", events_url=f"/jobs/{job_id}/events"), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str):
+    job = _jobs().get(job_id)
+    if job is None:
+        return jsonify(ok=False, error="Unknown job"), 404
+    return jsonify(ok=True, **job)
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id: str):
+    return jsonify(ok=_jobs().cancel(job_id))
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id: str):
+    if _jobs().get(job_id) is None:
+        return jsonify(ok=False, error="Unknown job"), 404
+    from frontend.jobs import sse
+    stream = (sse(j) for j in _jobs().watch(job_id))
+    return Response(stream, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/jobs/metrics", methods=["GET"])
+def job_metrics():
+    return jsonify(ok=True, **_jobs().metrics())
+
+@app.route("/admission/metrics", methods=["GET"])
+def admission_metrics():
+    return jsonify(ok=True, **ADMISSION.metrics())
+
+@app.route("/journal/metrics", methods=["GET"])
+def journal_metrics():
+    """This worker's journal writer: queued / written / dropped records, segments, compression."""
+    return jsonify(ok=True, **journal().status())
+
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify(ok=True)
+    """Liveness: the process serves requests (always 200). Readiness is reported alongside."""
+    return jsonify(ok=True, live=True, **WARMER.status())
+
+@app.route("/health/live", methods=["GET"])
+def health_live():
+    return jsonify(ok=True, live=True)
+
+@app.route("/health/ready", methods=["GET"])
+def health_ready():
+    """Readiness probe: 503 until ADK answered and the session exists (created here with WARMUP=false)."""
+    ready = WARMER.status()["ready"] if WARMUP else WARMER.ensure_session()
+    status = WARMER.status()
+    return jsonify(ok=ready, **status), 200 if ready else 503
+
+@app.route("/profiles", methods=["GET"])
+def profiles():
+    """Saved request / tool profiles, newest first (UI and, on a shared PROFILE_DIR, the ADK server)."""
+    return jsonify(ok=True, profiles=[{**p, "url": f"/profiles/{p['name']}"} for p in list_profiles()])
+
+@app.route("/profiles/<name>", methods=["GET"])
+def profile_file(name: str):
+    path = profile_path(name)
+    if path is None:
+        return jsonify(ok=False, error="Unknown profile"), 404
+    binary = path.suffix == ".pstats"
+    return send_from_directory(str(path.parent), path.name, as_attachment=binary,
+                               mimetype="application/octet-stream" if binary else "text/plain")
 
 @app.get("/uploads/<path:filename>")
 def uploaded_file(filename):
     return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
 
+# Warm up as soon as the worker has imported the app, not on its first request
+if WARMUP:
+    WARMER.ensure_started()
+
 if __name__ == "__main__":
     # Cloud Run injects PORT; default to 8080 for local parity
     port = int(os.environ.get("PORT", 8080))
@@ -0,0 +1,235 @@
+# jobs.py — async job mode for long agent turns
+#
+# POST /jobs stores the request and returns an id at once; a bounded thread pool
+# runs the turn and writes the result to a local sqlite table, so a few slow ADK
+# runs no longer pin gunicorn workers and results survive a worker restart.
+#
+# Each row is owned by a per-process boot id (PIDs are reused across restarts)
+# and carries a lease a heartbeat thread keeps renewing. Any worker recovers
+# queued/running jobs whose lease has expired.
+import json, os, sqlite3, threading, time, uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+JOBS_DB       = os.getenv("JOBS_DB", "/tmp/farmagent/jobs.sqlite")
+JOB_WORKERS   = int(os.getenv("JOB_WORKERS", "8"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "64"))      # queued (not yet running) jobs per process
+JOB_TTL_S     = float(os.getenv("JOB_TTL_S", "86400"))      # finished jobs are pruned after this
+JOB_LEASE_S   = float(os.getenv("JOB_LEASE_S", "30"))       # owner heartbeat renews every JOB_LEASE_S / 3
+
+BOOT_ID = uuid.uuid4().hex
+
+
+def _reboot() -> None:
+    global BOOT_ID
+    BOOT_ID = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=_reboot)
+
+TERMINAL = ("done", "error", "canceled")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, runner: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 path: str = JOBS_DB, workers: int = JOB_WORKERS, queue_max: int = JOB_QUEUE_MAX,
+                 lease_s: float = JOB_LEASE_S):
+        self.runner = runner
+        self.queue_max = queue_max
+        self.owner = BOOT_ID
+        self.lease_s = lease_s
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queued = 0
+        self._running = 0
+        self._waits: Deque[float] = deque(maxlen=512)   # seconds from submit to start
+        self._runs: Deque[float] = deque(maxlen=512)
+        self._counts = {"submitted": 0, "done": 0, "error": 0, "rejected": 0, "canceled": 0}
+        self.workers = workers
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, created REAL, started REAL, "
+            "finished REAL, owner TEXT, lease REAL, request TEXT, result TEXT, error TEXT)")
+        if "lease" not in [r[1] for r in self._db.execute("PRAGMA table_info(jobs)")]:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease REAL")   # pre-lease rows count as expired
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._recover()
+        threading.Thread(target=self._heartbeat, name="job-lease", daemon=True).start()
+
+    # --- storage ---------------------------------------------------------------
+    def _sql(self, query: str, args: tuple = ()) -> list:
+        with self._db_lock:
+            return self._db.execute(query, args).fetchall()
+
+    def _write(self, query: str, args: tuple = ()) -> int:
+        with self._db_lock:
+            n = self._db.execute(query, args).rowcount
+        with self._changed:
+            self._changed.notify_all()
+        return n
+
+    def _update(self, job_id: str, **cols: Any) -> None:
+        sets = ", ".join(f"{k} = ?" for k in cols)
+        self._write(f"UPDATE jobs SET {sets} WHERE id = ?", (*cols.values(), job_id))
+
+    def _recover(self) -> None:
+        """Jobs whose lease expired: running ones are failed (the turn may have half-run), queued ones re-run."""
+        now = time.time()
+        self._write("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (now - JOB_TTL_S,))
+        self._write("UPDATE jobs SET status = 'error', error = 'interrupted by restart', finished = ? "
+                    "WHERE status = 'running' AND (lease IS NULL OR lease < ?)", (now, now))
+        expired = self._sql("SELECT id FROM jobs WHERE status = 'queued' AND (lease IS NULL OR lease < ?)", (now,))
+        for (job_id,) in expired:
+            # Claim atomically: several workers may recover the same expired job
+            if self._write("UPDATE jobs SET owner = ?, lease = ? WHERE id = ? AND status = 'queued' "
+                           "AND (lease IS NULL OR lease < ?)", (self.owner, now + self.lease_s, job_id, now)):
+                self._enqueue(job_id)
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(self.lease_s / 3)
+            try:
+                self._sql("UPDATE jobs SET lease = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                          (time.time() + self.lease_s, self.owner))
+                self._recover()
+            except Exception:
+                pass
+
+    # --- API -------------------------------------------------------------------
+    def submit(self, request: Dict[str, Any]) -> str:
+        # Check and reserve the queue slot in one critical section, or concurrent submits overshoot queue_max
+        with self._lock:
+            if self._queued >= self.queue_max:
+                self._counts["rejected"] += 1
+                raise QueueFull(f"{self._queued} jobs queued")
+            self._queued += 1
+            self._counts["submitted"] += 1
+        job_id = uuid.uuid4().hex
+        try:
+            now = time.time()
+            self._write("INSERT INTO jobs (id, status, created, owner, lease, request) VALUES (?, 'queued', ?, ?, ?, ?)",
+                        (job_id, now, self.owner, now + self.lease_s, json.dumps(request)))
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+                self._counts["submitted"] -= 1
+            raise
+        self._pool.submit(self._execute, job_id)
+        return job_id
+
+    def _enqueue(self, job_id: str) -> None:
+        with self._lock:
+            self._queued += 1
+            self._counts["submitted"] += 1
+        self._pool.submit(self._execute, job_id)
+
+    def _execute(self, job_id: str) -> None:
+        rows = self._sql("SELECT status, created, request FROM jobs WHERE id = ?", (job_id,))
+        start = time.time()
+        # queued -> running is a compare-and-set so a concurrent cancel wins cleanly
+        claimed = bool(rows) and self._write("UPDATE jobs SET status = 'running', started = ? "
+                                             "WHERE id = ? AND status = 'queued'", (start, job_id))
+        with self._lock:
+            self._queued -= 1
+            if not claimed:
+                return
+            self._running += 1
+            self._waits.append(start - rows[0][1])
+        row = rows[0]
+        try:
+            result = self.runner(json.loads(row[2]))
+            self._update(job_id, status="done", result=json.dumps(result, default=str), finished=time.time())
+            outcome = "done"
+        except Exception as e:
+            self._update(job_id, status="error", error=f"{type(e).__name__}: {e}", finished=time.time())
+            outcome = "error"
+        with self._lock:
+            self._running -= 1
+            self._counts[outcome] += 1
+            self._runs.append(time.time() - start)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._sql("SELECT id, status, created, started, finished, result, error FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job_id, status, created, started, finished, result, error = rows[0]
+        out: Dict[str, Any] = {"id": job_id, "status": status, "created": created}
+        if started:
+            out["wait_ms"] = round((started - created) * 1000, 1)
+        if finished and started:
+            out["run_ms"] = round((finished - started) * 1000, 1)
+        if status == "queued":
+            out["position"] = self._sql("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created < ?",
+                                        (created,))[0][0]
+        if result is not None:
+            out["result"] = json.loads(result)
+        if error:
+            out["error"] = error
+        return out
+
+    def cancel(self, job_id: str) -> bool:
+        """Only queued jobs can be canceled; a running ADK turn is left to finish."""
+        n = self._write("UPDATE jobs SET status = 'canceled', finished = ? WHERE id = ? AND status = 'queued'",
+                        (time.time(), job_id))
+        if n:
+            with self._lock:
+                self._counts["canceled"] += 1
+        return bool(n)
+
+    def watch(self, job_id: str, timeout: float = 600.0, heartbeat: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """Job snapshots on every status change until terminal; None as keep-alive ticks."""
+        deadline = time.monotonic() + timeout
+        last = None
+        idle = 0.0
+        while time.monotonic() < deadline:
+            job = self.get(job_id)
+            if job is None:
+                return
+            if job["status"] != last:
+                last = job["status"]
+                idle = 0.0
+                yield job
+                if last in TERMINAL:
+                    return
+            elif idle >= heartbeat:
+                idle = 0.0
+                yield None
+            # Local jobs wake us on change; jobs owned by another worker process are polled
+            with self._changed:
+                self._changed.wait(0.5)
+            idle += 0.5
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            waits, runs = sorted(self._waits), sorted(self._runs)
+            out: Dict[str, Any] = {
+                "queue_depth": self._queued, "running": self._running, "workers": self.workers,
+                "queue_max": self.queue_max, **self._counts,
+            }
+        out["wait_ms_p50"] = _pct(waits, 0.5)
+        out["wait_ms_p95"] = _pct(waits, 0.95)
+        out["run_ms_p50"] = _pct(runs, 0.5)
+        out["run_ms_p95"] = _pct(runs, 0.95)
+        out["stored"] = dict(self._sql("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return out
+
+
+def _pct(sorted_s, q: float) -> float:
+    return round(sorted_s[min(len(sorted_s) - 1, int(len(sorted_s) * q))] * 1000, 1) if sorted_s else 0.0
+
+
+def sse(job: Optional[Dict[str, Any]]) -> str:
+    if job is None:
+        return ": keep-alive\n\n"
+    return f"event: {job['status']}\ndata: {json.dumps(job, default=str)}\n\n"
@@ -27,6 +27,28 @@ function updateMetrics(m){
   document.getElementById('m_receipts').textContent = g(m?.receipts);
   document.getElementById('m_latency').textContent  = g(m?.gen_time_ms);
 }
+// Profiles: this turn's files first (metrics.profile), then the newest saved ones
+const PROFILE_MODE = new URLSearchParams(location.search).get('profile') || '';
+async function renderProfiles(current){
+  const box=document.getElementById('profiles_list'); if(!box){ return; }
+  let saved=[];
+  try{ saved=(await readJSON(await fetch('/profiles', {cache:'no-store'})))?.profiles || []; }catch{}
+  const mine=new Set((current?.links)||[]);
+  const rows=[...(current?.links||[]).map(url=>({url, name:url.split('/').pop(), mine:true})),
+              ...saved.filter(p=>!mine.has(p.url)).slice(0, 10)];
+  box.innerHTML='';
+  if(!rows.length){ box.innerHTML='<div class="muted">No profiles.</div>'; return; }
+  rows.forEach(p=>{
+    const row=document.createElement('div'); row.className='receipt';
+    const left=document.createElement('div'); left.innerHTML=`<span class="kbd">${p.mine?'this turn':(p.label||'profile')}</span>`;
+    const a=document.createElement('a'); a.href=p.url; a.target='_blank'; a.rel='noopener'; a.textContent=p.name;
+    const mid=document.createElement('div'); mid.style.flex='1'; mid.appendChild(a);
+    row.appendChild(left); row.appendChild(mid);
+    box.appendChild(row);
+  });
+}
+tabs.forEach(t => t.addEventListener('click', () => { if(t.dataset.tab==='dash') renderProfiles(); }));
+
 function renderReceipts(list){
   const box=document.getElementById('receipts_list'); if(!box){ return; }
   box.innerHTML='';
@@ -78,7 +100,7 @@ function renderFinal(html){
 }
 
 /* ---------- Multi-image attach (max 2), auto-clear after run ---------- */
-const LIMIT = 2;
+const LIMIT = 8;
 const fileInput   = document.getElementById('fileInput');
 const attachBtn   = document.getElementById('attachBtn');
 const thumbsBox   = document.getElementById('thumbs');
@@ -160,13 +182,13 @@ let controller=null;
 function setBusy(b){ runBtn.disabled=b; attachBtn.disabled=b; cancelBtn.disabled=!b; overlay.classList.toggle('show', b); }
 cancelBtn.addEventListener('click',()=>{ if(controller) controller.abort(); setBusy(false); toast('Request canceled'); });
 
-async function fetchJSONOnce(fd, signal){
-  const res = await fetch('/run_plan', {
-    method:'POST',
-    body: fd,
-    headers:{'X-Requested-With':'fetch','Accept':'application/json'},
-    cache:'no-store', signal
-  });
+// Plans arrive as compact canonical JSON; indent for display only
+function prettyPlan(plan){
+  if(!plan) return '[]';
+  try { return JSON.stringify(JSON.parse(plan), null, 2); } catch { return plan; }
+}
+
+async function readJSON(res){
   const ct = res.headers.get('content-type') || '';
   const raw = await res.text();
   if (!ct.includes('application/json')) {
@@ -177,6 +199,48 @@ async function fetchJSONOnce(fd, signal){
   return JSON.parse(raw);
 }
 
+// Turns run as server-side jobs: submit, then follow the job's event stream
+// (polling if EventSource fails). Cancel drops a still-queued job.
+function waitJob(id, signal){
+  return new Promise((resolve, reject)=>{
+    let es=null, timer=null, finished=false;
+    const finish=(fn, v)=>{ if(finished) return; finished=true; if(es) es.close(); clearTimeout(timer); fn(v); };
+    const settle=(job)=>{
+      if(job.status==='done') finish(resolve, job.result);
+      else if(job.status==='error') finish(reject, new Error(job.error || 'Run failed'));
+      else if(job.status==='canceled') finish(reject, new DOMException('Canceled', 'AbortError'));
+    };
+    const poll=async ()=>{
+      try{
+        const job=await readJSON(await fetch(`/jobs/${id}`, {cache:'no-store'}));
+        if(!job?.ok) return finish(reject, new Error(job?.error || 'Unknown job'));
+        settle(job);
+      }catch(e){ /* transient; keep polling */ }
+      if(!finished) timer=setTimeout(poll, 1000);
+    };
+    signal.addEventListener('abort', ()=>{
+      fetch(`/jobs/${id}`, {method:'DELETE'}).catch(()=>{});
+      finish(reject, new DOMException('Aborted', 'AbortError'));
+    });
+    if(!window.EventSource){ poll(); return; }
+    es=new EventSource(`/jobs/${id}/events`);
+    ['done','error','canceled'].forEach(ev=>es.addEventListener(ev, m=>settle(JSON.parse(m.data))));
+    es.onerror=()=>{ if(finished) return; es.close(); es=null; poll(); };
+  });
+}
+
+async function fetchJSONOnce(fd, signal){
+  const res = await fetch('/jobs', {
+    method:'POST',
+    body: fd,
+    headers:{'X-Requested-With':'fetch','Accept':'application/json', ...(PROFILE_MODE ? {'X-Profile': PROFILE_MODE} : {})},
+    cache:'no-store', signal
+  });
+  const sub = await readJSON(res);
+  if(!sub?.ok) throw new Error(sub?.error || `Submit failed (${res.status})`);
+  return await waitJob(sub.job_id, signal);
+}
+
 runBtn.addEventListener('click', async ()=>{
   const q=queryBox.value.trim(); if(!q){ showError('Query is required'); return; }
   showError(''); setBusy(true); controller=new AbortController();
@@ -202,7 +266,7 @@ runBtn.addEventListener('click', async ()=>{
 
     if(!data?.ok) throw new Error(data?.error || 'Run failed');
 
-    if (planPre)      planPre.textContent = data.plan || '[]';
+    if (planPre)      planPre.textContent = prettyPlan(data.plan);
     if (receiptsPre)  receiptsPre.textContent = JSON.stringify(data.receipts||[], null, 2);
     if (govlog)       govlog.textContent = JSON.stringify(data.governor_log||[], null, 2);
 
@@ -211,6 +275,7 @@ runBtn.addEventListener('click', async ()=>{
 
     renderReceipts(data.receipts||[]);
     updateMetrics(data.metrics||{});
+    if (data.metrics?.profile || PROFILE_MODE) renderProfiles(data.metrics?.profile);
     showError(data.error||''); toast('Done');
 
     clearAttachments();
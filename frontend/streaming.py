@@ -0,0 +1,240 @@
+# streaming.py — constant-memory image path: uploads stream to disk, inline
+# images stream into the outbound ADK request body.
+#
+# Uploads: multipart file parts are written straight into UPLOAD_DIR in chunks
+# while being hashed and size-checked (no spooling, no second copy on save).
+# Outbound: payloads carry InlineFile placeholders; JSONStreamBody renders the
+# JSON around them and base64-encodes each file chunk by chunk. Its length is
+# known up front, so requests/httpx send a plain Content-Length body. The async
+# iterator reads and encodes each chunk in a worker thread, off the event loop.
+# inline_image() builds the part for one photo, downscaling large ones without a
+# full-resolution decode (JPEG draft mode).
+import asyncio, base64, hashlib, io, json, mimetypes, os, tempfile
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+CHUNK = 3 * 64 * 1024   # multiple of 3: base64 chunks concatenate without padding
+
+
+# ---- Uploads ------------------------------------------------------------------
+class HashingUpload(io.RawIOBase):
+    """Writable temp file in the upload dir that hashes and counts what is written."""
+
+    def __init__(self, directory: Path, max_bytes: int = MAX_UPLOAD_BYTES):
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=str(directory), prefix=".upload-")
+        self._fh = os.fdopen(fd, "w+b")
+        self._sha = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.size += len(b)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self._sha.update(b)
+        return self._fh.write(b)
+
+    def read(self, n: int = -1) -> bytes:
+        return self._fh.read(n)
+
+    def readline(self, n: int = -1) -> bytes:
+        return self._fh.readline(n)
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        return self._fh.seek(pos, whence)
+
+    def tell(self) -> int:
+        return self._fh.tell()
+
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    def commit(self, dest: Path) -> Path:
+        """Move the finished upload to dest (atomic rename, same directory)."""
+        self._fh.close()
+        os.replace(self.tmp_path, dest)
+        return dest
+
+    def discard(self) -> None:
+        try:
+            self._fh.close()
+            os.unlink(self.tmp_path)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        # Werkzeug closes file streams at request teardown: drop anything not committed
+        if os.path.exists(self.tmp_path):
+            self.discard()
+        super().close()
+
+
+class StreamingUploadRequest(Request):
+    """Flask request whose multipart file parts stream into UPLOAD_DIR (see app.request_class)."""
+    upload_dir: Path = Path(os.getenv("UPLOAD_DIR", "/tmp/uploads"))
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingUpload(self.upload_dir)
+
+
+def save_stream(stream, directory: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> HashingUpload:
+    """Raw request body (e.g. PUT /upload) to a HashingUpload, chunk by chunk."""
+    up = HashingUpload(directory, max_bytes)
+    try:
+        while True:
+            chunk = stream.read(CHUNK)
+            if not chunk:
+                break
+            up.write(chunk)
+    except Exception:
+        up.discard()
+        raise
+    return up
+
+
+# ---- Outbound request body ------------------------------------------------------
+class InlineFile:
+    """Stands in for a base64 'data' string; the file (or small bytes) is encoded while sending."""
+
+    def __init__(self, source: Union[str, Path, bytes]):
+        self.source = source
+        self.size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+    def b64_len(self) -> int:
+        return 4 * ((self.size + 2) // 3)
+
+    def chunks(self) -> Iterator[bytes]:
+        fh = io.BytesIO(self.source) if isinstance(self.source, bytes) else open(self.source, "rb")
+        with fh:
+            while True:
+                raw = fh.read(CHUNK)
+                if not raw:
+                    return
+                yield base64.b64encode(raw)
+
+    async def achunks(self) -> AsyncIterator[bytes]:
+        """chunks() for an event loop: every read + encode runs in a worker thread."""
+        if isinstance(self.source, bytes):
+            fh = io.BytesIO(self.source)
+        else:
+            fh = await asyncio.to_thread(open, self.source, "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(_read_b64, fh)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            fh.close()
+
+
+def inline_image(path: Union[str, Path], max_px: int) -> Dict[str, Any]:
+    """
+    inlineData part for an image file: re-encoded at max_px on its long side when
+    larger (0 = as-is), else the file itself, streamed as base64 when sent.
+    """
+    data: Union[bytes, str, Path] = path
+    mime = mimetypes.guess_type(str(path))[0] or "image/jpeg"
+    if max_px > 0:
+        try:
+            from PIL import Image  # deferred: only turns with images pay for it
+            with Image.open(path) as im:
+                if max(im.size) > max_px:
+                    # JPEG: decode at the smallest DCT scale still >= max_px, so peak memory
+                    # follows max_px rather than the photo's resolution
+                    im.draft("RGB", (max_px, max_px))
+                    im.thumbnail((max_px, max_px))
+                    buf = io.BytesIO()
+                    im.convert("RGB").save(buf, format="JPEG", quality=85)
+                    data, mime = buf.getvalue(), "image/jpeg"
+        except Exception:
+            pass
+    return {"inlineData": {"mimeType": mime, "data": InlineFile(data)}}
+
+
+def _read_b64(fh) -> bytes:
+    raw = fh.read(CHUNK)
+    return base64.b64encode(raw) if raw else b""
+
+
+class JSONStreamBody:
+    """Re-iterable request body: JSON text with InlineFile values streamed as base64 strings."""
+
+    def __init__(self, payload: Any):
+        self.files: List[InlineFile] = []
+        marks: Dict[str, int] = {}
+
+        def swap(v: Any) -> Any:
+            if isinstance(v, InlineFile):
+                key = f"\x00inline:{len(self.files)}\x00"
+                marks[json.dumps(key)] = len(self.files)
+                self.files.append(v)
+                return key
+            if isinstance(v, dict):
+                return {k: swap(x) for k, x in v.items()}
+            if isinstance(v, (list, tuple)):
+                return [swap(x) for x in v]
+            return v
+
+        text = json.dumps(swap(payload))
+        # Split the rendered JSON around each placeholder (quotes included)
+        self.segments: List[Union[bytes, InlineFile]] = []
+        for quoted, idx in marks.items():
+            head, _, text = text.partition(quoted)
+            self.segments += [head.encode("utf-8"), self.files[idx]]
+        self.segments.append(text.encode("utf-8"))
+        self.length = sum(len(s) if isinstance(s, bytes) else s.b64_len() + 2 for s in self.segments)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        for seg in self.segments:
+            if isinstance(seg, bytes):
+                if seg:
+                    yield seg
+            else:
+                yield b'"'
+                yield from seg.chunks()
+                yield b'"'
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for seg in self.segments:
+            if isinstance(seg, bytes):
+                if seg:
+                    yield seg
+            else:
+                yield b'"'
+                async for chunk in seg.achunks():
+                    yield chunk
+                yield b'"'
+
+    def headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json", "Content-Length": str(self.length)}
+
+
+def materialize(payload: Any) -> Any:
+    """Payload with InlineFile values encoded in memory (for logging / non-streaming callers)."""
+    if isinstance(payload, InlineFile):
+        return b"".join(payload.chunks()).decode("ascii")
+    if isinstance(payload, dict):
+        return {k: materialize(v) for k, v in payload.items()}
+    if isinstance(payload, (list, tuple)):
+        return [materialize(v) for v in payload]
+    return payload
@@ -0,0 +1,150 @@
+# warmup.py — ADK warm-up and keep-alive, off the request path
+#
+# A daemon thread started with the worker: it waits for ADK, creates (or verifies)
+# the UI session, opens WARMUP_CONNECTIONS pooled connections and, when
+# WARMUP_TURN=true, runs one short turn in a separate session so the model path
+# is warm too. Afterwards it re-touches the pool every KEEPALIVE_S so idle
+# connections are not dropped by ADK or a load balancer between user turns.
+# /health reports liveness and this readiness separately. With WARMUP=false no
+# thread runs and ensure_session() creates the session on the first turn instead.
+import os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+WARMUP             = os.getenv("WARMUP", "true").lower() == "true"
+WARMUP_TURN        = os.getenv("WARMUP_TURN", "false").lower() == "true"   # spends one (cheap) model call per worker
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+KEEPALIVE_S        = float(os.getenv("KEEPALIVE_S", "45"))    # below typical 60 s idle-connection timeouts
+WARMUP_RETRY_MAX_S = float(os.getenv("WARMUP_RETRY_MAX_S", "30"))
+
+STEPS = ("adk", "session", "connections", "turn")
+
+
+class Warmer:
+    def __init__(self, http: Callable[[], Any], adk_url: str, app_name: str, user_id: str, session_id: str,
+                 initial_state: Optional[Dict[str, Any]] = None):
+        self.http = http
+        self.adk_url, self.app_name, self.user_id, self.session_id = adk_url, app_name, user_id, session_id
+        self.initial_state = initial_state or {}
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self.session_ready = threading.Event()
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.keepalives = 0
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # --- lifecycle ---------------------------------------------------------------
+    def ensure_started(self) -> None:
+        """Start the thread once per process (a forked worker gets its own)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.session_ready.clear()
+            self.ready, self.ready_at = False, None
+            self.started_at = time.time()
+            threading.Thread(target=self._run, name="adk-warmup", daemon=True).start()
+
+    def wait_session(self, timeout: float = 8.0) -> bool:
+        """For a turn that arrives mid warm-up: wait (bounded) until the ADK session exists."""
+        return self.session_ready.wait(timeout)
+
+    def ensure_session(self) -> bool:
+        """Synchronous session creation for WARMUP=false (first turn / readiness probe); retried until it works."""
+        if self.session_ready.is_set():
+            return True
+        with self._lock:
+            if not self.session_ready.is_set() and self._step("session", self._ensure_session):
+                self.session_ready.set()
+        return self.session_ready.is_set()
+
+    def _run(self) -> None:
+        delay = 1.0
+        while True:
+            if self.ready:
+                if KEEPALIVE_S <= 0:
+                    return
+                time.sleep(KEEPALIVE_S)
+                self.keepalives += 1
+                if not self._step("connections", self._touch_pool):
+                    self.ready = False   # ADK restarted or unreachable: warm up again (recreates the session)
+            elif self._warm():
+                delay = 1.0
+            else:
+                time.sleep(delay)
+                delay = min(WARMUP_RETRY_MAX_S, delay * 2)
+
+    # --- steps -------------------------------------------------------------------
+    def _step(self, name: str, fn: Callable[[], Any]) -> bool:
+        t0 = time.perf_counter()
+        try:
+            detail = fn()
+            self.checks[name] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1), "at": time.time(),
+                                 **(detail or {})}
+            return True
+        except Exception as e:
+            self.checks[name] = {"ok": False, "error": f"{type(e).__name__}: {e}", "at": time.time()}
+            return False
+
+    def _warm(self) -> bool:
+        if not self._step("adk", self._ping):
+            return False
+        if not self._step("session", self._ensure_session):
+            return False
+        self.session_ready.set()
+        self._step("connections", self._touch_pool)
+        if WARMUP_TURN:
+            self._step("turn", self._noop_turn)   # best effort: readiness does not depend on it
+        self.ready = True
+        self.ready_at = time.time()
+        return True
+
+    def _ping(self) -> None:
+        self.http().get(f"{self.adk_url}/list-apps", timeout=5).raise_for_status()
+
+    def _session_url(self, session_id: str) -> str:
+        return f"{self.adk_url}/apps/{self.app_name}/users/{self.user_id}/sessions/{session_id}"
+
+    def _ensure_session(self) -> Dict[str, Any]:
+        r = self.http().post(self._session_url(self.session_id), json={"state": self.initial_state}, timeout=8)
+        if r.status_code in (400, 409):   # already exists (durable session store or another worker)
+            self.http().get(self._session_url(self.session_id), timeout=8).raise_for_status()
+            return {"created": False}
+        r.raise_for_status()
+        return {"created": True}
+
+    def _touch_pool(self) -> Dict[str, Any]:
+        # Concurrent requests make the pool open (or keep) that many sockets at once
+        n = max(1, WARMUP_CONNECTIONS)
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            codes = list(pool.map(lambda _: self.http().get(f"{self.adk_url}/list-apps", timeout=5).status_code,
+                                  range(n)))
+        if any(c >= 400 for c in codes):
+            raise RuntimeError(f"keep-alive statuses {codes}")
+        return {"connections": n}
+
+    def _noop_turn(self) -> None:
+        sid = f"{self.session_id}-warmup-{os.getpid()}"
+        self.http().post(self._session_url(sid), json={"state": self.initial_state}, timeout=8)
+        r = self.http().post(f"{self.adk_url}/run", timeout=60, json={
+            "app_name": self.app_name, "user_id": self.user_id, "session_id": sid,
+            "new_message": {"role": "user", "parts": [{"text": "ping"}]},
+        })
+        r.raise_for_status()
+        try:
+            self.http().delete(self._session_url(sid), timeout=5)
+        except Exception:
+            pass
+
+    # --- reporting ---------------------------------------------------------------
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready, "session_ready": self.session_ready.is_set(),
+            "warmup_s": round(self.ready_at - self.started_at, 2) if self.ready_at and self.started_at else None,
+            "checks": {k: self.checks[k] for k in STEPS if k in self.checks},
+            "keepalive_s": KEEPALIVE_S, "keepalives": self.keepalives,
+        }
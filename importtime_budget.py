@@ -0,0 +1,99 @@
+# importtime_budget.py — cold-start import budget for the agent and the UI
+#
+# Each target runs in a fresh interpreter under `python -X importtime`; the
+# report gives total import time, the part spent in this repo's own modules,
+# and the slowest imports. Exits 1 when a target is over budget or imports a
+# module it must not load at startup, so a regression fails CI / a deploy step:
+#   python importtime_budget.py [--runs 3] [--scale 1.5] [--top 8]
+import argparse, json, os, re, subprocess, sys
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+OWN = ("src", "frontend", "agent_gateway", "agent_gateway_async")
+
+# total_ms: everything imported; own_ms: self time of this repo's modules only.
+# Time budgets sit about 1.5x above a typical best-of-3 run (root_agent: ~6.5 s
+# total, ~10 ms own); tests/test_importtime.py runs this script.
+# forbid: modules that must stay deferred until a request actually needs them.
+BUDGETS: Dict[str, Dict[str, Any]] = {
+    "frontend.app": {
+        "stmt": "import frontend.app",
+        "env": {"WARMUP": "false"},   # the warm-up thread loads requests right after import, by design
+        "total_ms": 400, "own_ms": 40,
+        "forbid": ["google.adk", "numpy", "PIL", "requests", "sqlite3"],
+    },
+    "src.agent.vision.phash": {   # the UI's near-duplicate photo lookup
+        "stmt": "import src.agent.vision.phash",
+        "total_ms": 250, "own_ms": 20,
+        "forbid": ["google.adk", "PIL"],
+    },
+    "src.agent.portfolio": {
+        "stmt": "import src.agent.portfolio",
+        "total_ms": 150, "own_ms": 20,
+        "forbid": ["google.adk", "numpy"],
+    },
+    "root_agent": {               # what `adk api_server` loads on the first request
+        "stmt": "import src.agent as a; a.root_agent",
+        "total_ms": 10000, "own_ms": 16,
+        "forbid": ["numpy", "src.agent.vision.leaf_classifier", "src.agent.data.soil_store"],
+    },
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(stmt: str, extra_env: Dict[str, str] = {}) -> Tuple[float, float, List[Tuple[float, str]], set]:
+    """(total_ms, own_ms, [(cumulative_ms, module)], imported names) for one fresh interpreter."""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONWARNINGS": "ignore", **extra_env}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", stmt], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{stmt!r} failed:\n{proc.stderr[-2000:]}")
+    total = own = 0.0
+    tops: List[Tuple[float, str]] = []
+    names = set()
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        names.add(name)
+        total += self_us / 1000
+        if name.split(".", 1)[0] in OWN:
+            own += self_us / 1000
+        if len(indent) <= 3:        # the statement's imports and what they import directly
+            tops.append((cum_us / 1000, name))
+    return total, own, sorted(tops, reverse=True), names
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3, help="fresh interpreters per target; the fastest counts")
+    ap.add_argument("--scale", type=float, default=float(os.getenv("IMPORT_BUDGET_SCALE", "1.0")),
+                    help="multiply time budgets (slow CI machines)")
+    ap.add_argument("--top", type=int, default=5)
+    ap.add_argument("targets", nargs="*", default=list(BUDGETS))
+    a = ap.parse_args()
+
+    failed = False
+    report: Dict[str, Any] = {}
+    for name in a.targets:
+        b = BUDGETS[name]
+        runs = [measure(b["stmt"], b.get("env", {})) for _ in range(max(1, a.runs))]
+        total, own, tops, names = min(runs, key=lambda r: r[0])
+        loaded = sorted({f for f in b["forbid"] for n in names if n == f or n.startswith(f + ".")})
+        over = [k for k, v in (("total_ms", total), ("own_ms", own)) if v > b[k] * a.scale]
+        ok = not over and not loaded
+        failed |= not ok
+        report[name] = {
+            "ok": ok, "total_ms": round(total, 1), "total_budget_ms": b["total_ms"] * a.scale,
+            "own_ms": round(own, 1), "own_budget_ms": b["own_ms"] * a.scale,
+            "over": over, "forbidden_loaded": loaded,
+            "slowest": [f"{n} {ms:.1f}ms" for ms, n in tops[:a.top]],
+        }
+    print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
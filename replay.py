@@ -0,0 +1,454 @@
+# replay.py — trace-replay benchmark: re-drive recorded /run_plan traffic against the pipeline
+#
+# The UI journals every /run_plan and /jobs request (query, upload hashes, arrival
+# time; src/agent/journal.py). `extract` turns those records into a trace, `run`
+# replays it at the original pace (or --speed times faster, 0 = back to back)
+# against one target, with the model stubbed (src/agent/stubs.py), and writes a
+# report; `compare` puts two reports side by side and exits 1 on a regression:
+#   python replay.py extract [--journal DIR] [--since EPOCH] -o trace.jsonl
+#   python replay.py run trace.jsonl --target root|gateway|flask [--speed 1] -o run.json
+#   python replay.py compare base.json run.json [--threshold 0.10]
+# Targets: root — root_agent on an in-process ADK Runner; gateway — agent_gateway_async;
+# flask — the UI's /run_plan (test client, or a live UI with --url). gateway and
+# flask talk to an in-process ADK server unless --adk-url points at one (start it
+# with STUB_LLM=true). Per-stage latency comes from the run's own journal (UI and
+# gateway turns, tool receipts) and, for root, from the agents' event timings.
+import argparse, asyncio, json, os, random, socket, sys, tempfile, threading, time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TARGETS = ("root", "gateway", "flask")
+
+
+# ---- trace --------------------------------------------------------------------
+def extract(journal_dir: str, since: Optional[float]) -> List[Dict[str, Any]]:
+    """Journal 'request' records -> trace rows {t, query, images, location}, t in seconds from the first."""
+    from src.agent.journal import read
+    from src.agent.data.gazetteer import extract_location
+    rows = sorted(read(Path(journal_dir), ["request"], since), key=lambda r: r["ts"])
+    if not rows:
+        return []
+    t0 = rows[0]["ts"]
+    out = []
+    for r in rows:
+        place = extract_location(r.get("query") or "")
+        out.append({"t": round(r["ts"] - t0, 3), "query": r.get("query") or "", "images": r.get("images") or [],
+                    "location": place["id"] if place else None, "route": r.get("route")})
+    return out
+
+
+def load_trace(path: str, limit: Optional[int]) -> List[Dict[str, Any]]:
+    rows = [json.loads(line) for line in open(path) if line.strip()]
+    rows.sort(key=lambda r: r.get("t", 0))
+    return rows[:limit] if limit else rows
+
+
+def resolve_images(row: Dict[str, Any], search: List[Path], spool: Path) -> List[str]:
+    """Local files for a row's uploads: the recorded path, a file with the same content hash, else a stand-in."""
+    uris = []
+    for img in row.get("images") or []:
+        uri, sha = img.get("uri") or "", img.get("sha")
+        path = Path(uri.replace("file://", "")) if uri else None
+        if not (path and path.exists()) and sha:
+            path = next((p for d in search if d.exists() for p in d.glob(f"*-{sha}.*")), None)
+        if not (path and path.exists()):
+            # Same hash -> same stand-in, so repeats still look like repeats to the caches
+            key = sha or f"{random.getrandbits(48):012x}"
+            path = spool / f"replay-{key}.jpg"
+            if not path.exists():
+                from PIL import Image
+                rnd = random.Random(key)
+                im = Image.new("RGB", (256, 256), (rnd.randrange(40, 90), rnd.randrange(100, 180), rnd.randrange(30, 80)))
+                for _ in range(40):
+                    x, y = rnd.randrange(256), rnd.randrange(256)
+                    im.paste((rnd.randrange(90, 160), rnd.randrange(60, 120), 30), (x, y, x + 12, y + 12))
+                im.save(path, quality=85)
+        uris.append("file://" + str(path))
+    return uris
+
+
+# ---- stats --------------------------------------------------------------------
+def pcts(xs: List[float]) -> Dict[str, float]:
+    if not xs:
+        return {"n": 0}
+    xs = sorted(xs)
+    at = lambda q: round(xs[min(len(xs) - 1, int(len(xs) * q))], 1)
+    return {"n": len(xs), "p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": round(xs[-1], 1),
+            "mean": round(sum(xs) / len(xs), 1)}
+
+
+def _cache_counters() -> Dict[str, Dict[str, float]]:
+    """Process-wide cache counters of the agent code loaded in this process."""
+    out: Dict[str, Dict[str, float]] = {}
+    for name, mod, fn in (("plan", "src.agent.plan", "plan_cache_stats"),
+                          ("location", "src.agent.data.gazetteer", "location_cache_stats")):
+        if mod in sys.modules:
+            s = getattr(sys.modules[mod], fn)()
+            out[name] = {"hits": s.get("hits", 0), "misses": s.get("misses", 0)}
+    if "src.agent.tools.prefetch" in sys.modules:
+        s = sys.modules["src.agent.tools.prefetch"].prefetch_stats()
+        out["prefetch"] = {"hits": s.get("hits", 0), "misses": s.get("launched", 0) - s.get("hits", 0)}
+    return out
+
+
+def _cache_delta(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    out = {}
+    for name, a in after.items():
+        b = before.get(name, {})
+        hits, misses = a["hits"] - b.get("hits", 0), a["misses"] - b.get("misses", 0)
+        out[name] = {"hits": hits, "misses": misses,
+                     "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None}
+    return out
+
+
+# ---- targets ------------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_adk(session_uri: Optional[str]) -> str:
+    """ADK api_server for this repo's agent in a background thread; returns its URL."""
+    import uvicorn
+    from google.adk.cli.fast_api import get_fast_api_app
+    from src.agent.session_store import register
+    register()
+    port = _free_port()
+    app = get_fast_api_app(agents_dir=ROOT, session_service_uri=session_uri, web=False, port=port)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="replay-adk", daemon=True).start()
+    url = f"http://127.0.0.1:{port}"
+    import requests
+    for _ in range(300):
+        try:
+            if requests.get(f"{url}/list-apps", timeout=1).ok:
+                return url
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("in-process ADK server did not start")
+
+
+class RootTarget:
+    """root_agent on an ADK Runner in this process: per-agent stage timings from event arrival."""
+
+    def __init__(self, sessions: int, session_uri: Optional[str]):
+        from google.adk.runners import Runner
+        from google.adk.sessions import InMemorySessionService
+        import src.agent as agent
+        if session_uri:
+            from src.agent.session_store import session_service_factory
+            self.svc = session_service_factory(session_uri)
+        else:
+            self.svc = InMemorySessionService()
+        self.runner = Runner(app_name="src", agent=agent.root_agent, session_service=self.svc)
+        self.sessions = max(1, sessions)
+        self._created: Dict[str, asyncio.Future] = {}
+
+    async def _create(self, sid: str) -> None:
+        if not await self.svc.get_session(app_name="src", user_id="replay", session_id=sid):
+            await self.svc.create_session(app_name="src", user_id="replay", session_id=sid, state={})
+
+    async def __call__(self, i: int, row: Dict[str, Any], uris: List[str]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        import mimetypes
+        from google.genai import types
+        sid = f"replay-{i % self.sessions}"
+        if sid not in self._created:
+            self._created[sid] = asyncio.ensure_future(self._create(sid))
+        await self._created[sid]
+        parts = [types.Part(text=row.get("query") or "")]
+        for u in uris:
+            p = u.replace("file://", "")
+            parts.append(types.Part.from_bytes(data=Path(p).read_bytes(),
+                                               mime_type=mimetypes.guess_type(p)[0] or "image/jpeg"))
+        delta = {"image_uris": uris, "uploaded_image_uri": uris[0] if uris else None}
+        if row.get("location"):
+            delta["location"] = row["location"]
+        stages: Dict[str, float] = defaultdict(float)
+        tokens = Counter()
+        error = None
+        last = time.perf_counter()
+        async for ev in self.runner.run_async(user_id="replay", session_id=sid, state_delta=delta,
+                                              new_message=types.Content(role="user", parts=parts)):
+            now = time.perf_counter()
+            stages[f"agent:{ev.author}"] += (now - last) * 1000
+            last = now
+            if ev.error_message:
+                error = ev.error_message
+            um = ev.usage_metadata
+            if um:
+                tokens["tokens_in"] += um.prompt_token_count or 0
+                tokens["tokens_out"] += um.candidates_token_count or 0
+        return {"error": error or "", "metrics": dict(tokens)}, dict(stages)
+
+
+class GatewayTarget:
+    def __init__(self):
+        import agent_gateway_async
+        self.gw = agent_gateway_async
+        self._session = None
+
+    async def __call__(self, i: int, row: Dict[str, Any], uris: List[str]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        if self._session is None:
+            self._session = asyncio.ensure_future(self._ensure())
+        await self._session
+        return await self.gw.run_agent_once(row.get("query") or "", image_uris=uris), {}
+
+    async def _ensure(self) -> None:
+        try:
+            await self.gw.ensure_session()
+        except Exception:
+            pass   # already exists
+
+
+class FlaskTarget:
+    """The UI's /run_plan: in-process test client, or a live UI (--url)."""
+
+    def __init__(self, url: Optional[str]):
+        self.url = url.rstrip("/") if url else None
+        if self.url:
+            import requests
+            self.http = requests.Session()
+        else:
+            import frontend.app as ui
+            self.ui = ui
+            ui.WARMER.ensure_started()
+            ui.WARMER.wait_session(30)
+
+    def _post(self, row: Dict[str, Any], uris: List[str]) -> Dict[str, Any]:
+        form = {"query": row.get("query") or "", "image_uris": json.dumps(uris)}
+        if self.url:
+            r = self.http.post(f"{self.url}/run_plan", data=form, timeout=300)
+            status, body = r.status_code, (r.json() if r.headers.get("content-type", "").startswith("application/json") else {})
+        else:
+            r = self.ui.app.test_client().post("/run_plan", data=form)
+            status, body = r.status_code, r.get_json(silent=True) or {}
+        if status in (429, 503):
+            raise Rejected(body.get("error") or str(status))
+        if status >= 400:
+            raise RuntimeError(body.get("error") or f"HTTP {status}")
+        return body
+
+    async def __call__(self, i: int, row: Dict[str, Any], uris: List[str]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        return await asyncio.to_thread(self._post, row, uris), {}
+
+
+class Rejected(Exception):
+    pass
+
+
+# ---- run ----------------------------------------------------------------------
+async def drive(target: Any, rows: List[Dict[str, Any]], images: List[List[str]], speed: float,
+                concurrency: int) -> Tuple[List[Dict[str, Any]], float]:
+    gate = asyncio.Semaphore(max(1, concurrency))
+    results: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+
+    async def one(i: int, row: Dict[str, Any], due: float) -> None:
+        async with gate:
+            t0 = time.perf_counter()
+            res: Dict[str, Any] = {"i": i, "lag_ms": (t0 - due) * 1000, "images": len(images[i])}
+            try:
+                out, stages = await target(i, row, images[i])
+                res.update(ok=not out.get("error"), error=out.get("error") or None, stages=stages,
+                           metrics=out.get("metrics") or {})
+                if out.get("error"):
+                    res["error_kind"] = "agent_error"
+            except Rejected as e:
+                res.update(ok=False, error=str(e), error_kind="rejected")
+            except Exception as e:
+                res.update(ok=False, error=f"{type(e).__name__}: {e}", error_kind=type(e).__name__)
+            res["ms"] = (time.perf_counter() - t0) * 1000
+            results.append(res)
+
+    tasks = []
+    t_first = rows[0].get("t", 0) if rows else 0
+    for i, row in enumerate(rows):
+        due = start + ((row.get("t", 0) - t_first) / speed if speed > 0 else 0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i, row, due)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def report(a: argparse.Namespace, rows: List[Dict[str, Any]], results: List[Dict[str, Any]], wall_s: float,
+           journal_dir: Path, caches: Dict[str, Any]) -> Dict[str, Any]:
+    from src.agent.journal import journal, read
+    journal().flush()
+    stages: Dict[str, List[float]] = defaultdict(list)
+    stages["turn"] = [r["ms"] for r in results]
+    stages["schedule_lag"] = [max(0.0, r["lag_ms"]) for r in results]
+    for r in results:
+        for k, v in (r.get("stages") or {}).items():
+            stages[k].append(v)
+    for rec in read(journal_dir, ["turn", "receipt"]):
+        if rec["kind"] == "turn" and rec.get("ms") is not None:
+            stages[f"{rec.get('source')}_turn"].append(rec["ms"])
+        elif rec["kind"] == "receipt":
+            # One sample per call: run_plan's own receipt, not the tool's self-reported one as well
+            out = rec.get("output") or {}
+            if out.get("synthetic") and isinstance(out.get("cost_ms"), (int, float)):
+                stages[f"tool:{rec.get('tool')}"].append(out["cost_ms"])
+    kinds = Counter(r.get("error_kind") for r in results if not r["ok"])
+    tokens = Counter()
+    for r in results:
+        for k in ("tokens_in", "tokens_out"):
+            tokens[k] += int((r.get("metrics") or {}).get(k) or 0)
+    span = (rows[-1].get("t", 0) - rows[0].get("t", 0)) if rows else 0
+    n = len(results)
+    return {
+        "target": a.target, "trace": a.trace, "requests": n, "speed": a.speed, "concurrency": a.concurrency,
+        "stub_tools": a.stub_tools, "wall_s": round(wall_s, 2),
+        "offered_rps": round(n / (span / a.speed), 2) if a.speed > 0 and span > 0 else None,
+        "throughput_rps": round(n / wall_s, 2) if wall_s else None,
+        "errors": {"total": sum(kinds.values()), "rate": round(sum(kinds.values()) / n, 4) if n else 0,
+                   "by_kind": dict(kinds), "sample": [r["error"] for r in results if not r["ok"]][:5]},
+        "latency_ms": {k: pcts(v) for k, v in sorted(stages.items())},
+        "caches": caches,
+        "tokens": dict(tokens),
+        "created": time.time(),
+    }
+
+
+def run(a: argparse.Namespace) -> Dict[str, Any]:
+    # The run gets its own journal so per-stage numbers cover exactly these turns
+    journal_dir = Path(a.journal_out or tempfile.mkdtemp(prefix="replay-journal-"))
+    os.environ["JOURNAL"] = "true"
+    os.environ["JOURNAL_DIR"] = str(journal_dir)
+    sys.path.insert(0, ROOT)
+
+    if not a.real_llm:
+        from src.agent.stubs import install_llm
+        install_llm()
+    if a.target in ("gateway", "flask") and not a.url:
+        os.environ["ADK_SERVER_URL"] = a.adk_url or start_adk(a.session_uri)
+    if a.stub_tools:
+        from src.agent.stubs import install_tools
+        install_tools(a.tool_ms)
+
+    rows = load_trace(a.trace, a.limit)
+    spool = Path(tempfile.mkdtemp(prefix="replay-images-"))
+    search = [Path(d) for d in a.images] + [Path(os.getenv("UPLOAD_DIR", "/tmp/uploads"))]   # the UI's default
+    images = [resolve_images(r, search, spool) for r in rows]
+
+    target = (RootTarget(a.sessions, a.session_uri) if a.target == "root" else
+              GatewayTarget() if a.target == "gateway" else FlaskTarget(a.url))
+    before = _cache_counters()
+    results, wall_s = asyncio.run(drive(target, rows, images, a.speed, a.concurrency))
+    return report(a, rows, results, wall_s, journal_dir, _cache_delta(before, _cache_counters()))
+
+
+# ---- compare ------------------------------------------------------------------
+def _flat(r: Dict[str, Any]) -> Dict[str, Tuple[Optional[float], str]]:
+    """metric -> (value, 'lower' | 'higher' is better | 'rate' lower is better, absolute)."""
+    out: Dict[str, Tuple[Optional[float], str]] = {"throughput_rps": (r.get("throughput_rps"), "higher"),
+                                                   "error_rate": (r["errors"]["rate"], "rate")}
+    for stage, p in r.get("latency_ms", {}).items():
+        if stage == "schedule_lag":
+            continue
+        for q in ("p50", "p90", "p99"):
+            if q in p:
+                out[f"{stage}.{q}"] = (p[q], "lower")
+    for name, c in (r.get("caches") or {}).items():
+        out[f"cache.{name}.hit_rate"] = (c.get("hit_rate"), "higher_rate")
+    return out
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float, rate_threshold: float
+            ) -> Tuple[List[List[str]], List[str]]:
+    fb, fn = _flat(base), _flat(new)
+    rows, regressions = [], []
+    for k in list(fb) + [k for k in fn if k not in fb]:
+        b, kind = fb.get(k, (None, None))
+        n, kind_new = fn.get(k, (None, None))
+        kind = kind or kind_new
+        delta, flag = "", ""
+        if b is not None and n is not None:
+            if kind in ("rate", "higher_rate"):
+                d = n - b
+                delta = f"{d:+.3f}"
+                worse = d > rate_threshold if kind == "rate" else -d > rate_threshold
+            elif kind == "lower":
+                d = (n - b) / b if b else (float("inf") if n > b else 0.0)
+                delta = f"{d * 100:+.1f}%" if b else f"{n - b:+g}"
+                worse = d > threshold and n - b >= 1.0   # ignore sub-millisecond noise
+            else:
+                d = (n - b) / b if b else 0.0
+                delta = f"{d * 100:+.1f}%"
+                worse = -d > threshold
+            if worse:
+                flag = "REGRESSION"
+                regressions.append(k)
+        rows.append([k, "-" if b is None else f"{b:g}", "-" if n is None else f"{n:g}", delta, flag])
+    return rows, regressions
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ex = sub.add_parser("extract", help="journal 'request' records -> trace.jsonl")
+    ex.add_argument("--journal", default=os.getenv("JOURNAL_DIR", "/tmp/farmagent/journal"))
+    ex.add_argument("--since", type=float)
+    ex.add_argument("-o", "--out", default="-")
+
+    rp = sub.add_parser("run", help="replay a trace against a target")
+    rp.add_argument("trace")
+    rp.add_argument("--target", choices=TARGETS, default="root")
+    rp.add_argument("--speed", type=float, default=1.0, help="x original pace; 0 = back to back")
+    rp.add_argument("--concurrency", type=int, default=64, help="max turns in flight")
+    rp.add_argument("--limit", type=int)
+    rp.add_argument("--sessions", type=int, default=8, help="root target: sessions the turns rotate over")
+    rp.add_argument("--session-uri", help="session service (e.g. sqlitewal:///tmp/replay.sqlite); default memory")
+    rp.add_argument("--adk-url", help="gateway/flask: existing ADK server (run it with STUB_LLM=true)")
+    rp.add_argument("--url", help="flask: a running UI instead of the in-process test client")
+    rp.add_argument("--images", action="append", default=[], help="directories searched for uploads by hash")
+    rp.add_argument("--stub-tools", action="store_true", help="fixed-latency fake tools instead of the real ones")
+    rp.add_argument("--tool-ms", type=float, default=float(os.getenv("STUB_TOOL_MS", "20")))
+    rp.add_argument("--real-llm", action="store_true", help="do not stub the model (spends real calls)")
+    rp.add_argument("--journal-out", help="keep the run's journal here")
+    rp.add_argument("-o", "--out")
+
+    cp = sub.add_parser("compare", help="two run reports side by side")
+    cp.add_argument("base")
+    cp.add_argument("new")
+    cp.add_argument("--threshold", type=float, default=0.10, help="relative latency / throughput change")
+    cp.add_argument("--rate-threshold", type=float, default=0.02, help="absolute error / hit-rate change")
+    a = ap.parse_args()
+
+    if a.cmd == "extract":
+        sys.path.insert(0, ROOT)
+        rows = extract(a.journal, a.since)
+        f = sys.stdout if a.out == "-" else open(a.out, "w")
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+        if f is not sys.stdout:
+            f.close()
+            print(f"{len(rows)} requests -> {a.out}", file=sys.stderr)
+        return 0
+
+    if a.cmd == "run":
+        rep = run(a)
+        text = json.dumps(rep, indent=2)
+        if a.out:
+            Path(a.out).write_text(text)
+        print(text)
+        return 0
+
+    base, new = json.loads(Path(a.base).read_text()), json.loads(Path(a.new).read_text())
+    rows, regressions = compare(base, new, a.threshold, a.rate_threshold)
+    head = ["metric", Path(a.base).name, Path(a.new).name, "delta", ""]
+    widths = [max(len(str(r[i])) for r in rows + [head]) for i in range(len(head))]
+    for r in [head] + rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(r, widths)).rstrip())
+    print(f"\n{len(regressions)} regression(s)" + (f": {', '.join(regressions)}" if regressions else ""))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,7 @@
-from src.agent.orchestrator import root_agent
+# root_agent is built on first access, so importing a submodule (the UI's photo
+# cache lookup, the data-store CLIs) does not load ADK and every tool.
+def __getattr__(name: str):
+    if name == "root_agent":
+        from src.agent.orchestrator import root_agent
+        return root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,5 @@
 from google.adk.agents import LlmAgent
-from ..tools import run_plan_tool
+from ..tools.registry import LazyToolset
 from .governor import governor_callback
 
 # Minimal executor: call run_plan_tool exactly once, then stop.
@@ -10,6 +10,6 @@ executor_agent = LlmAgent(
         "`run_plan_tool` exactly once, then finish. Do not add free text."
     ),
     model="gemini-2.5-flash",
-    tools=[run_plan_tool],
+    tools=[LazyToolset(["run_plan_tool"])],
     before_model_callback=governor_callback,
 )
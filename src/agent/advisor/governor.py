@@ -4,6 +4,8 @@ import re, os
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
+from ..journal import context_ids, record
+
 # --- lightweight rules ------------
 _PESTICIDE_TERMS = re.compile(
     r"\b(pesticide|insecticide|fungicide|glyphosate|roundup|spray)\b", re.I
@@ -24,7 +26,7 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
-def _log(state: Dict[str, Any], action: str, reason: str, confidence: float = 1.0) -> None:
+def _log(state: Dict[str, Any], action: str, reason: str, confidence: float = 1.0, ctx: Any = None) -> None:
     log: List[Dict[str, Any]] = state.setdefault("governor_log", [])
     log.append(
         {
@@ -34,6 +36,7 @@ def _log(state: Dict[str, Any], action: str, reason: str, confidence: float = 1.
             "timestamp": _now_iso(),
         }
     )
+    record("governor", **context_ids(ctx), action=action, reason=reason, confidence=confidence)
 
 
 def _ensure_state(callback_context: Any) -> Dict[str, Any]:
@@ -83,7 +86,7 @@ def governor_callback(callback_context: Any, llm_request: Optional[Any]) -> None
         except Exception:
             confidence = 1.0
 
-        _log(state, "keep_model", f"using {model_str}", confidence)
+        _log(state, "keep_model", f"using {model_str}", confidence, callback_context)
 
         # Build a conservative text context from state 
         ctx_text = (
@@ -99,7 +102,7 @@ def governor_callback(callback_context: Any, llm_request: Optional[Any]) -> None
         if _PESTICIDE_TERMS.search(ctx_text):
             state["awaiting_fields"] = ["safety_confirmation"]
             state["loop_terminated"] = False
-            _log(state, "block", "Pesticide-related request; require explicit confirmation.", confidence)
+            _log(state, "block", "Pesticide-related request; require explicit confirmation.", confidence, callback_context)
             # cancel the LLM call for this turn (tool path can still proceed)
             try:
                 if llm_request is not None:
@@ -112,7 +115,7 @@ def governor_callback(callback_context: Any, llm_request: Optional[Any]) -> None
         if _WEATHER_HINTS.search(ctx_text) and not state.get("location"):
             state["awaiting_fields"] = ["location"]
             state["loop_terminated"] = False
-            _log(state, "block", "Weather context requested but 'location' missing.", confidence)
+            _log(state, "block", "Weather context requested but 'location' missing.", confidence, callback_context)
             try:
                 if llm_request is not None:
                     setattr(llm_request, "model", None)
@@ -127,6 +130,7 @@ def governor_callback(callback_context: Any, llm_request: Optional[Any]) -> None
                 "ask_for_image",
                 "Symptoms mentioned but no image provided; attach one for crop_id/diagnose.",
                 confidence,
+                callback_context,
             )
             awaiting = set(state.get("awaiting_fields", []))
             awaiting.add("image")
@@ -136,6 +140,6 @@ def governor_callback(callback_context: Any, llm_request: Optional[Any]) -> None
         # Fail-safe: never propagate to HTTP layer
         try:
             state = _ensure_state(callback_context)
-            _log(state, "governor_failed_safe", f"{type(e).__name__}: {e}", 1.0)
+            _log(state, "governor_failed_safe", f"{type(e).__name__}: {e}", 1.0, callback_context)
         except Exception:
             pass
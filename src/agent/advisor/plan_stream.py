@@ -0,0 +1,121 @@
+from __future__ import annotations
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class PlanStreamParser:
+    """
+    Incremental scanner over (streamed) planner text.
+
+    Tracks string/escape state and bracket depth of the first top-level JSON
+    object, and emits each element of its "steps" array as soon as the
+    element's closing brace arrives, so execution can start while the model
+    is still generating later steps. Text before the object (```json fences,
+    prose) is ignored. Each element is validated against `allowed` on its own.
+    """
+
+    def __init__(self, allowed: Optional[Iterable[str]] = None):
+        self.allowed = set(allowed) if allowed is not None else None
+        self.text = ""
+        self.steps: List[Dict[str, Any]] = []
+        self.rejected: List[Dict[str, Any]] = []
+        self.done = False
+        self._pos = 0
+        self._obj_start: Optional[int] = None
+        self._obj_end: Optional[int] = None
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._last_str: Optional[str] = None
+        self._key: Optional[str] = None
+        self._in_steps = False
+        self._elem_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume more text; return the steps completed (and accepted) by it."""
+        if self.done or not chunk:
+            return []
+        self.text += chunk
+        emitted: List[Dict[str, Any]] = []
+        text, i, n = self.text, self._pos, len(self.text)
+
+        while i < n and not self.done:
+            c = text[i]
+            if self._obj_start is None:
+                if c == "{":
+                    self._obj_start = i
+                    self._depth = 1
+                i += 1
+                continue
+
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        try:
+                            self._last_str = json.loads(text[self._str_start:i + 1])
+                        except Exception:
+                            self._last_str = None
+                i += 1
+                continue
+
+            if c == '"':
+                self._in_str = True
+                self._str_start = i
+            elif c == ":" and self._depth == 1:
+                self._key = self._last_str
+            elif c == "," and self._depth == 1:
+                self._key = None
+            elif c in "{[":
+                if c == "[" and self._depth == 1 and self._key == "steps":
+                    self._in_steps = True
+                elif c == "{" and self._in_steps and self._depth == 2:
+                    self._elem_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if c == "}" and self._in_steps and self._depth == 2 and self._elem_start is not None:
+                    step = self._accept(text[self._elem_start:i + 1])
+                    if step is not None:
+                        emitted.append(step)
+                    self._elem_start = None
+                elif c == "]" and self._in_steps and self._depth == 1:
+                    self._in_steps = False
+                    self._key = None
+                elif self._depth == 0:
+                    self._obj_end = i + 1
+                    self.done = True
+            i += 1
+
+        self._pos = i
+        return emitted
+
+    def _accept(self, blob: str) -> Optional[Dict[str, Any]]:
+        try:
+            step = json.loads(blob)
+        except Exception:
+            return None
+        if not isinstance(step, dict):
+            return None
+        if self.allowed is not None and str(step.get("tool", "")) not in self.allowed:
+            self.rejected.append(step)
+            return None
+        self.steps.append(step)
+        return step
+
+    def plan(self) -> Optional[Dict[str, Any]]:
+        """The complete plan object once the top-level object has closed."""
+        if not self.done or self._obj_start is None:
+            return None
+        try:
+            parsed = json.loads(self.text[self._obj_start:self._obj_end])
+        except Exception:
+            return None
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("steps"), list):
+            return None
+        return parsed
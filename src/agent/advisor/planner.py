@@ -1,4 +1,5 @@
-import json, re
+import json, os, re, threading
+from collections import Counter
 from typing import Any, Dict, List, Optional
 
 from google.adk.agents import LlmAgent
@@ -7,11 +8,13 @@ from google.adk.models import LlmRequest
 
 from .prompts import PLANNER_INSTRUCTION
 from .governor import governor_callback
-from ..tools import (
-    quality_gate_tool, crop_id_tool, diagnose_leaf_tool,
-    get_weather_tool, get_soil_tool,
-    recommend_fertilizer_tool, market_insight_tool, exit_loop_tool
-)
+from .plan_stream import PlanStreamParser
+from ..tools import prefetch
+from ..tools.registry import LazyToolset
+from ..tools.utils import bind_turn
+from ..tools.diagnose_leaf import image_args
+from ..data.gazetteer import resolve_turn
+from ..plan import ALLOWED_TOOLS, compile_plan
 
 DEFAULT_STATE = {
     "core_context": "General farm advisory request",
@@ -19,28 +22,44 @@ DEFAULT_STATE = {
     "governor_log": [],
     "receipts": [],
     "uploaded_image_uri": None,
+    "image_uris": [],
     "location": None,
+    "location_resolved": None,
 }
 
 # Accept both spellings for the exit tool, and all real tools registered.
-_ALLOWED_TOOLS = {
+_ALLOWED_TOOLS = ALLOWED_TOOLS
+
+# Steps that need no earlier receipts and can start while the plan still streams
+_EAGER_TOOLS = {
     "crop_id_tool",
     "diagnose_leaf_tool",
     "get_weather_tool",
     "get_soil_tool",
-    "quality_gate_tool",
-    "recommend_fertilizer_tool",
     "market_insight_tool",
-    "exit_loop_tool",
-    "exit_loop_tool_fn",
 }
 
+# Opt-in: execute eager steps as the planner's JSON streams in (needs SSE streaming)
+PIPELINE_PLAN = os.getenv("AGENT_PIPELINE_PLAN", "false").lower() == "true"
+
+# invocation_id -> parser fed by partial planner responses
+_STREAMS: Dict[str, PlanStreamParser] = {}
+
+# Process-wide histogram: planner LLM calls per turn (expect {1: n} in the common case)
+_ITERATIONS: Counter = Counter()
+_ITER_LOCK = threading.Lock()
+
 _json_re = re.compile(r"\{[\s\S]*\}", re.M)
 
 def _extract_json_blob(text: str) -> Optional[str]:
     m = _json_re.search(text or "")
     return m.group(0) if m else None
 
+def _user_text(callback_context: CallbackContext) -> str:
+    content = getattr(callback_context, "user_content", None)
+    parts = getattr(content, "parts", None) or []
+    return " ".join(p.text for p in parts if getattr(p, "text", None))
+
 def before_planner_callback(
     callback_context: CallbackContext,
     llm_request: Optional[LlmRequest] = None,
@@ -53,12 +72,33 @@ def before_planner_callback(
     for k, v in DEFAULT_STATE.items():
         state.setdefault(k, v)
 
+    # Per-turn planner call count (reset when a new invocation starts)
+    inv_id = getattr(callback_context, "invocation_id", None)
+    stats = dict(state.get("planner_stats") or {})
+    if stats.get("invocation_id") != inv_id:
+        stats = {"invocation_id": inv_id, "iterations": 0, "early_exit": False}
+        # Resolve the place once per turn; tools, prefetch and the governor all see the same ID
+        try:
+            resolve_turn(state, _user_text(callback_context))
+        except Exception:
+            pass
+    stats["iterations"] += 1
+    state["planner_stats"] = stats
+
     # Run governor pre-checks
     governor_callback(callback_context, llm_request)
 
+    # Opt-in: start predictable tool calls while the planner LLM is thinking
+    try:
+        with bind_turn(callback_context, state=False):
+            prefetch.start(callback_context.invocation_id, prefetch.predict_calls(state))
+    except Exception:
+        pass
+
 def _synth_fallback_plan(state: Dict[str, Any]) -> Dict[str, Any]:
     """Deterministic plan when LLM plan is invalid/empty/exit-only."""
-    has_image = bool(state.get("uploaded_image_uri"))
+    images = image_args(state)
+    has_image = bool(images)
     loc = state.get("location")
 
     steps: List[Dict[str, Any]] = []
@@ -70,7 +110,7 @@ def _synth_fallback_plan(state: Dict[str, Any]) -> Dict[str, Any]:
     })
     steps.append({
         "id": "s2", "tool": "diagnose_leaf_tool",
-        "args": {"image_ref": state.get("uploaded_image_uri")},
+        "args": images,
         "optional": not has_image,
     })
     # Context enrichment (optional if inputs missing)
@@ -91,81 +131,111 @@ def _synth_fallback_plan(state: Dict[str, Any]) -> Dict[str, Any]:
 
     return {"steps": steps, "notes": "Deterministic fallback to ensure tool execution."}
 
-def _ensure_non_optional_quality_gate(plan_json_str: str) -> str:
-    """Guarantee ≥1 non-exit, non-optional step; inject quality_gate_tool if needed."""
-    try:
-        plan = json.loads((plan_json_str or "{}").strip())
-    except Exception:
-        return plan_json_str
-
-    steps = list(plan.get("steps") or [])
-    has_non_optional = any(
-        (s.get("tool") not in {"exit_loop_tool", "exit_loop_tool_fn"}) and (not s.get("optional", False))
-        for s in steps
-    )
-    if has_non_optional:
-        return json.dumps({**plan, "steps": steps})
-
-    qg_step = {"id": "qg", "tool": "quality_gate_tool", "args": {}, "optional": False}
-    exit_idx = next((i for i, s in enumerate(steps)
-                     if s.get("tool") in {"exit_loop_tool", "exit_loop_tool_fn"}), None)
-    if exit_idx is None:
-        steps.append(qg_step)
-        steps.append({"id": "sx", "tool": "exit_loop_tool_fn", "args": {}, "optional": False})
-    else:
-        steps.insert(exit_idx, qg_step)
-
-    plan["steps"] = steps
-    return json.dumps(plan)
-
-def after_planner_callback(callback_context: CallbackContext, llm_response):
-    """
-    Parse assistant text into a strict plan and store as state.current_plan (string JSON).
-    If the plan is missing/invalid/exit-only/unknown tools, synthesize a deterministic one.
-    """
-    state = callback_context.state
-
-    # Extract assistant text
+def _response_text(llm_response, sep: str = "\n") -> str:
     text = ""
     content = getattr(llm_response, "content", None)
     parts = getattr(content, "parts", []) if content else []
     for p in parts:
         if getattr(p, "text", None):
-            text += p.text + "\n"
+            text += p.text + sep
+    return text
 
-    plan_obj: Optional[Dict[str, Any]] = None
-    blob = _extract_json_blob(text)
-    if blob:
-        try:
-            parsed = json.loads(blob)
-            if isinstance(parsed, dict) and isinstance(parsed.get("steps"), list):
-                plan_obj = parsed
-        except Exception:
-            plan_obj = None
+def _on_partial_plan(callback_context: CallbackContext, llm_response) -> None:
+    """
+    Streaming path: feed the text delta to this invocation's parser and start
+    each completed, allowed, input-independent step right away. run_plan_tool
+    adopts the results when it reaches the matching step.
+    """
+    inv_id = callback_context.invocation_id
+    parser = _STREAMS.get(inv_id)
+    if parser is None:
+        if len(_STREAMS) >= 256:  # drop streams whose final response never arrived
+            _STREAMS.pop(next(iter(_STREAMS)))
+        parser = _STREAMS[inv_id] = PlanStreamParser(_ALLOWED_TOOLS)
+    calls = [
+        (s["tool"], s.get("args") if isinstance(s.get("args"), dict) else {})
+        for s in parser.feed(_response_text(llm_response, sep=""))
+        if s.get("tool") in _EAGER_TOOLS
+    ]
+    if calls:
+        with bind_turn(callback_context, state=False):
+            prefetch.submit(inv_id, calls)
 
-    def _invalid(plan: Optional[Dict[str, Any]]) -> bool:
-        if not plan or not isinstance(plan.get("steps"), list) or len(plan["steps"]) == 0:
-            return True
-        tools = [str(s.get("tool", "")) for s in plan["steps"]]
-        all_unknown = all(t not in _ALLOWED_TOOLS for t in tools)
-        exit_only   = len([t for t in tools if t not in {"exit_loop_tool", "exit_loop_tool_fn"}]) == 0
-        return all_unknown or exit_only
+def after_planner_callback(callback_context: CallbackContext, llm_response):
+    """
+    Parse assistant text into a strict plan and store as state.current_plan
+    (canonical compact JSON, see src/agent/plan.py).
+    If the plan is missing/invalid/exit-only/unknown tools, synthesize a deterministic one.
+    """
+    if getattr(llm_response, "partial", False):
+        if PIPELINE_PLAN:
+            try:
+                _on_partial_plan(callback_context, llm_response)
+            except Exception:
+                pass
+        return None
 
-    if _invalid(plan_obj):
-        plan_obj = _synth_fallback_plan(state)
+    state = callback_context.state
+
+    # Final response: reuse the streamed parse if it completed, else scan the full text once
+    parser = _STREAMS.pop(getattr(callback_context, "invocation_id", None), None)
+    plan_obj: Optional[Dict[str, Any]] = parser.plan() if parser else None
+    if plan_obj is None:
+        text = _response_text(llm_response)
+        parser = PlanStreamParser()
+        parser.feed(text)
+        plan_obj = parser.plan()
+        if plan_obj is None:
+            blob = _extract_json_blob(text)
+            if blob:
+                try:
+                    parsed = json.loads(blob)
+                    if isinstance(parsed, dict) and isinstance(parsed.get("steps"), list):
+                        plan_obj = parsed
+                except Exception:
+                    plan_obj = None
+
+    # Validation + quality-gate injection run once per distinct plan (compiled-plan cache)
+    compiled = compile_plan(plan_obj) if plan_obj else None
+    if compiled is None or not compiled.valid:
+        compiled = compile_plan(_synth_fallback_plan(state))
+
+    state["current_plan"] = compiled.encoded
+    state["current_plan_hash"] = compiled.digest
+
+    # A valid plan is stored: stop PlanningLoopAgent now instead of waiting for exit_loop_tool
+    _escalate(callback_context)
+
+def _escalate(callback_context: CallbackContext) -> None:
+    actions = getattr(callback_context, "actions", None) or getattr(callback_context, "_event_actions", None)
+    if actions is None:
+        return
+    actions.escalate = True
+    try:
+        state = callback_context.state
+        stats = dict(state.get("planner_stats") or {})
+        if stats:
+            stats["early_exit"] = True
+            state["planner_stats"] = stats
+            with _ITER_LOCK:
+                _ITERATIONS[int(stats.get("iterations", 0))] += 1
+    except Exception:
+        pass
 
-    plan_json = json.dumps(plan_obj, ensure_ascii=False, indent=2)
-    state["current_plan"] = _ensure_non_optional_quality_gate(plan_json)
+def planner_iteration_stats() -> Dict[int, int]:
+    """Histogram of planner LLM calls per turn that ended with a stored plan."""
+    with _ITER_LOCK:
+        return dict(_ITERATIONS)
 
 planner_agent = LlmAgent(
     name="PlannerAgent",
     instruction=PLANNER_INSTRUCTION,
     model="gemini-2.5-flash",
-    tools=[
-        quality_gate_tool, crop_id_tool, diagnose_leaf_tool,
-        get_weather_tool, get_soil_tool,
-        recommend_fertilizer_tool, market_insight_tool, exit_loop_tool,
-    ],
+    tools=[LazyToolset([
+        "quality_gate_tool", "crop_id_tool", "diagnose_leaf_tool",
+        "get_weather_tool", "get_soil_tool",
+        "recommend_fertilizer_tool", "market_insight_tool", "exit_loop_tool",
+    ])],
     before_model_callback=before_planner_callback,
     after_model_callback=after_planner_callback,
 )
@@ -0,0 +1,270 @@
+from __future__ import annotations
+import bisect, os, re, threading
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Crop vocabulary: canonical name, category, regional names / transliterations.
+# CROP_VOCAB_PATH adds more TSV files (same format, os.pathsep-separated).
+VOCAB_PATH = Path(__file__).with_name("crops.tsv")
+EXTRA_VOCAB = [p for p in os.getenv("CROP_VOCAB_PATH", "").split(os.pathsep) if p]
+
+# Letters of any script, plus Indic vowel signs (which \w alone would split on).
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0DFF]+", re.UNICODE)
+
+# Never fuzzy-match these: common words in farm questions that sit 1 edit from a crop name.
+_STOPWORDS = frozenset("""
+a an the my our your his her their this that these those is are was were be been am
+and or but with without from into onto for of on in at to by about after before when
+where which what why how who whom should could would will can may might must have has
+had do does did not no yes very more most some any all each every other same such
+plant plants planted planting leaf leaves stem stems root roots field fields farm farms
+crop crops seed seeds seedling yellow brown black white green spots spot water soil rain
+weather price prices market fertilizer fertiliser disease pest pests grow growing help
+please today week month year acre acres hectare sowing harvest yield spray tree trees
+till save rise paani pani
+""".split())
+
+# Aliases that are also everyday English/Hinglish words ("prices rose", "mint condition",
+# "paani jama hai"): in free text they count only next to a crop-context word, or alone.
+_AMBIGUOUS = frozenset("til rai jama orange rose mint".split())
+# Misspellings in free text: only long tokens next to a crop-context word, with a
+# clear lead over the runner-up, and always below the quality gate's 0.6.
+FUZZY_MIN_LEN = 6
+FUZZY_CONF = 0.55
+_CROP_CONTEXT = frozenset("""
+crop crops field fields farm plant plants plantation seed seeds sow sowing sown grow grown
+growing harvest tree trees orchard variety leaf leaves flower flowers fasal kheti ki ka ke
+""".split())
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").casefold())
+
+
+def _grams(word: str) -> List[str]:
+    w = f"${word}$"
+    return [w[i:i + 3] for i in range(len(w) - 2)]
+
+
+def _edit_distance(a: str, b: str, cap: int) -> int:
+    """Optimal-string-alignment distance, early exit once every cell exceeds cap."""
+    if abs(len(a) - len(b)) > cap:
+        return cap + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > cap:
+            return cap + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class CropIndex:
+    """
+    Token-level exact, prefix and fuzzy lookup over the crop vocabulary.
+    Built once (lazily) per process; all lookups are dict/bisect/trigram hits.
+    """
+
+    def __init__(self, paths: Iterable[Path]):
+        self.exact: Dict[str, Tuple[str, str]] = {}      # alias -> (canonical, category)
+        self.max_words = 1
+        for path in paths:
+            self._load(Path(path))
+        self.keys: List[str] = sorted(self.exact)
+        self.grams: Dict[str, List[int]] = defaultdict(list)
+        for i, k in enumerate(self.keys):
+            for g in set(_grams(k)):
+                self.grams[g].append(i)
+        # Free text repeats the same non-crop tokens ("district", "pune"): memoize misses too
+        self._fuzzy_memo: Dict[str, Optional[str]] = {}
+
+    def _load(self, path: Path) -> None:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if not line.strip() or line.startswith("#"):
+                continue
+            canonical, category, aliases = (line.split("\t") + ["", ""])[:3]
+            canonical = canonical.strip().casefold()
+            for alias in [canonical] + aliases.split("|"):
+                key = " ".join(_tokens(alias))
+                if key and key not in self.exact:  # first definition wins
+                    self.exact[key] = (canonical, category.strip())
+                    self.max_words = max(self.max_words, key.count(" ") + 1)
+
+    def _hit(self, key: str, method: str, conf: float) -> Dict[str, object]:
+        canonical, category = self.exact[key]
+        return {"crop": canonical, "category": category, "matched": key, "method": method, "confidence": conf}
+
+    def exact_lookup(self, key: str) -> Optional[Dict[str, object]]:
+        if key in self.exact:
+            return self._hit(key, "exact", 0.95)
+        for suffix in ("es", "s"):  # tomatoes -> tomato, chillies -> chilli(e)
+            if len(key) > 3 + len(suffix) and key.endswith(suffix) and key[: -len(suffix)] in self.exact:
+                return self._hit(key[: -len(suffix)], "plural", 0.9)
+        return None
+
+    def prefix_lookup(self, prefix: str, limit: int = 10) -> List[str]:
+        """Vocabulary keys starting with prefix (sorted-array range scan)."""
+        prefix = " ".join(_tokens(prefix))
+        if not prefix:
+            return []
+        i = bisect.bisect_left(self.keys, prefix)
+        out: List[str] = []
+        while i < len(self.keys) and self.keys[i].startswith(prefix) and len(out) < limit:
+            out.append(self.keys[i])
+            i += 1
+        return out
+
+    def fuzzy_lookup(self, word: str) -> Optional[Dict[str, object]]:
+        """
+        Misspellings: trigram candidates, confirmed by edit distance ≤1 (≤2 for long
+        words) and strictly closer than any other crop's alias.
+        """
+        if len(word) < 4 or word in _STOPWORDS or not word.isalpha():
+            return None
+        if word in self._fuzzy_memo:
+            key = self._fuzzy_memo[word]
+        else:
+            key = self._fuzzy_key(word)
+            if len(self._fuzzy_memo) > 50_000:
+                self._fuzzy_memo.clear()
+            self._fuzzy_memo[word] = key
+        if key is None:
+            return None
+        d = _edit_distance(word, key, 2)
+        return self._hit(key, "fuzzy", round(FUZZY_CONF - 0.05 * (d - 1), 2))
+
+    def _fuzzy_key(self, word: str) -> Optional[str]:
+        cap = 1 if len(word) < 7 else 2
+        grams = set(_grams(word))
+        counts: Dict[int, int] = defaultdict(int)
+        for g in grams:
+            for i in self.grams.get(g, ()):
+                counts[i] += 1
+        # q-gram lemma: each edit destroys at most 3 trigrams
+        need = max(1, len(grams) - 3 * cap)
+        best: Dict[str, Tuple[int, int, str]] = {}   # crop -> its closest alias (d, -shared, key)
+        for i, shared in counts.items():
+            key = self.keys[i]
+            if shared < need or abs(len(key) - len(word)) > cap:
+                continue
+            d = _edit_distance(word, key, cap)
+            crop = self.exact[key][0]
+            if d <= cap and (crop not in best or (d, -shared) < best[crop][:2]):
+                best[crop] = (d, -shared, key)
+        ranked = sorted(best.values())
+        # Ambiguous when another crop's alias is just as close
+        if not ranked or (len(ranked) > 1 and ranked[1][0] == ranked[0][0]):
+            return None
+        return ranked[0][2]
+
+    def resolve(self, name: str) -> Optional[Dict[str, object]]:
+        """A single crop name: exact, then unique prefix, then fuzzy."""
+        key = " ".join(_tokens(name))
+        if not key:
+            return None
+        hit = self.exact_lookup(key)
+        if hit:
+            return hit
+        if len(key) >= 4:
+            pref = self.prefix_lookup(key, limit=2)
+            if len(pref) == 1:
+                return self._hit(pref[0], "prefix", 0.75)
+        return self.fuzzy_lookup(key)
+
+    @staticmethod
+    def _plausible(toks: List[str], i: int, key: str) -> bool:
+        """Whether a single-token match at toks[i] can be a crop (stopword / ambiguity guard)."""
+        if toks[i] in _STOPWORDS or key in _STOPWORDS:
+            return False
+        if key not in _AMBIGUOUS or len(toks) == 1:
+            return True
+        return any(t in _CROP_CONTEXT for t in toks[max(0, i - 2):i + 3])
+
+    @staticmethod
+    def _fuzzy_candidate(toks: List[str], i: int) -> bool:
+        """Free-text tokens worth a fuzzy lookup: long, and next to a crop-context word (or alone)."""
+        return (len(toks[i]) >= FUZZY_MIN_LEN and toks[i] not in _CROP_CONTEXT
+                and (len(toks) == 1 or any(t in _CROP_CONTEXT for t in toks[max(0, i - 2):i + 3])))
+
+    def extract(self, text: str) -> List[Dict[str, object]]:
+        """All crops mentioned in free text, longest alias first, left to right."""
+        toks = _tokens(text)
+        found: List[Dict[str, object]] = []
+        i = 0
+        while i < len(toks):
+            hit, guarded = None, False
+            for n in range(min(self.max_words, len(toks) - i), 0, -1):
+                hit = self.exact_lookup(" ".join(toks[i:i + n]))
+                if hit and n == 1 and not self._plausible(toks, i, str(hit["matched"])):
+                    hit, guarded = None, True
+                if hit:
+                    i += n
+                    break
+            if hit is None:
+                if not guarded and self._fuzzy_candidate(toks, i):
+                    hit = self.fuzzy_lookup(toks[i])
+                    if hit and not self._plausible(toks, i, str(hit["matched"])):
+                        hit = None
+                i += 1
+            if hit and all(h["crop"] != hit["crop"] for h in found):
+                found.append(hit)
+        return found
+
+
+_INDEX: Optional[CropIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def crop_index() -> CropIndex:
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = CropIndex([VOCAB_PATH, *EXTRA_VOCAB])
+    return _INDEX
+
+
+@lru_cache(maxsize=4096)
+def _extract_cached(text: str) -> Tuple[Dict[str, object], ...]:
+    return tuple(crop_index().extract(text))
+
+
+def extract_crop(text: Optional[str]) -> Optional[Dict[str, object]]:
+    """Best crop in free text: first exact/plural mention, else first fuzzy one."""
+    hits = _extract_cached(text or "")
+    for h in hits:
+        if h["method"] != "fuzzy":
+            return dict(h)
+    return dict(hits[0]) if hits else None
+
+
+def resolve_crop(name: Optional[str]) -> Optional[Dict[str, object]]:
+    return crop_index().resolve(name or "")
+
+
+def extract_batch(texts: Iterable[Optional[str]]) -> List[Optional[Dict[str, object]]]:
+    """Spreadsheet workflow: one result per input row (repeated cells hit the cache)."""
+    return [extract_crop(t) for t in texts]
+
+
+if __name__ == "__main__":
+    # python -m src.agent.data.crops [file] : one text per line in, TSV (text, crop, method, confidence) out
+    import sys, time
+    src = open(sys.argv[1], encoding="utf-8") if len(sys.argv) > 1 else sys.stdin
+    rows = [line.rstrip("\n") for line in src]
+    t0 = time.perf_counter()
+    results = extract_batch(rows)
+    dt = time.perf_counter() - t0
+    for text, r in zip(rows, results):
+        print("\t".join([text, str((r or {}).get("crop", "")), str((r or {}).get("method", "")),
+                         str((r or {}).get("confidence", ""))]))
+    print(f"# {len(rows)} rows in {dt * 1000:.1f} ms ({dt * 1e6 / max(1, len(rows)):.1f} µs/row, "
+          f"{len(crop_index().exact)} vocabulary keys)", file=sys.stderr)
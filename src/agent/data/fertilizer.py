@@ -0,0 +1,208 @@
+from __future__ import annotations
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# NPK recommendations from precomputed crop × soil-band tables.
+#
+# fertilizer.tsv holds per-crop N/P2O5/K2O (kg/ha) at a reference yield, with
+# per-category and default rows for crops it does not list. Soil values are
+# banded (pH, available N, organic matter; NaN -> "unknown" band) and every
+# crop × band cell is computed once, so a batch is a gather plus a yield scale.
+TABLE_PATH = Path(__file__).with_name("fertilizer.tsv")
+
+PH_EDGES = (5.5, 6.5, 7.5, 8.5)          # acidic | slightly acidic | neutral | alkaline | strongly alkaline
+N_EDGES = (280.0, 560.0)                 # soil available N, kg/ha: low | medium | high
+OM_EDGES = (0.86, 1.29)                  # organic matter %, (= 0.5 / 0.75 % organic carbon)
+PH_BANDS = ("acidic", "slightly_acidic", "neutral", "alkaline", "strongly_alkaline", "unknown")
+N_BANDS = ("low", "medium", "high", "unknown")
+OM_BANDS = ("low", "medium", "high", "unknown")
+
+# Band multipliers, last entry = unknown band.
+_PH_N = np.array([1.0, 1.0, 1.0, 1.05, 1.1, 1.0], dtype=np.float32)    # volatilization losses on alkaline soils
+_PH_P = np.array([1.25, 1.1, 1.0, 1.15, 1.25, 1.0], dtype=np.float32)  # P fixation away from neutral
+_N_N = np.array([1.25, 1.0, 0.75, 1.0], dtype=np.float32)              # soil-test N response
+_OM_N = np.array([1.1, 1.0, 0.9, 1.0], dtype=np.float32)
+_AMENDMENT = ("apply agricultural lime before sowing", "", "",
+              "prefer acidifying N sources (ammonium sulphate)", "apply gypsum; soil reclamation advised", "")
+
+# Common complex grades, matched to each cell's N:P:K direction.
+GRADES = ("10-26-26", "12-32-16", "14-35-14", "15-15-15", "17-17-17", "19-19-19",
+          "20-20-0", "28-28-0", "16-16-16", "10-10-10", "20-10-10", "12-6-6", "6-12-12")
+_GRADE_VEC = np.array([[float(x) for x in g.split("-")] for g in GRADES], dtype=np.float32)
+
+YIELD_SCALE = (0.5, 1.5)  # target/reference yield factor is clipped to this range
+
+
+class FertilizerTable:
+    def __init__(self, path: Path = TABLE_PATH):
+        self.rows: List[str] = []
+        base: List[Tuple[float, float, float]] = []
+        ref: List[float] = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if not line.strip() or line.startswith("#"):
+                continue
+            name, n, p, k, y = (line.split("\t") + ["0"] * 5)[:5]
+            self.rows.append(name.strip())
+            base.append((float(n), float(p), float(k)))
+            ref.append(float(y))
+        self.index = {name: i for i, name in enumerate(self.rows)}
+        self.default = self.index["default"]
+        self.ref_yield = np.array(ref, dtype=np.float32)
+
+        # npk[crop, ph_band, n_band, om_band] -> (N, P2O5, K2O)
+        b = np.array(base, dtype=np.float32)[:, None, None, None, :]
+        n_mult = _PH_N[:, None, None] * _N_N[None, :, None] * _OM_N[None, None, :]
+        p_mult = np.broadcast_to(_PH_P[:, None, None], n_mult.shape)
+        k_mult = np.ones_like(n_mult)
+        mult = np.stack([n_mult, p_mult, k_mult], axis=-1)[None]
+        self.npk = np.round(b * mult).astype(np.float32)
+
+        # Nearest grade by cosine similarity, per cell
+        unit = self.npk / np.maximum(np.linalg.norm(self.npk, axis=-1, keepdims=True), 1e-6)
+        gunit = _GRADE_VEC / np.linalg.norm(_GRADE_VEC, axis=-1, keepdims=True)
+        self.grade = np.argmax(unit @ gunit.T, axis=-1).astype(np.int16)
+
+        self._memo: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def crop_row(self, crop: Optional[str]) -> int:
+        """Crop name -> table row: own row, else its category row, else default."""
+        key = (crop or "").strip().casefold()
+        row = self._memo.get(key)
+        if row is None:
+            from .crops import resolve_crop
+            hit = resolve_crop(key) if key else None
+            row = self.default
+            if hit:
+                row = self.index.get(str(hit["crop"]), self.index.get(f"category:{hit['category']}", self.default))
+            elif key in self.index:
+                row = self.index[key]
+            with self._lock:
+                if len(self._memo) > 100_000:
+                    self._memo.clear()
+                self._memo[key] = row
+        return row
+
+
+_TABLE: Optional[FertilizerTable] = None
+_TABLE_LOCK = threading.Lock()
+
+
+def fertilizer_table() -> FertilizerTable:
+    global _TABLE
+    if _TABLE is None:
+        with _TABLE_LOCK:
+            if _TABLE is None:
+                _TABLE = FertilizerTable()
+    return _TABLE
+
+
+def _column(values: Any, n: int) -> np.ndarray:
+    if values is None:
+        return np.full(n, np.nan)
+    arr = np.asarray([np.nan if v is None else v for v in values] if isinstance(values, (list, tuple)) else values,
+                     dtype=np.float64)
+    return np.broadcast_to(arr, (n,)).copy()
+
+
+def _band(values: np.ndarray, edges: Sequence[float]) -> np.ndarray:
+    b = np.digitize(values, edges)
+    b[np.isnan(values)] = len(edges) + 1
+    return b
+
+
+def recommend_batch(
+    crops: Sequence[Optional[str]],
+    ph: Any = None,
+    nitrogen: Any = None,
+    organic_matter_pct: Any = None,
+    target_yield: Any = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized recommendations for many plots. Soil/yield inputs may be arrays,
+    scalars or None (unknown). Returns per-plot kg/ha for N, P2O5, K2O and the
+    urea / DAP / MOP product amounts that deliver them.
+    """
+    t = fertilizer_table()
+    n = len(crops)
+    rows = np.fromiter((t.crop_row(c) for c in crops), dtype=np.int64, count=n)
+    pb = _band(_column(ph, n), PH_EDGES)
+    nb = _band(_column(nitrogen, n), N_EDGES)
+    ob = _band(_column(organic_matter_pct, n), OM_EDGES)
+
+    ty = _column(target_yield, n)
+    ref = t.ref_yield[rows]
+    ok = np.isfinite(ty) & (ty > 0) & (ref > 0)
+    factor = np.ones(n, dtype=np.float32)
+    factor[ok] = np.clip(ty[ok] / ref[ok], *YIELD_SCALE)
+
+    npk = t.npk[rows, pb, nb, ob] * factor[:, None]
+    dap = npk[:, 1] / 0.46
+    urea = np.maximum(npk[:, 0] - dap * 0.18, 0.0) / 0.46
+    mop = npk[:, 2] / 0.60
+    return {
+        "row": rows, "N": npk[:, 0], "P2O5": npk[:, 1], "K2O": npk[:, 2],
+        "grade": t.grade[rows, pb, nb, ob], "urea": urea, "dap": dap, "mop": mop,
+        "ph_band": pb, "n_band": nb, "om_band": ob, "yield_factor": factor,
+    }
+
+
+def recommend(
+    crop: Optional[str],
+    ph: Optional[float] = None,
+    nitrogen: Optional[float] = None,
+    organic_matter_pct: Optional[float] = None,
+    target_yield: Optional[float] = None,
+) -> Dict[str, Any]:
+    """One plot, tool-shaped."""
+    r = recommend_batch([crop], [ph], [nitrogen], [organic_matter_pct], [target_yield])
+    t = fertilizer_table()
+    pb, nb, ob = int(r["ph_band"][0]), int(r["n_band"][0]), int(r["om_band"][0])
+    return {
+        "npk_ratio": GRADES[int(r["grade"][0])],
+        "npk_kg_ha": {k: round(float(r[k][0]), 1) for k in ("N", "P2O5", "K2O")},
+        "products_kg_ha": {k: round(float(r[k][0]), 1) for k in ("urea", "dap", "mop")},
+        "bands": {"ph": PH_BANDS[pb], "nitrogen": N_BANDS[nb], "organic_matter": OM_BANDS[ob]},
+        "table_row": t.rows[int(r["row"][0])],
+        "yield_factor": round(float(r["yield_factor"][0]), 2),
+        "amendment": _AMENDMENT[pb] or None,
+    }
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m src.agent.data.fertilizer [--plots N]
+    import argparse, json, time
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--plots", type=int, default=50_000)
+    a = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = np.array(["rice", "wheat", "tomato", "cotton", "soybean", "onion", "banana", "bajra",
+                      "tur dal", "sugar cane", "unknownium", "capsicum"], dtype=object)
+    crops = list(names[rng.integers(0, len(names), a.plots)])
+    ph = rng.uniform(4.5, 9.0, a.plots)
+    ph[rng.random(a.plots) < 0.05] = np.nan
+    nitrogen = rng.uniform(100, 700, a.plots)
+    om = rng.uniform(0.3, 2.5, a.plots)
+    ty = rng.uniform(1, 60, a.plots)
+
+    t0 = time.perf_counter()
+    fertilizer_table()
+    build_ms = (time.perf_counter() - t0) * 1000
+    recommend_batch(crops[:10], ph[:10], nitrogen[:10], om[:10], ty[:10])  # warm crop memo
+    t0 = time.perf_counter()
+    recommend_batch(crops, ph, nitrogen, om, ty)
+    batch_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(min(2000, a.plots)):
+        recommend(crops[i], ph[i], nitrogen[i], om[i], ty[i])
+    single_us = (time.perf_counter() - t0) / min(2000, a.plots) * 1e6
+    print(json.dumps({
+        "plots": a.plots, "table_build_ms": round(build_ms, 2), "table_cells": int(fertilizer_table().grade.size),
+        "batch_ms": round(batch_s * 1000, 2), "batch_us_per_plot": round(batch_s / a.plots * 1e6, 3),
+        "single_us": round(single_us, 2), "example": recommend("tomato", 5.2, 200, 0.6, 50),
+    }, indent=2))
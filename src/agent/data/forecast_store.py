@@ -0,0 +1,244 @@
+from __future__ import annotations
+import json, os, shutil, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Gridded forecast snapshots served from local memory-mapped .npy files.
+#
+# Layout under FORECAST_STORE_DIR:
+#   snapshots/<stamp>/meta.json   {"north", "west", "cell", "nrows", "ncols", "issued", "step_h", "fields"}
+#   snapshots/<stamp>/<field>.npy float32 (T, nrows, ncols); T forecast steps of step_h hours from issued
+#   current -> snapshots/<stamp>  symlink, replaced atomically by publish()
+#
+# Readers re-check `current` at most every FORECAST_CHECK_S and swap to the new
+# snapshot in one reference assignment; in-flight lookups keep the old mapping.
+# Times past the last step have no forecast (NaN / None), not the last step's values.
+FORECAST_STORE_DIR = os.getenv("FORECAST_STORE_DIR", "/srv/farmagent/forecast")
+FORECAST_CHECK_S = float(os.getenv("FORECAST_CHECK_S", "30"))
+KEEP_SNAPSHOTS = int(os.getenv("FORECAST_KEEP_SNAPSHOTS", "3"))
+FIELDS = ("temp_c", "rain_prob", "humidity_pct")
+
+
+def summarize(temp_c: float, rain_prob: float, humidity_pct: Optional[float] = None) -> str:
+    """Short human summary from the three forecast values."""
+    if rain_prob != rain_prob or temp_c != temp_c:  # NaN
+        return "unknown"
+    if rain_prob >= 0.6:
+        s = "rain likely"
+    elif rain_prob >= 0.3:
+        s = "chance of showers"
+    elif humidity_pct is not None and humidity_pct >= 80:
+        s = "humid, mostly dry"
+    else:
+        s = "dry"
+    if temp_c >= 35:
+        s += ", hot"
+    elif temp_c <= 8:
+        s += ", cold"
+    return s
+
+
+class ForecastSnapshot:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        meta = json.loads((self.root / "meta.json").read_text())
+        self.meta = meta
+        self.north, self.west, self.cell = float(meta["north"]), float(meta["west"]), float(meta["cell"])
+        self.nrows, self.ncols = int(meta["nrows"]), int(meta["ncols"])
+        self.issued = float(meta.get("issued", 0))
+        self.step_h = float(meta.get("step_h", 1))
+        self.fields = tuple(meta["fields"])
+        self.layers: Dict[str, np.ndarray] = {
+            f: np.load(self.root / f"{f}.npy", mmap_mode="r") for f in self.fields
+        }
+        self.steps = int(self.layers[self.fields[0]].shape[0])
+
+    def step_for(self, when: Optional[float] = None) -> Optional[int]:
+        """Forecast step closest to `when` (epoch seconds; default now); None past the horizon."""
+        when = time.time() if when is None else when
+        k = int(round((when - self.issued) / 3600.0 / self.step_h))
+        return max(k, 0) if k < self.steps else None
+
+    def sample(self, lats: Sequence[float], lons: Sequence[float], when: Optional[float] = None,
+               method: str = "bilinear") -> Dict[str, np.ndarray]:
+        """Vectorized lookup; bilinear between cell centres, nearest where a corner has no data."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        t = self.step_for(when)
+        if t is None:
+            return {f: np.full(lats.shape, np.nan) for f in self.fields}
+        fr = (self.north - lats) / self.cell - 0.5
+        fc = (lons - self.west) / self.cell - 0.5
+        inside = (fr > -0.5) & (fr < self.nrows - 0.5) & (fc > -0.5) & (fc < self.ncols - 0.5)
+        rn = np.clip(np.rint(fr), 0, self.nrows - 1).astype(np.int64)
+        cn = np.clip(np.rint(fc), 0, self.ncols - 1).astype(np.int64)
+        if method == "bilinear" and self.nrows > 1 and self.ncols > 1:
+            r0 = np.clip(np.floor(fr), 0, self.nrows - 2).astype(np.int64)
+            c0 = np.clip(np.floor(fc), 0, self.ncols - 2).astype(np.int64)
+            wr = np.clip(fr - r0, 0.0, 1.0)
+            wc = np.clip(fc - c0, 0.0, 1.0)
+        out: Dict[str, np.ndarray] = {}
+        for f in self.fields:
+            grid = self.layers[f][t]
+            near = np.asarray(grid[rn, cn], dtype=np.float64)
+            if method == "bilinear" and self.nrows > 1 and self.ncols > 1:
+                v00, v01 = grid[r0, c0], grid[r0, c0 + 1]
+                v10, v11 = grid[r0 + 1, c0], grid[r0 + 1, c0 + 1]
+                top = v00 * (1 - wc) + v01 * wc
+                bot = v10 * (1 - wc) + v11 * wc
+                val = top * (1 - wr) + bot * wr
+                val = np.where(np.isnan(val), near, val)
+            else:
+                val = near
+            out[f] = np.where(inside, val, np.nan)
+        return out
+
+    def lookup(self, lat: float, lon: float, when: Optional[float] = None, method: str = "bilinear") -> Optional[Dict[str, Any]]:
+        return lookup_batch([lat], [lon], when=when, method=method, snapshot=self)[0]
+
+
+def lookup_batch(lats: Sequence[float], lons: Sequence[float], when: Optional[float] = None,
+                 method: str = "bilinear", snapshot: Optional[ForecastSnapshot] = None) -> List[Optional[Dict[str, Any]]]:
+    """Tool-shaped records (temp_c, rain_prob, summary, ...) per coordinate; None outside the grid or horizon."""
+    snap = snapshot or forecast_store()
+    if snap is None:
+        return [None] * len(lats)
+    vals = snap.sample(lats, lons, when=when, method=method)
+    temp = vals.get("temp_c")
+    rain = vals.get("rain_prob")
+    hum = vals.get("humidity_pct")
+    issued = datetime.fromtimestamp(snap.issued, timezone.utc).isoformat(timespec="minutes")
+    out: List[Optional[Dict[str, Any]]] = []
+    for i in range(len(lats)):
+        t = float(temp[i]) if temp is not None else float("nan")
+        r = float(rain[i]) if rain is not None else float("nan")
+        h = float(hum[i]) if hum is not None and not np.isnan(hum[i]) else None
+        if t != t and r != r:
+            out.append(None)
+            continue
+        out.append({
+            "temp_c": round(t, 1) if t == t else None,
+            "rain_prob": round(r, 2) if r == r else None,
+            "humidity_pct": round(h, 1) if h is not None else None,
+            "summary": summarize(t, r, h),
+            "issued": issued,
+        })
+    return out
+
+
+_SNAPSHOT: Optional[ForecastSnapshot] = None
+_SNAPSHOT_TARGET: Optional[str] = None
+_CHECKED_AT = 0.0
+_LOCK = threading.Lock()
+
+
+def forecast_store() -> Optional[ForecastSnapshot]:
+    """Current snapshot; follows `current` when publish() swaps it (checked every FORECAST_CHECK_S)."""
+    global _SNAPSHOT, _SNAPSHOT_TARGET, _CHECKED_AT
+    now = time.monotonic()
+    if _SNAPSHOT is not None and now - _CHECKED_AT < FORECAST_CHECK_S:
+        return _SNAPSHOT
+    with _LOCK:
+        if _SNAPSHOT is not None and now - _CHECKED_AT < FORECAST_CHECK_S:
+            return _SNAPSHOT
+        _CHECKED_AT = now
+        current = Path(FORECAST_STORE_DIR) / "current"
+        try:
+            target = os.path.realpath(current)
+            if target != _SNAPSHOT_TARGET and (Path(target) / "meta.json").exists():
+                _SNAPSHOT = ForecastSnapshot(target)  # single assignment: readers see old or new
+                _SNAPSHOT_TARGET = target
+        except Exception:
+            pass
+    return _SNAPSHOT
+
+
+def publish(root: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> str:
+    """Write a snapshot next to the live one, then atomically repoint `current` at it."""
+    base = Path(root)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    snap = base / "snapshots" / stamp
+    tmp = base / "snapshots" / f".{stamp}.tmp"
+    tmp.mkdir(parents=True)
+    fields = []
+    for f, arr in arrays.items():
+        arr = np.asarray(arr, dtype=np.float32)
+        if arr.ndim == 2:
+            arr = arr[None]
+        np.save(tmp / f"{f}.npy", arr)
+        fields.append(f)
+    shape = np.asarray(arrays[fields[0]]).shape[-2:]
+    meta = {"nrows": int(shape[0]), "ncols": int(shape[1]), "step_h": 1, "issued": time.time(), **meta, "fields": fields}
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    os.replace(tmp, snap)
+    link = base / f".current.{stamp}"
+    os.symlink(os.path.join("snapshots", stamp), link)
+    os.replace(link, base / "current")  # rename(2) over the old symlink is atomic
+    old = sorted(p for p in (base / "snapshots").iterdir() if not p.name.startswith("."))
+    for p in old[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(p, ignore_errors=True)  # open mappings stay valid until released
+    return str(snap)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Forecast grid store: publish a snapshot, or benchmark lookups.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("publish", help="publish an .npz with temp_c/rain_prob/humidity_pct arrays (T, R, C)")
+    p.add_argument("npz")
+    p.add_argument("--root", default=FORECAST_STORE_DIR)
+    p.add_argument("--north", type=float, required=True)
+    p.add_argument("--west", type=float, required=True)
+    p.add_argument("--cell", type=float, required=True)
+    p.add_argument("--step-h", type=float, default=1)
+    p.add_argument("--issued", type=float, help="epoch seconds of the first step (default now)")
+    b = sub.add_parser("bench")
+    b.add_argument("--root", default="/tmp/forecast-bench")
+    b.add_argument("--size", type=int, default=1000)
+    b.add_argument("--steps", type=int, default=24)
+    b.add_argument("--queries", type=int, default=100_000)
+    a = ap.parse_args()
+
+    if a.cmd == "publish":
+        with np.load(a.npz) as z:
+            arrays = {f: z[f] for f in FIELDS if f in z}
+        meta = {"north": a.north, "west": a.west, "cell": a.cell, "step_h": a.step_h}
+        if a.issued is not None:
+            meta["issued"] = a.issued
+        print(publish(a.root, arrays, meta))
+    else:
+        rng = np.random.default_rng(0)
+        shape = (a.steps, a.size, a.size)
+        arrays = {
+            "temp_c": rng.uniform(10, 42, shape).astype(np.float32),
+            "rain_prob": rng.uniform(0, 1, shape).astype(np.float32),
+            "humidity_pct": rng.uniform(20, 100, shape).astype(np.float32),
+        }
+        FORECAST_STORE_DIR = a.root
+        t0 = time.perf_counter()
+        publish(a.root, arrays, {"north": 37.0, "west": 68.0, "cell": 30.0 / a.size})
+        publish_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        snap = forecast_store()
+        open_ms = (time.perf_counter() - t0) * 1000
+        lats = rng.uniform(7.0, 37.0, a.queries)
+        lons = rng.uniform(68.0, 98.0, a.queries)
+        n1 = min(10_000, a.queries)
+        t0 = time.perf_counter()
+        for i in range(n1):
+            snap.lookup(lats[i], lons[i])
+        single_us = (time.perf_counter() - t0) / n1 * 1e6
+        t0 = time.perf_counter()
+        snap.sample(lats, lons)
+        sample_us = (time.perf_counter() - t0) / a.queries * 1e6
+        t0 = time.perf_counter()
+        lookup_batch(lats, lons, snapshot=snap)
+        batch_us = (time.perf_counter() - t0) / a.queries * 1e6
+        print(json.dumps({"cells": a.size * a.size, "steps": a.steps, "publish_ms": round(publish_ms, 1),
+                          "open_ms": round(open_ms, 2), "lookup_us": round(single_us, 2),
+                          "sample_us_per_point": round(sample_us, 3),
+                          "lookup_batch_us_per_point": round(batch_us, 3)}, indent=2))
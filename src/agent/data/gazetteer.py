@@ -0,0 +1,278 @@
+from __future__ import annotations
+import bisect, os, re, threading
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .crops import _STOPWORDS, _edit_distance, _grams, _tokens
+
+# Offline gazetteer: states and districts with canonical IDs ("in:mh:pune") and
+# coordinates. GAZETTEER_PATH adds more TSV files (same format, os.pathsep-separated).
+PLACES_PATH = Path(__file__).with_name("places.tsv")
+EXTRA_PLACES = [p for p in os.getenv("GAZETTEER_PATH", "").split(os.pathsep) if p]
+CACHE_SIZE = int(os.getenv("GAZETTEER_CACHE_SIZE", "4096"))
+
+_COORDS_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*[, ]\s*(-?\d+(?:\.\d+)?)\s*$")
+
+# Place names that are also everyday Hindi/English words or given names ("kya hua,
+# gaya?", "Anand's field"): in free text they count only with a qualifier -- "in/at/
+# near X", "X district" / "X mein", or the place's state named in the same message.
+_AMBIGUOUS = frozenset("""
+gaya anand hassan sagar krishna salem kota kashi erode maha durg bhuj nadia surat jalna
+kutch rewa kheri
+""".split())
+_QUALIFY_BEFORE = frozenset("in at near from around to".split())
+_QUALIFY_AFTER = frozenset("district dist zila zilla jila jilla taluka tehsil city mein me".split())
+
+
+def parse_coords(text: Optional[str]) -> Optional[Tuple[float, float]]:
+    """'18.52, 73.85' -> (18.52, 73.85); anything else -> None."""
+    m = _COORDS_RE.match(text or "")
+    if not m:
+        return None
+    lat, lon = float(m.group(1)), float(m.group(2))
+    return (lat, lon) if -90 <= lat <= 90 and -180 <= lon <= 180 else None
+
+
+class Gazetteer:
+    """
+    Exact / prefix / fuzzy place lookup. Names shared by several places keep all
+    candidates; a state qualifier ("Aurangabad, BR") or a state named elsewhere in
+    the text picks between them, otherwise the first definition wins.
+    """
+
+    def __init__(self, paths: Iterable[Path]):
+        self.places: Dict[str, Dict[str, Any]] = {}
+        self.exact: Dict[str, List[str]] = defaultdict(list)   # alias -> place ids
+        self.codes: Dict[str, str] = {}                         # "mh" -> "in:mh"
+        self.max_words = 1
+        for path in paths:
+            self._load(Path(path))
+        self.keys: List[str] = sorted(self.exact)
+        self.grams: Dict[str, List[int]] = defaultdict(list)
+        for i, k in enumerate(self.keys):
+            for g in set(_grams(k)):
+                self.grams[g].append(i)
+        self._fuzzy_memo: Dict[str, Optional[str]] = {}
+
+    def _load(self, path: Path) -> None:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if not line.strip() or line.startswith("#"):
+                continue
+            pid, name, kind, state, lat, lon, aliases = (line.split("\t") + [""] * 7)[:7]
+            if pid in self.places:
+                continue
+            self.places[pid] = {
+                "id": pid, "name": name, "kind": kind, "state": state.upper(),
+                "state_id": f"in:{state.lower()}", "lat": float(lat), "lon": float(lon),
+            }
+            if kind == "state":
+                self.codes[state.casefold()] = pid
+            for alias in [name] + aliases.split("|"):
+                key = " ".join(_tokens(alias))
+                if key and pid not in self.exact[key]:
+                    self.exact[key].append(pid)
+                    self.max_words = max(self.max_words, key.count(" ") + 1)
+
+    def _hit(self, pid: str, method: str, conf: float) -> Dict[str, Any]:
+        return {**self.places[pid], "method": method, "confidence": conf}
+
+    def _pick(self, ids: List[str], state_ids: Iterable[str] = ()) -> str:
+        wanted = set(state_ids)
+        for pid in ids:
+            if self.places[pid]["state_id"] in wanted:
+                return pid
+        return ids[0]
+
+    def _state_hints(self, parts: Iterable[str]) -> List[str]:
+        hints: List[str] = []
+        for part in parts:
+            key = " ".join(_tokens(part))
+            if key in self.codes:
+                hints.append(self.codes[key])
+            for pid in self.exact.get(key, ()):
+                if self.places[pid]["kind"] == "state":
+                    hints.append(pid)
+        return hints
+
+    def prefix_lookup(self, prefix: str, limit: int = 10) -> List[str]:
+        prefix = " ".join(_tokens(prefix))
+        if not prefix:
+            return []
+        i = bisect.bisect_left(self.keys, prefix)
+        out: List[str] = []
+        while i < len(self.keys) and self.keys[i].startswith(prefix) and len(out) < limit:
+            out.append(self.keys[i])
+            i += 1
+        return out
+
+    def _fuzzy_key(self, word: str) -> Optional[str]:
+        if len(word) < 4 or word in _STOPWORDS:
+            return None
+        if word in self._fuzzy_memo:
+            return self._fuzzy_memo[word]
+        cap = 1 if len(word) < 7 else 2
+        grams = set(_grams(word))
+        counts: Dict[int, int] = defaultdict(int)
+        for g in grams:
+            for i in self.grams.get(g, ()):
+                counts[i] += 1
+        need = max(1, len(grams) - 3 * cap)
+        best: Optional[Tuple[int, int, str]] = None
+        for i, shared in counts.items():
+            key = self.keys[i]
+            if shared < need or abs(len(key) - len(word)) > cap:
+                continue
+            d = _edit_distance(word, key, cap)
+            if d <= cap and (best is None or (d, -shared) < (best[0], -best[1])):
+                best = (d, shared, key)
+        if len(self._fuzzy_memo) > 50_000:
+            self._fuzzy_memo.clear()
+        self._fuzzy_memo[word] = best[2] if best else None
+        return self._fuzzy_memo[word]
+
+    def resolve(self, text: str) -> Optional[Dict[str, Any]]:
+        """An explicit location string: coordinates, an ID, or 'place[, state]'."""
+        text = (text or "").strip()
+        if not text:
+            return None
+        coords = parse_coords(text)
+        if coords:
+            lat, lon = coords
+            return {"id": f"geo:{lat:.3f},{lon:.3f}", "name": text, "kind": "point", "state": "",
+                    "state_id": "", "lat": lat, "lon": lon, "method": "coords", "confidence": 1.0}
+        if text in self.places:
+            return self._hit(text, "id", 1.0)
+
+        head, *rest = [p for p in re.split(r"[,/]", text) if p.strip()] or [text]
+        hints = self._state_hints(rest)
+        key = " ".join(_tokens(head))
+        if key in self.exact:
+            return self._hit(self._pick(self.exact[key], hints), "exact", 0.95)
+        if len(key) >= 4:
+            pref = self.prefix_lookup(key, limit=2)
+            if len(pref) == 1:
+                return self._hit(self._pick(self.exact[pref[0]], hints), "prefix", 0.75)
+            fuzzy = self._fuzzy_key(key)
+            if fuzzy:
+                return self._hit(self._pick(self.exact[fuzzy], hints), "fuzzy", 0.7)
+        return self.extract(text)
+
+    def extract(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        First district/city named in free text (else a state); exact aliases only.
+        method is "qualified" when the name came with a qualifier or its state,
+        "text" for a bare mention.
+        """
+        toks = _tokens(text)
+        found: List[Tuple[List[str], str, bool]] = []   # (ids, alias, qualified)
+        i = 0
+        while i < len(toks):
+            for n in range(min(self.max_words, len(toks) - i), 0, -1):
+                key = " ".join(toks[i:i + n])
+                if len(key) > 2 and key in self.exact and key not in _STOPWORDS:  # 2-letter codes only as qualifiers
+                    q = (i > 0 and toks[i - 1] in _QUALIFY_BEFORE) or (i + n < len(toks) and toks[i + n] in _QUALIFY_AFTER)
+                    found.append((self.exact[key], key, q))
+                    i += n
+                    break
+            else:
+                i += 1
+        states = [pid for ids, key, q in found for pid in ids
+                  if self.places[pid]["kind"] == "state" and (q or key not in _AMBIGUOUS)]
+        for ids, key, q in found:
+            local = [pid for pid in ids if self.places[pid]["kind"] != "state"]
+            if not local:
+                continue
+            pid = self._pick(local, states)
+            q = q or self.places[pid]["state_id"] in states
+            if key in _AMBIGUOUS and not q:
+                continue
+            return self._hit(pid, "qualified", 0.9) if q else self._hit(pid, "text", 0.85)
+        for ids, key, q in found:
+            if ids[0] in states:
+                return self._hit(ids[0], "qualified" if q else "text", 0.8)
+        return None
+
+
+_INDEX: Optional[Gazetteer] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def gazetteer() -> Gazetteer:
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = Gazetteer([PLACES_PATH, *EXTRA_PLACES])
+    return _INDEX
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _resolve_cached(text: str) -> Optional[Tuple[Tuple[str, Any], ...]]:
+    hit = gazetteer().resolve(text)
+    return tuple(hit.items()) if hit else None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _extract_cached(text: str) -> Optional[Tuple[Tuple[str, Any], ...]]:
+    hit = gazetteer().extract(text)
+    return tuple(hit.items()) if hit else None
+
+
+def resolve_location(text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Canonical place for an explicit location string (cached)."""
+    hit = _resolve_cached(str(text or "").strip())
+    return dict(hit) if hit else None
+
+
+def extract_location(text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Place mentioned in a free-text message (cached)."""
+    hit = _extract_cached(text or "")
+    return dict(hit) if hit else None
+
+
+def canonical_location(value: Any) -> Any:
+    """Place ID for a location argument; unresolvable values pass through unchanged."""
+    if not isinstance(value, str):
+        return value
+    hit = resolve_location(value)
+    return hit["id"] if hit else value
+
+
+def resolve_turn(state: Dict[str, Any], user_text: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Once per turn: a place named in this message wins, else the session's location.
+    A bare mention (no "in X", district or state context) only fills an empty
+    location; it never replaces the session's. Stores the record in
+    state['location_resolved'] and its ID in state['location'].
+    """
+    hit = extract_location(user_text) if user_text else None
+    if hit is not None and hit["method"] != "qualified" and state.get("location"):
+        hit = None
+    if hit is None and state.get("location"):
+        hit = resolve_location(str(state["location"]))
+    state["location_resolved"] = hit
+    if hit:
+        state["location"] = hit["id"]
+    return hit
+
+
+def location_cache_stats() -> Dict[str, int]:
+    r, e = _resolve_cached.cache_info(), _extract_cached.cache_info()
+    return {"hits": r.hits + e.hits, "misses": r.misses + e.misses, "size": r.currsize + e.currsize}
+
+
+if __name__ == "__main__":
+    # python -m src.agent.data.gazetteer [file] : one location/text per line in, TSV out
+    import sys, time
+    src = open(sys.argv[1], encoding="utf-8") if len(sys.argv) > 1 else sys.stdin
+    rows = [line.rstrip("\n") for line in src]
+    t0 = time.perf_counter()
+    results = [resolve_location(r) for r in rows]
+    dt = time.perf_counter() - t0
+    for text, r in zip(rows, results):
+        r = r or {}
+        print("\t".join([text, str(r.get("id", "")), str(r.get("name", "")), str(r.get("method", "")),
+                         str(r.get("lat", "")), str(r.get("lon", ""))]))
+    print(f"# {len(rows)} rows in {dt * 1000:.1f} ms ({len(gazetteer().places)} places)", file=sys.stderr)
@@ -0,0 +1,440 @@
+from __future__ import annotations
+import csv, json, os, re, threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Mandi price history as append-only columns, one pair of files per (crop, region):
+#   <dir>/series/<sid>.day    int32 days since 1970-01-01, non-decreasing
+#   <dir>/series/<sid>.price  float32 modal price per quintal
+#   <dir>/summary.npz         per-series running state (see _COLS), plus "meta":
+#                             {"window_days": W, "keys": {"crop|region": sid}}  (region = gazetteer ID if known)
+#   <dir>/keys.json           copy of meta for inspection; readers use the one in summary.npz
+#
+# Every crop also gets a "crop|*" series across all regions. The summary keeps
+# OLS sums over the trailing window, updated on ingest by adding new rows and
+# subtracting rows that fall out of it, so a lookup is a dict hit plus a row read.
+# Rows that arrive after later days are merged into their series (the files are
+# rewritten in day order and that series' sums rebuilt). A row whose (day, price)
+# is already stored for its (crop, region), or repeated in the batch, is a
+# re-ingest and is skipped, so loading the same export twice changes nothing.
+MARKET_STORE_DIR = os.getenv("MARKET_STORE_DIR", "/srv/farmagent/market")
+WINDOW_DAYS = int(os.getenv("MARKET_WINDOW_DAYS", "30"))
+TREND_PCT = float(os.getenv("MARKET_TREND_PCT", "3"))  # |change over window| below this -> "stable"
+ALL_REGIONS = "*"
+
+_COLS = {
+    "count": np.int64, "win_start": np.int64, "anchor": np.int32, "last_day": np.int32,
+    "last_price": np.float32, "n": np.float64, "sx": np.float64, "sy": np.float64,
+    "sxy": np.float64, "sxx": np.float64,
+}
+_EPOCH = date(1970, 1, 1).toordinal()
+_PARENS_RE = re.compile(r"\(([^()]*)\)")
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%Y/%m/%d")
+
+# Header aliases, including Agmarknet export columns.
+_HEADERS = {
+    "date": ("date", "arrival_date", "price_date"),
+    "crop": ("crop", "commodity"),
+    "region": ("region", "state", "district", "market"),
+    "price": ("price", "modal_price", "modal price", "avg_price"),
+}
+
+
+def parse_day(text: str) -> int:
+    text = (text or "").strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).toordinal() - _EPOCH
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date '{text}'")
+
+
+def _norm_region(region: Optional[str]) -> str:
+    """Gazetteer place ID when the name is known (so tools and ingest agree), else the folded name."""
+    from .gazetteer import resolve_location
+    if not region or region == ALL_REGIONS:
+        return ALL_REGIONS
+    hit = resolve_location(region)
+    if hit and hit["method"] in ("id", "exact"):
+        return hit["id"]
+    return " ".join(region.casefold().split()) or ALL_REGIONS
+
+
+def _norm_crop(crop: Optional[str]) -> str:
+    """
+    Canonical crop for a commodity name, shared with crop_id_tool. Agmarknet names
+    carry qualifiers ("Paddy(Dhan)(Common)", "Bengal Gram(Gram)(Whole)"): the name
+    outside the brackets is tried first, then the bracketed ones.
+    """
+    from .crops import extract_crop, resolve_crop
+    text = crop or ""
+    head = " ".join(_PARENS_RE.sub(" ", text).split())
+    for name in [head, *_PARENS_RE.findall(text)]:
+        hit = resolve_crop(name) or extract_crop(name)
+        if hit:
+            return str(hit["crop"])
+    return (head or text).casefold().strip()
+
+
+class MarketStore:
+    def __init__(self, root: str, window_days: Optional[int] = None):
+        self.root = Path(root)
+        self.series_dir = self.root / "series"
+        keys_path = self.root / "keys.json"
+        meta: Dict[str, Any] = {}
+        # Keys and sums come from the same file, so a reader never pairs new keys with an old summary
+        if (self.root / "summary.npz").exists():
+            with np.load(self.root / "summary.npz") as z:
+                self.cols = {c: z[c].astype(t) for c, t in _COLS.items()}
+                if "meta" in z.files:
+                    meta = json.loads(str(z["meta"]))
+        else:
+            self.cols = {c: np.zeros(0, dtype=t) for c, t in _COLS.items()}
+        if not meta and keys_path.exists():   # stores saved before keys moved into summary.npz
+            meta = json.loads(keys_path.read_text())
+        self.window_days = int(meta.get("window_days") or window_days or WINDOW_DAYS)
+        self.keys: Dict[str, int] = dict(meta.get("keys", {}))
+        self._memo: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.stats = {"rows": 0, "late_rows": 0, "dup_rows": 0, "bad_rows": 0, "rebuilds": 0}
+
+    # --- keys ---------------------------------------------------------------
+    @staticmethod
+    def key(crop: str, region: str) -> str:
+        return f"{crop}|{region}"
+
+    def _sid(self, key: str) -> int:
+        sid = self.keys.get(key)
+        if sid is None:
+            sid = self.keys[key] = len(self.keys)
+            if sid >= len(self.cols["count"]):
+                grow = max(64, sid * 2)
+                for c, t in _COLS.items():
+                    self.cols[c] = np.concatenate([self.cols[c], np.zeros(grow - len(self.cols[c]), dtype=t)])
+        return sid
+
+    def _sids(self, crop: str, region: str) -> Tuple[int, int]:
+        hit = self._memo.get((crop, region))
+        if hit is None:
+            c = _norm_crop(crop)
+            hit = self._memo[(crop, region)] = (self._sid(self.key(c, _norm_region(region))),
+                                                self._sid(self.key(c, ALL_REGIONS)))
+        return hit
+
+    def _paths(self, sid: int) -> Tuple[Path, Path]:
+        return self.series_dir / f"{sid}.day", self.series_dir / f"{sid}.price"
+
+    # --- ingest -------------------------------------------------------------
+    def ingest_arrays(self, days: Sequence[int], crops: Sequence[str], regions: Sequence[str],
+                      prices: Sequence[float]) -> Dict[str, int]:
+        """Append a batch of rows; updates rolling sums incrementally per touched series."""
+        days = np.asarray(days, dtype=np.int32)
+        prices = np.asarray(prices, dtype=np.float32)
+        pairs = [self._sids(c, r) for c, r in zip(crops, regions)]
+        sids = np.fromiter((p[0] for p in pairs), dtype=np.int64, count=len(pairs))
+        stars = np.fromiter((p[1] for p in pairs), dtype=np.int64, count=len(pairs))
+        ok = np.isfinite(prices) & (prices > 0)
+        self.stats["bad_rows"] += int((~ok).sum())
+        sids, stars, days, prices = sids[ok], stars[ok], days[ok], prices[ok]
+        # Duplicates are decided on the region series; the crop|* row follows its region row
+        new = self._unseen(sids, days, prices)
+        self.stats["dup_rows"] += int((~new).sum())
+        # Rows without a region already belong to crop|*: append them once
+        also = new & (stars != sids)
+        sids = np.concatenate([sids[new], stars[also]])
+        days = np.concatenate([days[new], days[also]])
+        prices = np.concatenate([prices[new], prices[also]])
+
+        order = np.lexsort((days, sids))
+        sids, days, prices = sids[order], days[order], prices[order]
+        cuts = np.flatnonzero(np.diff(sids)) + 1
+        self.series_dir.mkdir(parents=True, exist_ok=True)
+        for start, end in zip(np.r_[0, cuts], np.r_[cuts, len(sids)]):
+            if start < end:
+                self._append(int(sids[start]), days[start:end], prices[start:end])
+        self.stats["rows"] += int(new.sum())
+        return dict(self.stats)
+
+    @staticmethod
+    def _row_keys(d: np.ndarray, p: np.ndarray) -> np.ndarray:
+        return (d.astype(np.int64) << 32) | p.astype(np.float32).view(np.uint32).astype(np.int64)
+
+    def _unseen(self, sids: np.ndarray, days: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        """Mask of rows not already stored (same series, day and price) nor repeated earlier in the batch."""
+        keys = self._row_keys(days, prices)
+        new = np.zeros(len(sids), dtype=bool)
+        if len(sids):
+            order = np.lexsort((keys, sids))
+            first = np.r_[True, (np.diff(sids[order]) != 0) | (np.diff(keys[order]) != 0)]
+            new[order[first]] = True
+        c = self.cols
+        stored = np.flatnonzero(new & (c["count"][sids] > 0) & (days <= c["last_day"][sids]))
+        for sid in np.unique(sids[stored]):
+            rows = stored[sids[stored] == sid]
+            day_path, price_path = self._paths(int(sid))
+            old_d = np.fromfile(day_path, dtype=np.int32)
+            k = int(np.searchsorted(old_d, int(days[rows].min())))
+            old_p = np.fromfile(price_path, dtype=np.float32, offset=k * 4)
+            new[rows] = ~np.isin(keys[rows], self._row_keys(old_d[k:], old_p))
+        return new
+
+    def _append(self, sid: int, d: np.ndarray, p: np.ndarray) -> None:
+        c = self.cols
+        if c["count"][sid]:
+            late = int((d < c["last_day"][sid]).sum())
+            if late:  # columns must stay sorted: merge and rebuild this series
+                self.stats["late_rows"] += late
+                self._merge(sid, d, p)
+                return
+        else:
+            c["anchor"][sid] = d[0]
+        day_path, price_path = self._paths(sid)
+        with open(day_path, "ab") as f:
+            d.tofile(f)
+        with open(price_path, "ab") as f:
+            p.tofile(f)
+
+        x = (d - c["anchor"][sid]).astype(np.float64)
+        y = p.astype(np.float64)
+        c["n"][sid] += len(x)
+        c["sx"][sid] += x.sum()
+        c["sy"][sid] += y.sum()
+        c["sxy"][sid] += (x * y).sum()
+        c["sxx"][sid] += (x * x).sum()
+        c["count"][sid] += len(x)
+        c["last_day"][sid] = d[-1]
+        c["last_price"][sid] = p[-1]
+
+        # Evict rows older than the window: they are contiguous at win_start.
+        ws, total = int(c["win_start"][sid]), int(c["count"][sid])
+        tail = np.fromfile(day_path, dtype=np.int32, count=total - ws, offset=ws * 4)
+        k = int(np.searchsorted(tail, int(d[-1]) - self.window_days + 1))
+        if k:
+            old_x = (tail[:k] - c["anchor"][sid]).astype(np.float64)
+            old_y = np.fromfile(price_path, dtype=np.float32, count=k, offset=ws * 4).astype(np.float64)
+            c["n"][sid] -= k
+            c["sx"][sid] -= old_x.sum()
+            c["sy"][sid] -= old_y.sum()
+            c["sxy"][sid] -= (old_x * old_y).sum()
+            c["sxx"][sid] -= (old_x * old_x).sum()
+            c["win_start"][sid] = ws + k
+
+    def _merge(self, sid: int, d: np.ndarray, p: np.ndarray) -> None:
+        day_path, price_path = self._paths(sid)
+        days = np.concatenate([np.fromfile(day_path, dtype=np.int32), d])
+        prices = np.concatenate([np.fromfile(price_path, dtype=np.float32), p])
+        order = np.argsort(days, kind="stable")
+        for path, arr in ((day_path, days[order]), (price_path, prices[order])):
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            arr.tofile(tmp)
+            os.replace(tmp, path)
+        self._rebuild(sid)
+
+    def _rebuild(self, sid: int) -> None:
+        """Recompute one series' summary from its files."""
+        day_path, price_path = self._paths(sid)
+        d = np.fromfile(day_path, dtype=np.int32)
+        p = np.fromfile(price_path, dtype=np.float32)
+        c = self.cols
+        for col in _COLS:
+            c[col][sid] = 0
+        if not len(d):
+            return
+        ws = int(np.searchsorted(d, int(d[-1]) - self.window_days + 1))
+        x = (d[ws:] - d[0]).astype(np.float64)
+        y = p[ws:].astype(np.float64)
+        c["count"][sid], c["win_start"][sid], c["anchor"][sid] = len(d), ws, d[0]
+        c["last_day"][sid], c["last_price"][sid] = d[-1], p[-1]
+        c["n"][sid], c["sx"][sid], c["sy"][sid] = len(x), x.sum(), y.sum()
+        c["sxy"][sid], c["sxx"][sid] = (x * y).sum(), (x * x).sum()
+        self.stats["rebuilds"] += 1
+
+    def rebuild(self) -> None:
+        """Recompute every series' summary from the column files (e.g. after editing them by hand)."""
+        for sid in self.keys.values():
+            if self._paths(sid)[0].exists():
+                self._rebuild(sid)
+
+    def save(self) -> None:
+        """Persist keys + summary in one atomic rename (columns are already on disk)."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        n = len(self.keys)
+        meta = json.dumps({"window_days": self.window_days, "keys": self.keys})
+        tmp = self.root / "summary.tmp.npz"
+        np.savez(tmp, meta=np.array(meta), **{col: arr[:n] for col, arr in self.cols.items()})
+        os.replace(tmp, self.root / "summary.npz")
+        tmp_keys = self.root / "keys.json.tmp"
+        tmp_keys.write_text(meta)
+        os.replace(tmp_keys, self.root / "keys.json")
+
+    # --- reads --------------------------------------------------------------
+    def lookup(self, crop: Optional[str], region: Optional[str] = None, fallback: bool = True) -> Optional[Dict[str, Any]]:
+        """Rolling average + trend for (crop, region); optionally falls back to all regions for the crop."""
+        c = _norm_crop(crop)
+        r = _norm_region(region)
+        sid = self.keys.get(self.key(c, r))
+        scope = r
+        if sid is None and r != ALL_REGIONS and fallback:
+            sid, scope = self.keys.get(self.key(c, ALL_REGIONS)), ALL_REGIONS
+        if sid is None:
+            return None
+        col = self.cols
+        n = float(col["n"][sid])
+        if n <= 0:
+            return None
+        sx, sy, sxy, sxx = (float(col[k][sid]) for k in ("sx", "sy", "sxy", "sxx"))
+        avg = sy / n
+        den = n * sxx - sx * sx
+        slope = (n * sxy - sx * sy) / den if den > 1e-9 else 0.0
+        pct = slope * self.window_days / avg * 100 if avg else 0.0
+        trend = "rising" if pct >= TREND_PCT else "falling" if pct <= -TREND_PCT else "stable"
+        return {
+            "crop": c,
+            "region": "all" if scope == ALL_REGIONS else scope,
+            "avg_price": round(avg, 2),
+            "trend": trend,
+            "trend_pct": round(pct, 2),
+            "slope_per_day": round(slope, 3),
+            "last_price": round(float(col["last_price"][sid]), 2),
+            "last_date": date.fromordinal(int(col["last_day"][sid]) + _EPOCH).isoformat(),
+            "window_days": self.window_days,
+            "samples": int(n),
+        }
+
+    def series(self, crop: str, region: Optional[str] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Full (days, prices) history as read-only memory maps."""
+        sid = self.keys.get(self.key(_norm_crop(crop), _norm_region(region)))
+        if sid is None or not self.cols["count"][sid]:
+            return None
+        day_path, price_path = self._paths(sid)
+        return np.memmap(day_path, dtype=np.int32, mode="r"), np.memmap(price_path, dtype=np.float32, mode="r")
+
+
+_STORE: Optional[MarketStore] = None
+_STORE_MTIME = 0.0
+_LOCK = threading.Lock()
+
+
+def market_store() -> Optional[MarketStore]:
+    """Reader store for the tool; reloads the summary when an ingest has saved a new one."""
+    global _STORE, _STORE_MTIME
+    try:
+        mtime = (Path(MARKET_STORE_DIR) / "summary.npz").stat().st_mtime
+    except OSError:
+        return None
+    if _STORE is None or mtime != _STORE_MTIME:
+        with _LOCK:
+            if _STORE is None or mtime != _STORE_MTIME:
+                _STORE, _STORE_MTIME = MarketStore(MARKET_STORE_DIR), mtime
+    return _STORE
+
+
+def _column(header: List[str], field: str) -> int:
+    lowered = [h.strip().casefold() for h in header]
+    for alias in _HEADERS[field]:
+        if alias in lowered:
+            return lowered.index(alias)
+    raise ValueError(f"no {field} column in {header}")
+
+
+def ingest_csv(store: MarketStore, path: str, chunk: int = 200_000) -> Dict[str, int]:
+    """Stream a price CSV into the store in chunks."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        reader = csv.reader(fh)
+        header = next(reader)
+        di, ci, ri, pi = (_column(header, f) for f in ("date", "crop", "region", "price"))
+        buf: Tuple[List[int], List[str], List[str], List[float]] = ([], [], [], [])
+        day_memo: Dict[str, int] = {}
+        for row in reader:
+            try:
+                d = day_memo.get(row[di])
+                if d is None:
+                    d = day_memo[row[di]] = parse_day(row[di])
+                price = float(row[pi])
+            except (ValueError, IndexError):
+                store.stats["bad_rows"] += 1
+                continue
+            buf[0].append(d)
+            buf[1].append(row[ci])
+            buf[2].append(row[ri])
+            buf[3].append(price)
+            if len(buf[0]) >= chunk:
+                store.ingest_arrays(*buf)
+                buf = ([], [], [], [])
+        if buf[0]:
+            store.ingest_arrays(*buf)
+    return dict(store.stats)
+
+
+if __name__ == "__main__":
+    import argparse, shutil, time
+
+    ap = argparse.ArgumentParser(description="Market price store: ingest CSVs, query, or benchmark.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    i = sub.add_parser("ingest", help="date, crop/commodity, region/state/district, price/modal_price columns")
+    i.add_argument("csv", nargs="+")
+    i.add_argument("--root", default=MARKET_STORE_DIR)
+    i.add_argument("--window-days", type=int, default=WINDOW_DAYS)
+    r = sub.add_parser("rebuild", help="recompute summary.npz from the series files")
+    r.add_argument("--root", default=MARKET_STORE_DIR)
+    q = sub.add_parser("query")
+    q.add_argument("crop")
+    q.add_argument("region", nargs="?")
+    q.add_argument("--root", default=MARKET_STORE_DIR)
+    b = sub.add_parser("bench")
+    b.add_argument("--root", default="/tmp/market-bench")
+    b.add_argument("--rows", type=int, default=2_000_000)
+    a = ap.parse_args()
+
+    if a.cmd == "ingest":
+        store = MarketStore(a.root, window_days=a.window_days)
+        t0 = time.perf_counter()
+        for path in a.csv:
+            ingest_csv(store, path)
+        store.save()
+        dt = time.perf_counter() - t0
+        print(json.dumps({**store.stats, "series": len(store.keys), "seconds": round(dt, 2)}, indent=2))
+    elif a.cmd == "rebuild":
+        store = MarketStore(a.root)
+        store.rebuild()
+        store.save()
+        print(json.dumps({"series": len(store.keys), "rebuilds": store.stats["rebuilds"]}))
+    elif a.cmd == "query":
+        print(json.dumps(MarketStore(a.root).lookup(a.crop, a.region), indent=2))
+    else:
+        shutil.rmtree(a.root, ignore_errors=True)
+        rng = np.random.default_rng(0)
+        crops = np.array(["rice", "wheat", "maize", "tomato", "onion", "potato", "cotton", "soybean",
+                          "groundnut", "chickpea", "mustard", "sugarcane", "banana", "chilli", "turmeric"], dtype=object)
+        regions = np.array([f"district {k}" for k in range(60)], dtype=object)
+        store = MarketStore(a.root)
+        days_total = 5 * 365
+        chunk = 500_000
+        t0 = time.perf_counter()
+        for start in range(0, a.rows, chunk):
+            m = min(chunk, a.rows - start)
+            lo, hi = days_total * start // a.rows, days_total * (start + m) // a.rows
+            day = np.sort(rng.integers(lo, max(hi, lo + 1), m)) + 18000  # chronological, as daily feeds arrive
+            ci = rng.integers(0, len(crops), m)
+            ri = rng.integers(0, len(regions), m)
+            price = 1500 + 100 * ci + 0.3 * (day - 18000) + rng.normal(0, 80, m)
+            store.ingest_arrays(day, crops[ci], regions[ri], price)
+        store.save()
+        ingest_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        reader = MarketStore(a.root)
+        open_ms = (time.perf_counter() - t0) * 1000
+        probes = [(str(crops[k % len(crops)]), str(regions[k % len(regions)])) for k in range(10_000)]
+        t0 = time.perf_counter()
+        for c, r in probes:
+            reader.lookup(c, r)
+        lookup_us = (time.perf_counter() - t0) / len(probes) * 1e6
+        print(json.dumps({
+            "rows": a.rows, "series": len(reader.keys), **store.stats,
+            "ingest_s": round(ingest_s, 2), "ingest_rows_per_s": int(a.rows / ingest_s),
+            "open_ms": round(open_ms, 2), "lookup_us": round(lookup_us, 2),
+            "example": reader.lookup("tomato", "district 3"),
+        }, indent=2))
@@ -0,0 +1,290 @@
+from __future__ import annotations
+import json, math, os, threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Gridded soil layers served from local memory-mapped .npy files.
+#
+# Store layout (written by `python -m src.agent.data.soil_store build ...`):
+#   <dir>/meta.json       {"north", "west", "cell", "nrows", "ncols", "fields": [...]}
+#   <dir>/<field>.npy     float32 (nrows, ncols), row 0 = northern edge, NaN = no data
+#
+# The grid is a regular lat/lon raster, so the spatial index is arithmetic: a
+# coordinate maps to its cell in O(1) (a fixed-precision geohash bucket). Only
+# the pages touched by a lookup are read; startup maps the files and loads nothing.
+SOIL_STORE_DIR = os.getenv("SOIL_STORE_DIR", "/srv/farmagent/soil")
+FIELDS = ("ph", "nitrogen", "organic_matter_pct")
+MAX_RING = int(os.getenv("SOIL_MAX_RING", "3"))  # cells searched around a no-data cell
+EARTH_KM = 6371.0088
+
+
+class SoilStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        meta = json.loads((self.root / "meta.json").read_text())
+        self.north = float(meta["north"])
+        self.west = float(meta["west"])
+        self.cell = float(meta["cell"])
+        self.nrows = int(meta["nrows"])
+        self.ncols = int(meta["ncols"])
+        self.fields: Tuple[str, ...] = tuple(meta["fields"])
+        self.layers: Dict[str, np.ndarray] = {
+            f: np.load(self.root / f"{f}.npy", mmap_mode="r") for f in self.fields
+        }
+        self._key = self.fields[0]  # validity of a cell = first field present
+
+    # --- indexing -----------------------------------------------------------
+    def _cells(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows = np.floor((self.north - lats) / self.cell).astype(np.int64)
+        cols = np.floor((lons - self.west) / self.cell).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.nrows) & (cols >= 0) & (cols < self.ncols)
+        return np.clip(rows, 0, self.nrows - 1), np.clip(cols, 0, self.ncols - 1), inside
+
+    def _center(self, row: int, col: int) -> Tuple[float, float]:
+        return self.north - (row + 0.5) * self.cell, self.west + (col + 0.5) * self.cell
+
+    @staticmethod
+    def _km(lat1, lon1, lat2, lon2):
+        """Equirectangular distance; exact enough within a few cells."""
+        x = np.radians(lon2 - lon1) * np.cos(np.radians((lat1 + lat2) / 2))
+        y = np.radians(lat2 - lat1)
+        return EARTH_KM * np.sqrt(x * x + y * y)
+
+    def _record(self, row: int, col: int, lat: float, lon: float) -> Dict[str, Any]:
+        out: Dict[str, Any] = {f: _f(self.layers[f][row, col]) for f in self.fields}
+        clat, clon = self._center(row, col)
+        out["cell_distance_km"] = round(float(self._km(lat, lon, clat, clon)), 3)
+        return out
+
+    # --- lookups ------------------------------------------------------------
+    def nearest(self, lat: float, lon: float, max_ring: int = MAX_RING) -> Optional[Dict[str, Any]]:
+        """Cell containing (lat, lon); if it has no data, nearest valid cell within max_ring."""
+        rows, cols, inside = self._cells(np.array([lat]), np.array([lon]))
+        if not inside[0]:
+            return None
+        r, c = int(rows[0]), int(cols[0])
+        if not math.isnan(float(self.layers[self._key][r, c])):
+            return self._record(r, c, lat, lon)
+        r0, r1 = max(0, r - max_ring), min(self.nrows, r + max_ring + 1)
+        c0, c1 = max(0, c - max_ring), min(self.ncols, c + max_ring + 1)
+        window = np.asarray(self.layers[self._key][r0:r1, c0:c1])
+        rr, cc = np.nonzero(~np.isnan(window))
+        if rr.size == 0:
+            return None
+        clat = self.north - (rr + r0 + 0.5) * self.cell
+        clon = self.west + (cc + c0 + 0.5) * self.cell
+        k = int(np.argmin(self._km(lat, lon, clat, clon)))
+        return self._record(int(rr[k] + r0), int(cc[k] + c0), lat, lon)
+
+    def area_mean(self, lat: float, lon: float, radius_km: float) -> Optional[Dict[str, Any]]:
+        """Mean of each field over valid cells whose centres lie within radius_km."""
+        rows, cols, inside = self._cells(np.array([lat]), np.array([lon]))
+        if not inside[0]:
+            return None
+        dr = int(math.ceil(radius_km / (self.cell * 111.32))) + 1
+        dc = int(math.ceil(radius_km / (self.cell * 111.32 * max(0.01, math.cos(math.radians(lat)))))) + 1
+        r, c = int(rows[0]), int(cols[0])
+        r0, r1 = max(0, r - dr), min(self.nrows, r + dr + 1)
+        c0, c1 = max(0, c - dc), min(self.ncols, c + dc + 1)
+        clat = (self.north - (np.arange(r0, r1) + 0.5) * self.cell)[:, None]
+        clon = (self.west + (np.arange(c0, c1) + 0.5) * self.cell)[None, :]
+        mask = self._km(lat, lon, clat, clon) <= radius_km
+        out: Dict[str, Any] = {}
+        for f in self.fields:
+            vals = np.asarray(self.layers[f][r0:r1, c0:c1])[mask]
+            vals = vals[~np.isnan(vals)]
+            out[f] = round(float(vals.mean()), 3) if vals.size else None
+        out["cells"] = int(mask.sum())
+        out["radius_km"] = radius_km
+        return out
+
+    def batch(self, lats: Sequence[float], lons: Sequence[float]) -> Dict[str, np.ndarray]:
+        """Vectorized cell lookup for many coordinates; no-data/outside -> NaN (then ring search)."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        rows, cols, inside = self._cells(lats, lons)
+        out = {f: np.where(inside, np.asarray(self.layers[f][rows, cols], dtype=np.float32), np.nan)
+               for f in self.fields}
+        for i in np.nonzero(inside & np.isnan(out[self._key]))[0]:
+            rec = self.nearest(float(lats[i]), float(lons[i]))
+            if rec:
+                for f in self.fields:
+                    out[f][i] = np.nan if rec[f] is None else rec[f]
+        return out
+
+
+def _f(v: Any) -> Optional[float]:
+    v = float(v)
+    return None if math.isnan(v) else round(v, 3)
+
+
+_STORE: Optional[SoilStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def soil_store() -> Optional[SoilStore]:
+    """Process-wide store, opened on first use; None when no store is installed."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None and (Path(SOIL_STORE_DIR) / "meta.json").exists():
+                _STORE = SoilStore(SOIL_STORE_DIR)
+    return _STORE
+
+
+# --- offline build -----------------------------------------------------------
+def _read_asc_header(fh) -> Dict[str, float]:
+    hdr: Dict[str, float] = {}
+    while len(hdr) < 6:
+        pos = fh.tell()
+        line = fh.readline()
+        parts = line.split(None, 1)   # ESRI headers use spaces or tabs
+        if not parts or parts[0][0].isdigit() or parts[0][0] in "-.":
+            fh.seek(pos)
+            break
+        hdr[parts[0].lower()] = float(parts[1])
+    return hdr
+
+
+def _asc_to_npy(src: Path, dst: Path) -> Dict[str, float]:
+    """Stream an ESRI ASCII grid row by row into a float32 .npy (never holds the grid in RAM)."""
+    with open(src, "r") as fh:
+        h = _read_asc_header(fh)
+        nrows, ncols, cell = int(h["nrows"]), int(h["ncols"]), h["cellsize"]
+        west = h.get("xllcorner", h.get("xllcenter", 0.0) - cell / 2)
+        south = h.get("yllcorner", h.get("yllcenter", 0.0) - cell / 2)
+        nodata = h.get("nodata_value", -9999.0)
+        out = np.lib.format.open_memmap(dst, mode="w+", dtype=np.float32, shape=(nrows, ncols))
+        for r in range(nrows):
+            row = np.array(fh.readline().split(), dtype=np.float32)
+            row[row == nodata] = np.nan
+            out[r, :] = row
+        out.flush()
+        del out
+    return {"north": south + nrows * cell, "west": west, "cell": cell, "nrows": nrows, "ncols": ncols}
+
+
+def _points_to_npy(src: Path, out_dir: Path, cell: float, fields: Iterable[str]) -> Dict[str, float]:
+    """Rasterize a CSV of point samples (lat,lon,<fields>) by averaging per cell, in chunks."""
+    import csv
+    fields = list(fields)
+    lat_min = lon_min = math.inf
+    lat_max = lon_max = -math.inf
+    with open(src, newline="") as fh:
+        for rec in csv.DictReader(fh):
+            lat, lon = float(rec["lat"]), float(rec["lon"])
+            lat_min, lat_max = min(lat_min, lat), max(lat_max, lat)
+            lon_min, lon_max = min(lon_min, lon), max(lon_max, lon)
+    north = round(math.ceil(lat_max / cell) * cell, 9)
+    west = round(math.floor(lon_min / cell) * cell, 9)
+    nrows = int(math.ceil((north - lat_min) / cell)) + 1
+    ncols = int(math.ceil((lon_max - west) / cell)) + 1
+    sums = {f: np.lib.format.open_memmap(out_dir / f"{f}.npy", mode="w+", dtype=np.float32, shape=(nrows, ncols))
+            for f in fields}
+    counts = np.zeros((nrows, ncols), dtype=np.uint32)  # 4 B/cell; the only in-RAM grid
+
+    def _flush(chunk: List[Dict[str, str]]) -> None:
+        lat = np.array([float(r["lat"]) for r in chunk])
+        lon = np.array([float(r["lon"]) for r in chunk])
+        rows = np.floor((north - lat) / cell).astype(np.int64)
+        cols = np.floor((lon - west) / cell).astype(np.int64)
+        np.add.at(counts, (rows, cols), 1)
+        for f in fields:
+            np.add.at(sums[f], (rows, cols), np.array([float(r.get(f) or "nan") for r in chunk], dtype=np.float32))
+
+    with open(src, newline="") as fh:
+        chunk: List[Dict[str, str]] = []
+        for rec in csv.DictReader(fh):
+            chunk.append(rec)
+            if len(chunk) >= 100_000:
+                _flush(chunk)
+                chunk = []
+        if chunk:
+            _flush(chunk)
+    for f in fields:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for r in range(nrows):  # row-wise so the divide never materializes the grid
+                sums[f][r] = np.where(counts[r] > 0, sums[f][r] / counts[r], np.nan)
+        sums[f].flush()
+    return {"north": north, "west": west, "cell": cell, "nrows": nrows, "ncols": ncols}
+
+
+def build(out_dir: str, grids: Dict[str, str], points: Optional[str] = None, cell: float = 0.01) -> Dict[str, Any]:
+    """Convert raw grids (ESRI .asc per field) or a point CSV into a store directory."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    tmp_meta = out / "meta.json.tmp"
+    if points:
+        meta = _points_to_npy(Path(points), out, cell, FIELDS)
+        fields = list(FIELDS)
+    else:
+        meta, fields = None, []
+        for field, src in grids.items():
+            m = _asc_to_npy(Path(src), out / f"{field}.npy")
+            if meta is not None and any(abs(m[k] - meta[k]) > 1e-9 for k in meta):
+                raise ValueError(f"grid for '{field}' does not match the other layers")
+            meta = m
+            fields.append(field)
+        if meta is None:
+            raise ValueError("no input grids given")
+    meta = {**meta, "fields": fields}
+    tmp_meta.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp_meta, out / "meta.json")  # meta last: a half-built store is never opened
+    return meta
+
+
+if __name__ == "__main__":
+    import argparse, time
+
+    ap = argparse.ArgumentParser(description="Soil grid store: build from raw grids, or benchmark lookups.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--out", default=SOIL_STORE_DIR)
+    for f in FIELDS:
+        b.add_argument(f"--{f.replace('_', '-')}", dest=f, help=f"ESRI ASCII grid for {f}")
+    b.add_argument("--points", help="CSV with lat,lon,ph,nitrogen,organic_matter_pct columns")
+    b.add_argument("--cell", type=float, default=0.01, help="cell size (deg) when rasterizing --points")
+    bench = sub.add_parser("bench")
+    bench.add_argument("--dir", default="/tmp/soil-bench")
+    bench.add_argument("--size", type=int, default=3000, help="synthetic grid is size x size cells")
+    bench.add_argument("--queries", type=int, default=100_000)
+    a = ap.parse_args()
+
+    if a.cmd == "build":
+        grids = {f: getattr(a, f) for f in FIELDS if getattr(a, f)}
+        print(json.dumps(build(a.out, grids, points=a.points, cell=a.cell), indent=2))
+    else:
+        root = Path(a.dir)
+        root.mkdir(parents=True, exist_ok=True)
+        rng = np.random.default_rng(0)
+        n = a.size
+        for f, lo, hi in (("ph", 4.5, 8.5), ("nitrogen", 0, 400), ("organic_matter_pct", 0.2, 4)):
+            arr = np.lib.format.open_memmap(root / f"{f}.npy", mode="w+", dtype=np.float32, shape=(n, n))
+            for r in range(0, n, 500):
+                block = rng.uniform(lo, hi, size=(min(500, n - r), n)).astype(np.float32)
+                block[rng.random(block.shape) < 0.05] = np.nan
+                arr[r:r + 500] = block
+            arr.flush()
+            del arr
+        (root / "meta.json").write_text(json.dumps(
+            {"north": 37.0, "west": 68.0, "cell": 30.0 / n, "nrows": n, "ncols": n, "fields": list(FIELDS)}))
+        t0 = time.perf_counter()
+        store = SoilStore(str(root))
+        open_ms = (time.perf_counter() - t0) * 1000
+        lats = rng.uniform(7.0, 37.0, a.queries)
+        lons = rng.uniform(68.0, 98.0, a.queries)
+        t0 = time.perf_counter()
+        for i in range(min(10_000, a.queries)):
+            store.nearest(lats[i], lons[i])
+        single_us = (time.perf_counter() - t0) / min(10_000, a.queries) * 1e6
+        t0 = time.perf_counter()
+        store.batch(lats, lons)
+        batch_us = (time.perf_counter() - t0) / a.queries * 1e6
+        t0 = time.perf_counter()
+        for i in range(1000):
+            store.area_mean(lats[i], lons[i], 10.0)
+        area_us = (time.perf_counter() - t0) / 1000 * 1e6
+        print(json.dumps({"cells": n * n, "open_ms": round(open_ms, 2), "nearest_us": round(single_us, 2),
+                          "batch_us_per_point": round(batch_us, 3), "area_mean_10km_us": round(area_us, 2)}, indent=2))
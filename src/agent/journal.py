@@ -0,0 +1,274 @@
+from __future__ import annotations
+import atexit, gzip, json, os, threading, time, zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Append-only event journal: receipts, governor decisions and per-turn gateway
+# metrics, kept outside session state so nothing is truncated and offline
+# analysis has one source.
+#
+# record() only appends a tuple to a bounded deque (well under a microsecond on
+# the caller's thread). A daemon writer wakes every JOURNAL_FLUSH_MS, encodes the
+# batch as JSON lines and appends it as one gzip member to the current segment
+# ({JOURNAL_DIR}/{start_ms}-{pid}.jsonl.gz — a concatenation of members is a
+# valid gzip file, so `zcat` / gzip.open read it). Segments rotate by size and
+# age; the oldest are deleted once the directory exceeds JOURNAL_MAX_BYTES.
+# When the queue is full, records are dropped and counted, never blocked on.
+JOURNAL          = os.getenv("JOURNAL", "true").lower() == "true"
+JOURNAL_DIR      = Path(os.getenv("JOURNAL_DIR", "/tmp/farmagent/journal"))
+FLUSH_MS         = float(os.getenv("JOURNAL_FLUSH_MS", "200"))
+QUEUE_MAX        = int(os.getenv("JOURNAL_QUEUE_MAX", "100000"))
+SEGMENT_BYTES    = int(os.getenv("JOURNAL_SEGMENT_BYTES", str(8 * 1024 * 1024)))   # compressed
+SEGMENT_S        = float(os.getenv("JOURNAL_SEGMENT_S", "3600"))
+MAX_BYTES        = int(os.getenv("JOURNAL_MAX_BYTES", str(512 * 1024 * 1024)))
+COMPRESS_LEVEL   = int(os.getenv("JOURNAL_COMPRESS_LEVEL", "6"))
+
+SUFFIX = ".jsonl.gz"
+
+
+class Journal:
+    def __init__(self, directory: Path = JOURNAL_DIR):
+        self.dir = Path(directory)
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "segments": 0,
+                      "bytes_raw": 0, "bytes_gz": 0, "pruned": 0, "errors": 0}
+        self._q: deque = deque()
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._seg: Optional[Path] = None
+        self._seg_t0 = 0.0
+        self._seg_bytes = 0
+
+    # --- hot path ----------------------------------------------------------------
+    def record(self, kind: str, fields: Dict[str, Any]) -> None:
+        """Queue one record; fields are serialized later, so pass values that are not mutated afterwards."""
+        if self._pid is None:
+            self._start()
+        if len(self._q) >= QUEUE_MAX:
+            self.stats["dropped"] += 1
+            return
+        self._q.append((time.time(), kind, fields))
+        self.stats["queued"] += 1
+
+    # --- writer ------------------------------------------------------------------
+    def _start(self) -> None:
+        with self._lock:
+            if self._pid is not None:
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="journal-writer", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(FLUSH_MS / 1000)
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything queued so far (the writer thread calls this; also at exit)."""
+        with self._lock:
+            batch: List[tuple] = []
+            while self._q:
+                try:
+                    batch.append(self._q.popleft())
+                except IndexError:
+                    break
+            if not batch:
+                return 0
+            pid = os.getpid()
+            lines = []
+            for ts, kind, fields in batch:
+                try:
+                    lines.append(json.dumps({"ts": round(ts, 6), "kind": kind, "pid": pid, **fields},
+                                            default=str, separators=(",", ":")))
+                except Exception:
+                    self.stats["errors"] += 1
+            raw = ("\n".join(lines) + "\n").encode()
+            data = gzip.compress(raw, COMPRESS_LEVEL)
+            try:
+                seg = self._segment(len(data))
+                with open(seg, "ab") as f:
+                    f.write(data)
+                self._seg_bytes += len(data)
+            except OSError:
+                self.stats["errors"] += 1
+                return 0
+            self.stats["written"] += len(lines)
+            self.stats["batches"] += 1
+            self.stats["bytes_raw"] += len(raw)
+            self.stats["bytes_gz"] += len(data)
+            return len(lines)
+
+    def _segment(self, incoming: int) -> Path:
+        now = time.time()
+        if (self._seg is None or self._seg_bytes + incoming > SEGMENT_BYTES
+                or now - self._seg_t0 > SEGMENT_S or not self._seg.exists()):
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self._seg = self.dir / f"{int(now * 1000)}-{os.getpid()}{SUFFIX}"
+            self._seg_t0, self._seg_bytes = now, 0
+            self.stats["segments"] += 1
+            self._prune()
+        return self._seg
+
+    def _prune(self) -> None:
+        # Newest first; everything past the byte cap goes, except the segment being written
+        total = 0
+        for p in sorted(segments(self.dir), key=lambda p: p.name, reverse=True):
+            try:
+                total += p.stat().st_size
+                if total > MAX_BYTES and p != self._seg:
+                    p.unlink()
+                    self.stats["pruned"] += 1
+            except OSError:
+                pass
+
+    def _forked(self) -> None:
+        # The child has no writer thread and must not append to the parent's segment
+        self._lock = threading.Lock()
+        self._q.clear()
+        self._pid, self._seg = None, None
+
+    def status(self) -> Dict[str, Any]:
+        return {"enabled": JOURNAL, "dir": str(self.dir), "segment": self._seg.name if self._seg else None,
+                "pending": len(self._q), **self.stats}
+
+
+_JOURNAL: Optional[Journal] = None
+_JOURNAL_LOCK = threading.Lock()
+
+
+def journal() -> Journal:
+    global _JOURNAL
+    if _JOURNAL is None:
+        with _JOURNAL_LOCK:
+            if _JOURNAL is None:
+                _JOURNAL = Journal()
+    return _JOURNAL
+
+
+def _after_fork() -> None:
+    if _JOURNAL is not None:
+        _JOURNAL._forked()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def record(kind: str, **fields: Any) -> None:
+    """Journal one event (kind: receipt | governor | turn | ...). Never raises."""
+    if not JOURNAL:
+        return
+    try:
+        (_JOURNAL or journal()).record(kind, fields)
+    except Exception:
+        pass
+
+
+def context_ids(ctx: Any) -> Dict[str, Any]:
+    """Join keys of an ADK tool/callback context: session_id and invocation_id (empty without one)."""
+    if ctx is None:
+        return {}
+    try:
+        session = getattr(ctx, "session", None)
+        return {"session_id": getattr(session, "id", None), "invocation_id": getattr(ctx, "invocation_id", None)}
+    except Exception:
+        return {}
+
+
+def record_turn(source: str, started: float, result: Optional[Dict[str, Any]], error: Any = None,
+                session_id: Optional[str] = None, **fields: Any) -> None:
+    """
+    One 'turn' record from a gateway: wall time since started (perf_counter), outcome and
+    the turn's metrics, keyed by session_id and (when the events carried it) invocation_id.
+    """
+    result = result if isinstance(result, dict) else {}
+    err = str(error) if error else result.get("error") or None
+    metrics = result.get("metrics") or {}
+    record("turn", source=source, session_id=session_id, invocation_id=metrics.get("invocation_id"),
+           ms=round((time.perf_counter() - started) * 1000, 1), ok=not err, error=err,
+           metrics=result.get("metrics"), **fields)
+
+
+# --- offline reading -----------------------------------------------------------
+def segments(directory: Path = JOURNAL_DIR) -> List[Path]:
+    d = Path(directory)
+    return sorted(d.glob(f"*{SUFFIX}")) if d.exists() else []
+
+
+def read(directory: Path = JOURNAL_DIR, kinds: Optional[Iterable[str]] = None,
+         since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Records in segment order (per writer, time order). A member cut short by a crash ends that segment."""
+    kinds = set(kinds) if kinds else None
+    for seg in segments(directory):
+        try:
+            with gzip.open(seg, "rt") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if kinds and rec.get("kind") not in kinds:
+                        continue
+                    if since and rec.get("ts", 0) < since:
+                        continue
+                    yield rec
+        except (EOFError, OSError, zlib.error):
+            continue
+
+
+if __name__ == "__main__":
+    # python -m src.agent.journal stats|cat|bench [--kind K] [--since EPOCH] [--dir D]
+    import argparse, sys, tempfile
+    from collections import Counter
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["stats", "cat", "bench"])
+    ap.add_argument("--dir", default=str(JOURNAL_DIR))
+    ap.add_argument("--kind", action="append")
+    ap.add_argument("--since", type=float)
+    ap.add_argument("--records", type=int, default=50000)
+    a = ap.parse_args()
+
+    if a.cmd == "cat":
+        for rec in read(a.dir, a.kind, a.since):
+            sys.stdout.write(json.dumps(rec, separators=(",", ":")) + "\n")
+    elif a.cmd == "stats":
+        kinds: Counter = Counter()
+        first = last = None
+        for rec in read(a.dir, a.kind, a.since):
+            kinds[rec.get("kind")] += 1
+            first = rec["ts"] if first is None else min(first, rec["ts"])
+            last = rec["ts"] if last is None else max(last, rec["ts"])
+        segs = segments(a.dir)
+        print(json.dumps({"segments": len(segs), "bytes": sum(p.stat().st_size for p in segs),
+                          "records": sum(kinds.values()), "kinds": dict(kinds), "first": first, "last": last},
+                         indent=2))
+    else:
+        # Caller-side cost of record() versus a direct synchronous JSONL write, then the writer's drain rate
+        receipt = {"tool": "get_weather_tool", "status": "ok", "confidence": 0.9,
+                   "output": {"temp_c": 21.5, "rain_mm": 0.0, "summary": "dry and mild"}}
+        with tempfile.TemporaryDirectory() as d:
+            j = Journal(Path(d))
+            j.record("warm", {})
+            n = a.records
+            t0 = time.perf_counter()
+            for i in range(n):
+                j.record("receipt", receipt)
+            rec_us = (time.perf_counter() - t0) / n * 1e6
+            t0 = time.perf_counter()
+            while j._q:
+                j.flush()
+            drain_s = time.perf_counter() - t0
+            with open(Path(d) / "direct.jsonl", "a") as f:
+                t0 = time.perf_counter()
+                for i in range(n):
+                    f.write(json.dumps({"ts": time.time(), "kind": "receipt", **receipt}) + "\n")
+                    f.flush()
+                direct_us = (time.perf_counter() - t0) / n * 1e6
+            st = j.status()
+            print(json.dumps({
+                "records": n, "record_us": round(rec_us, 3), "direct_write_us": round(direct_us, 2),
+                "writer_records_per_s": int(n / drain_s) if drain_s else None,
+                "compression": round(st["bytes_raw"] / max(1, st["bytes_gz"]), 1),
+                "dropped": st["dropped"],
+            }, indent=2))
@@ -0,0 +1,166 @@
+from __future__ import annotations
+import hashlib, json, os, threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+# Accept both spellings for the exit tool, and all real tools registered.
+ALLOWED_TOOLS = frozenset({
+    "crop_id_tool",
+    "diagnose_leaf_tool",
+    "get_weather_tool",
+    "get_soil_tool",
+    "quality_gate_tool",
+    "recommend_fertilizer_tool",
+    "market_insight_tool",
+    "exit_loop_tool",
+    "exit_loop_tool_fn",
+})
+EXIT_TOOLS = frozenset({"exit_loop_tool", "exit_loop_tool_fn"})
+
+PLAN_CACHE_SIZE = int(os.getenv("AGENT_PLAN_CACHE_SIZE", "256"))
+
+
+@dataclass(frozen=True, slots=True)
+class PlanStep:
+    id: str
+    tool: str
+    args: Dict[str, Any] = field(default_factory=dict)
+    optional: bool = False
+
+    @classmethod
+    def from_dict(cls, obj: Any, idx: int = 0) -> "PlanStep":
+        obj = obj if isinstance(obj, dict) else {}
+        args = obj.get("args")
+        return cls(
+            id=str(obj.get("id") or f"s{idx + 1}"),
+            tool=str(obj.get("tool") or ""),
+            args=args if isinstance(args, dict) else {},
+            optional=bool(obj.get("optional", False)),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "tool": self.tool, "args": self.args, "optional": self.optional}
+
+
+@dataclass(frozen=True, slots=True)
+class Plan:
+    steps: Tuple[PlanStep, ...] = ()
+    notes: str = ""
+
+    @classmethod
+    def from_dict(cls, obj: Any) -> "Plan":
+        obj = obj if isinstance(obj, dict) else {}
+        steps = obj.get("steps") if isinstance(obj.get("steps"), list) else []
+        return cls(
+            steps=tuple(PlanStep.from_dict(s, i) for i, s in enumerate(steps)),
+            notes=str(obj.get("notes") or ""),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"steps": [s.to_dict() for s in self.steps], "notes": self.notes}
+
+    def encode(self) -> str:
+        """Canonical compact JSON: what goes into state['current_plan']."""
+        return json.dumps(self.to_dict(), ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+    def is_invalid(self) -> bool:
+        """Empty, all-unknown tools, or exit-only."""
+        if not self.steps:
+            return True
+        tools = [s.tool for s in self.steps]
+        all_unknown = all(t not in ALLOWED_TOOLS for t in tools)
+        exit_only = all(t in EXIT_TOOLS for t in tools)
+        return all_unknown or exit_only
+
+
+def ensure_quality_gate(plan: Plan) -> Plan:
+    """Guarantee ≥1 non-exit, non-optional step; inject quality_gate_tool if needed."""
+    steps = list(plan.steps)
+    if any(s.tool not in EXIT_TOOLS and not s.optional for s in steps):
+        return plan
+
+    qg_step = PlanStep(id="qg", tool="quality_gate_tool")
+    exit_idx = next((i for i, s in enumerate(steps) if s.tool in EXIT_TOOLS), None)
+    if exit_idx is None:
+        steps.append(qg_step)
+        steps.append(PlanStep(id="sx", tool="exit_loop_tool_fn"))
+    else:
+        steps.insert(exit_idx, qg_step)
+    return Plan(steps=tuple(steps), notes=plan.notes)
+
+
+class CompiledPlan:
+    """A validated, gate-ensured plan with its canonical encoding and resolved tools."""
+    __slots__ = ("plan", "encoded", "digest", "valid", "_calls")
+
+    def __init__(self, plan: Plan, valid: bool):
+        self.plan = plan
+        self.encoded = plan.encode()
+        self.digest = _digest(self.encoded)
+        self.valid = valid
+        self._calls: Optional[Tuple[Tuple[PlanStep, Any], ...]] = None
+
+    def calls(self, resolve: Callable[[str], Any]) -> Tuple[Tuple[PlanStep, Any], ...]:
+        """(step, tool-or-None) pairs; tool lookup runs once per compiled plan."""
+        if self._calls is None:
+            self._calls = tuple((s, resolve(s.tool)) for s in self.plan.steps)
+        return self._calls
+
+
+_CACHE: "OrderedDict[str, CompiledPlan]" = OrderedDict()
+_LOCK = threading.Lock()
+_STATS = {"hits": 0, "misses": 0}
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, compiled: CompiledPlan) -> None:
+    with _LOCK:
+        _CACHE[key] = compiled
+        _CACHE[compiled.digest] = compiled
+        while len(_CACHE) > PLAN_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+
+def compile_plan(source: Union[str, Dict[str, Any], Plan, None]) -> CompiledPlan:
+    """
+    Validate + ensure the quality gate once per distinct plan content.
+    Accepts the state string (compact or legacy pretty JSON), a parsed dict or a Plan;
+    malformed input compiles to an empty, invalid plan.
+    """
+    if isinstance(source, Plan):
+        plan: Optional[Plan] = source
+        key = _digest(source.encode())
+    elif isinstance(source, dict):
+        plan = Plan.from_dict(source)
+        key = _digest(plan.encode())
+    else:
+        plan = None
+        key = _digest((source or "").strip())
+
+    with _LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None:
+            _CACHE.move_to_end(key)
+            _STATS["hits"] += 1
+            return hit
+        _STATS["misses"] += 1
+
+    if plan is None:
+        try:
+            plan = Plan.from_dict(json.loads((source or "{}").strip()))
+        except Exception:
+            plan = Plan()
+
+    valid = not plan.is_invalid()
+    compiled = CompiledPlan(ensure_quality_gate(plan) if plan.steps else plan, valid)
+    _remember(key, compiled)
+    return compiled
+
+
+def plan_cache_stats() -> Dict[str, int]:
+    with _LOCK:
+        return {**_STATS, "size": len(_CACHE)}
@@ -0,0 +1,208 @@
+from __future__ import annotations
+import json, os, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .plan import Plan, PlanStep
+
+# Portfolio mode: many fields in one run. Each field gets a small deterministic
+# plan; steps run in waves (a step is ready once the results it references
+# exist), identical calls across fields are executed once in parallel and the
+# result is fanned back out to every field that asked for it.
+PORTFOLIO_WORKERS = int(os.getenv("AGENT_PORTFOLIO_WORKERS", "16"))
+
+# Arg values of the form "$<tool>.<key>" reference an earlier result of the same field.
+_REF = "$"
+
+
+def field_plan(field: Dict[str, Any]) -> Plan:
+    """Steps for one field record: {id, crop|question, location|lat+lon, image_uri|image_uris, target_yield}."""
+    loc = field.get("location")
+    if loc is None and field.get("lat") is not None and field.get("lon") is not None:
+        loc = f"{field['lat']},{field['lon']}"
+    crop = field.get("crop") or "$crop_id_tool.crop"
+    steps: List[PlanStep] = []
+    if not field.get("crop"):
+        steps.append(PlanStep("c1", "crop_id_tool", {"hint_text": field.get("question") or ""}))
+    images = [u for u in (field.get("image_uris") or [field.get("image_uri")]) if u]
+    if images:
+        args = {"image_ref": images[0], "image_refs": images} if len(images) > 1 else {"image_ref": images[0]}
+        steps.append(PlanStep("d1", "diagnose_leaf_tool", args))
+    if loc:
+        steps.append(PlanStep("w1", "get_weather_tool", {"location": loc}, optional=True))
+        steps.append(PlanStep("s1", "get_soil_tool", {"location": loc}, optional=True))
+    steps.append(PlanStep("m1", "market_insight_tool", {"crop": crop, "region": loc}, optional=True))
+    steps.append(PlanStep("q1", "quality_gate_tool", {
+        "crop_type": crop, "soil_ph": "$get_soil_tool.ph",
+        "temp_c": "$get_weather_tool.temp_c", "rain_prob": "$get_weather_tool.rain_prob",
+    }))
+    steps.append(PlanStep("f1", "recommend_fertilizer_tool", {
+        "target_crop": crop, "target_yield_t_ha": field.get("target_yield"), "ph": "$get_soil_tool.ph",
+        "nitrogen": "$get_soil_tool.nitrogen", "organic_matter_pct": "$get_soil_tool.organic_matter_pct",
+    }, optional=True))
+    return Plan(steps=tuple(steps), notes=f"portfolio field {field.get('id', '')}")
+
+
+def _refs(args: Dict[str, Any]) -> List[str]:
+    return [v[1:].split(".", 1)[0] for v in args.values() if isinstance(v, str) and v.startswith(_REF)]
+
+
+def _resolve(args: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
+    """Substitute references; placeholder results (source == 'default') and missing keys drop the arg."""
+    out: Dict[str, Any] = {}
+    for k, v in args.items():
+        if isinstance(v, str) and v.startswith(_REF):
+            tool, _, key = v[1:].partition(".")
+            res = results.get(tool)
+            v = res.get(key) if isinstance(res, dict) and res.get("source") != "default" else None
+            if v in ("unknown",):
+                v = None
+        if v is not None:
+            out[k] = v
+    return out
+
+
+def run_portfolio(
+    fields: Sequence[Dict[str, Any]],
+    workers: Optional[int] = None,
+    synthesize: Optional[Callable[[Dict[str, Any], Dict[str, Any]], str]] = None,
+) -> Dict[str, Any]:
+    """
+    Execute all field plans with cross-field dedup. `synthesize(field, results)` is
+    called once per field when given (e.g. an LLM summary); otherwise each field
+    gets a deterministic summary and the run returns an aggregate report.
+    """
+    from .tools.prefetch import call_key
+    from .tools.run_plan import _TOOL_MAP, _call, _location_args
+
+    start = time.perf_counter()
+    fields = [dict(f, id=str(f.get("id") or i + 1)) for i, f in enumerate(fields)]
+    pending: Dict[str, List[PlanStep]] = {f["id"]: list(field_plan(f).steps) for f in fields}
+    results: Dict[str, Dict[str, Any]] = {f["id"]: {} for f in fields}
+    receipts: Dict[str, List[Dict[str, Any]]] = {f["id"]: [] for f in fields}
+    requested = executed = errors = waves = 0
+    tool_ms: Dict[str, float] = {}
+
+    with ThreadPoolExecutor(max_workers=workers or PORTFOLIO_WORKERS, thread_name_prefix="portfolio") as pool:
+        while any(pending.values()):
+            waves += 1
+            # Ready steps: every referenced tool has finished (or was never planned) for that field
+            unique: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+            wanted: List[Tuple[str, PlanStep, str, Dict[str, Any]]] = []
+            for fid, steps in pending.items():
+                planned = {s.tool for s in steps}
+                ready = [s for s in steps if not any(t in planned and t != s.tool for t in _refs(s.args))]
+                for s in ready:
+                    steps.remove(s)
+                    args = _location_args(s.tool, _resolve(s.args, results[fid]), {})
+                    key = call_key(s.tool, args)
+                    unique.setdefault(key, (s.tool, args))
+                    wanted.append((fid, s, key, args))
+            if not wanted:
+                break
+            requested += len(wanted)
+
+            def _exec(item: Tuple[str, Dict[str, Any]]) -> Tuple[Any, Optional[str], float]:
+                tool, args = item
+                t0 = time.perf_counter()
+                try:
+                    return _call(_TOOL_MAP[tool], args), None, (time.perf_counter() - t0) * 1000
+                except Exception as e:
+                    return None, f"{type(e).__name__}: {e}", (time.perf_counter() - t0) * 1000
+
+            done = dict(zip(unique, pool.map(_exec, unique.values())))
+            executed += len(done)
+            for key, (_, err, ms) in done.items():
+                tool = unique[key][0]
+                tool_ms[tool] = tool_ms.get(tool, 0.0) + ms
+                errors += err is not None
+
+            # Fan out: each field receives the shared result under its own receipt
+            for fid, step, key, args in wanted:
+                result, err, ms = done[key]
+                if err is None:
+                    results[fid][step.tool] = result
+                receipts[fid].append({
+                    "tool": step.tool, "status": "executed" if err is None else "error",
+                    "output": {"args": args, "result": result, "error": err, "cost_ms": round(ms, 2),
+                               "shared": True},
+                })
+
+    per_field: List[Dict[str, Any]] = []
+    for f in fields:
+        r = results[f["id"]]
+        summary = synthesize(f, r) if synthesize else _field_summary(f, r)
+        per_field.append({"id": f["id"], "summary": summary, "results": r, "receipts": receipts[f["id"]]})
+
+    wall_ms = (time.perf_counter() - start) * 1000
+    return {
+        "fields": per_field,
+        "report": None if synthesize else _aggregate_report(per_field),
+        "metrics": {
+            "fields": len(fields),
+            "waves": waves,
+            "tool_calls_requested": requested,
+            "tool_calls_executed": executed,
+            "dedup_ratio": round(1 - executed / requested, 4) if requested else 0.0,
+            "errors": errors,
+            "tool_ms": {k: round(v, 1) for k, v in tool_ms.items()},
+            "wall_ms": round(wall_ms, 1),
+        },
+    }
+
+
+def _field_summary(field: Dict[str, Any], r: Dict[str, Any]) -> str:
+    crop = (r.get("crop_id_tool") or {}).get("crop") or field.get("crop") or "unknown crop"
+    parts = [f"{field['id']}: {crop}"]
+    w = r.get("get_weather_tool") or {}
+    if w.get("source") not in (None, "default"):
+        parts.append(f"{w.get('summary')} ({w.get('temp_c')}°C, rain {w.get('rain_prob')})")
+    fert = r.get("recommend_fertilizer_tool") or {}
+    if fert:
+        kg = fert.get("npk_kg_ha") or {}
+        parts.append(f"NPK {kg.get('N')}/{kg.get('P2O5')}/{kg.get('K2O')} kg/ha ({fert.get('npk_ratio')})")
+    q = r.get("quality_gate_tool") or {}
+    if q and not q.get("valid", True):
+        parts.append("check: " + "; ".join(q.get("reasons", [])))
+    m = r.get("market_insight_tool") or {}
+    if m.get("source") not in (None, "default"):
+        parts.append(f"price {m.get('avg_price')} ({m.get('trend')})")
+    return " | ".join(parts)
+
+
+def _aggregate_report(per_field: List[Dict[str, Any]]) -> Dict[str, Any]:
+    by_crop: Dict[str, int] = {}
+    invalid: List[str] = []
+    for f in per_field:
+        r = f["results"]
+        crop = str((r.get("recommend_fertilizer_tool") or {}).get("crop") or "unknown")
+        by_crop[crop] = by_crop.get(crop, 0) + 1
+        if not (r.get("quality_gate_tool") or {}).get("valid", True):
+            invalid.append(f["id"])
+    return {"fields_by_crop": by_crop, "fields_failing_checks": invalid, "lines": [f["summary"] for f in per_field]}
+
+
+if __name__ == "__main__":
+    # python -m src.agent.portfolio fields.jsonl|fields.csv [--workers N] ; synthetic co-op without a file
+    import argparse, csv, random
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path", nargs="?")
+    ap.add_argument("--workers", type=int, default=PORTFOLIO_WORKERS)
+    ap.add_argument("--fields", type=int, default=300)
+    ap.add_argument("--full", action="store_true", help="print per-field results too")
+    a = ap.parse_args()
+
+    if a.path:
+        with open(a.path, encoding="utf-8") as fh:
+            rows = list(csv.DictReader(fh)) if a.path.endswith(".csv") else [json.loads(l) for l in fh if l.strip()]
+    else:
+        rnd = random.Random(0)
+        districts = ["Pune", "Nashik", "Ahmednagar", "Solapur", "Satara"]
+        crops = ["onion", "tomato", "sugarcane", "soybean", "grape", "wheat"]
+        rows = [{"id": f"plot-{i + 1}", "crop": rnd.choice(crops), "location": rnd.choice(districts),
+                 "target_yield": rnd.choice([None, 20, 30])} for i in range(a.fields)]
+    out = run_portfolio(rows, workers=a.workers)
+    if not a.full:
+        out = {"metrics": out["metrics"], "report": {**out["report"], "lines": out["report"]["lines"][:5]}}
+    print(json.dumps(out, indent=2, default=str, ensure_ascii=False))
@@ -0,0 +1,165 @@
+from __future__ import annotations
+import io, os, random, re, sys, threading, time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Opt-in profiling of one UI request or one run_plan_tool execution.
+#
+# Turned on per request (X-Profile header in the UI, passed on to the agent as
+# state['profile']) or for a random PROFILE_SAMPLE_RATE share of turns. Two modes:
+#   sample   — a thread snapshots the profiled thread's stack every
+#              PROFILE_INTERVAL_MS; written as collapsed stacks ("a;b;c 12" lines,
+#              for flamegraph.pl / speedscope). Low overhead, fine for real traffic.
+#   cprofile — deterministic cProfile of the same span; written as .pstats plus a
+#              .txt of the top functions by cumulative time.
+# Files live in PROFILE_DIR, pruned to the newest PROFILE_MAX_FILES / PROFILE_MAX_BYTES.
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "/tmp/farmagent/profiles"))
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+DEFAULT_MODE = os.getenv("PROFILE_MODE", "sample")
+INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", str(50 * 1024 * 1024)))
+MODES = ("sample", "cprofile")
+
+_NAME = re.compile(r"^(\d+)-([\w.]+)-(sample|cprofile)-(\d+)ms-(\d+)\.(collapsed|pstats|txt)$")
+_PRUNE_LOCK = threading.Lock()
+
+
+def requested(flag: Any = None) -> Optional[str]:
+    """Profiling mode for this turn: from an explicit flag (header / state value), else by sampling rate."""
+    if flag:
+        v = str(flag).strip().lower()
+        if v in MODES:
+            return v
+        if v in ("1", "true", "yes", "on"):
+            return DEFAULT_MODE if DEFAULT_MODE in MODES else "sample"
+        if v in ("0", "false", "no", "off"):
+            return None
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return DEFAULT_MODE if DEFAULT_MODE in MODES else "sample"
+    return None
+
+
+class _Sampler:
+    """Stack sampler for one thread (sys._current_frames, no tracing hooks)."""
+
+    def __init__(self, thread_id: int, interval_s: float):
+        self.thread_id, self.interval_s = thread_id, interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            names: List[str] = []
+            while frame is not None:
+                co = frame.f_code
+                names.append(f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+@contextmanager
+def profiled(label: str, mode: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Profile the body when mode is set; the yielded dict gets 'files' (names in PROFILE_DIR) afterwards."""
+    info: Dict[str, Any] = {}
+    if mode not in MODES:
+        yield info
+        return
+    sampler = prof = None
+    if mode == "sample":
+        sampler = _Sampler(threading.get_ident(), max(0.001, INTERVAL_MS / 1000))
+        sampler.start()
+    else:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+    t0 = time.perf_counter()
+    try:
+        yield info
+    finally:
+        ms = int((time.perf_counter() - t0) * 1000)
+        if sampler is not None:
+            sampler.stop()
+        if prof is not None:
+            prof.disable()
+        try:
+            info.update(mode=mode, ms=ms, files=_save(label, mode, ms, sampler, prof))
+        except Exception as e:   # profiling must never fail the turn
+            info.update(mode=mode, ms=ms, error=str(e))
+
+
+def _save(label: str, mode: str, ms: int, sampler: Optional[_Sampler], prof: Any) -> List[str]:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    safe = re.sub(r"[^\w.]", "_", label)[:40]
+    stem = f"{int(time.time() * 1000)}-{safe}-{mode}-{ms}ms-{os.getpid()}"
+    files: List[str] = []
+    if sampler is not None:
+        (PROFILE_DIR / f"{stem}.collapsed").write_text(sampler.collapsed())
+        files.append(f"{stem}.collapsed")
+    if prof is not None:
+        import pstats
+        prof.dump_stats(str(PROFILE_DIR / f"{stem}.pstats"))
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(60)
+        (PROFILE_DIR / f"{stem}.txt").write_text(out.getvalue())
+        files += [f"{stem}.pstats", f"{stem}.txt"]
+    _prune()
+    return files
+
+
+def _prune() -> None:
+    with _PRUNE_LOCK:
+        entries = sorted((p for p in PROFILE_DIR.iterdir() if _NAME.match(p.name)), key=lambda p: p.name, reverse=True)
+        total = 0
+        for i, p in enumerate(entries):
+            try:
+                total += p.stat().st_size
+                if i >= MAX_FILES or total > MAX_BYTES:
+                    p.unlink()
+            except OSError:
+                pass
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """Newest saved profiles first: {name, label, mode, ms, pid, created, bytes}."""
+    if not PROFILE_DIR.exists():
+        return []
+    out: List[Dict[str, Any]] = []
+    for p in sorted(PROFILE_DIR.iterdir(), key=lambda p: p.name, reverse=True):
+        m = _NAME.match(p.name)
+        if not m:
+            continue
+        try:
+            size = p.stat().st_size
+        except OSError:
+            continue
+        out.append({"name": p.name, "label": m.group(2), "mode": m.group(3), "ms": int(m.group(4)),
+                    "pid": int(m.group(5)), "created": int(m.group(1)) / 1000, "bytes": size})
+        if len(out) >= limit:
+            break
+    return out
+
+
+def profile_path(name: str) -> Optional[Path]:
+    """Path of a saved profile by file name (None for anything that is not one)."""
+    if not _NAME.match(name):
+        return None
+    p = PROFILE_DIR / name
+    return p if p.is_file() else None
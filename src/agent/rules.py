@@ -0,0 +1,297 @@
+from __future__ import annotations
+import json, os, threading, time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Declarative validity rules (quality gate), compiled once into NumPy predicates.
+#
+# Config (JSON): "fields" name -> number | text | crop (crop names are canonicalized),
+# "tables" of per-key [lo, hi] ranges, and an ordered "rules" list:
+#   {"id", "field", "op", "value" | "key"+"table", "severity": fail|warn|info,
+#    "when": {"field", "op", "value"}, "unless": ["rule" | "rule:fail", ...],
+#    "pass": "message", "fail": "message"}
+# ops: between, min, max, in, present, lookup_between. A rule applies to a record
+# only where its field (and its lookup key) is present. Messages are str.format'ed
+# with the record plus {lo}/{hi}. Number fields accept numeric strings ("6.5"); any
+# other non-empty value makes the record invalid rather than counting as missing.
+RULES_PATH = os.getenv("QUALITY_RULES_PATH", str(Path(__file__).parent / "data" / "quality_rules.json"))
+
+Columns = Dict[str, np.ndarray]
+Predicate = Callable[[Columns], Tuple[np.ndarray, np.ndarray]]  # -> (applicable, passed)
+
+
+def _crop_key(value: Any) -> str:
+    from .data.crops import resolve_crop
+    hit = resolve_crop(str(value))
+    return str(hit["crop"]) if hit else str(value).strip().casefold()
+
+
+class Rule:
+    __slots__ = ("id", "field", "severity", "pass_msg", "fail_msg", "unless", "predicate", "bounds")
+
+    def __init__(self, spec: Dict[str, Any], predicate: Predicate, bounds: Optional[Callable[[Columns], Tuple[np.ndarray, np.ndarray]]]):
+        self.id = spec["id"]
+        self.field = spec["field"]
+        self.severity = spec.get("severity", "fail")
+        self.pass_msg = spec.get("pass")
+        self.fail_msg = spec.get("fail")
+        self.unless = [u.partition(":")[::2] for u in spec.get("unless", [])]  # (rule id, "" | "fail")
+        self.predicate = predicate
+        self.bounds = bounds  # per-record (lo, hi) for messages of range rules
+
+
+class RuleSet:
+    def __init__(self, spec: Dict[str, Any]):
+        self.fields: Dict[str, str] = dict(spec.get("fields", {}))
+        self.tables: Dict[str, Tuple[Dict[str, int], np.ndarray, np.ndarray]] = {}
+        for name, table in spec.get("tables", {}).items():
+            keys = {k: i for i, k in enumerate(table)}
+            lo = np.array([v[0] for v in table.values()] + [np.nan], dtype=np.float64)
+            hi = np.array([v[1] for v in table.values()] + [np.nan], dtype=np.float64)
+            self.tables[name] = (keys, lo, hi)
+        self.rules: List[Rule] = [self._compile(r) for r in spec.get("rules", [])]
+        self._crop_memo: Dict[str, str] = {}
+
+    # --- compilation ----------------------------------------------------------
+    def _present(self, cols: Columns, field: str) -> np.ndarray:
+        col = cols[field]
+        return ~np.isnan(col) if col.dtype.kind == "f" else col != ""
+
+    def _test(self, op: str, value: Any) -> Callable[[np.ndarray], np.ndarray]:
+        if op == "between":
+            lo, hi = float(value[0]), float(value[1])
+            return lambda x: (x >= lo) & (x <= hi)
+        if op == "min":
+            v = float(value)
+            return lambda x: x >= v
+        if op == "max":
+            v = float(value)
+            return lambda x: x <= v
+        if op == "in":
+            allowed = np.array(sorted(str(s).casefold() for s in value), dtype=object)
+            return lambda x: np.isin(x, allowed)
+        if op == "present":
+            return lambda x: np.ones(len(x), dtype=bool)
+        raise ValueError(f"unknown op '{op}'")
+
+    def _compile(self, spec: Dict[str, Any]) -> Rule:
+        field, op = spec["field"], spec["op"]
+        bounds = None
+        if op == "lookup_between":
+            keys, lo_tab, hi_tab = self.tables[spec["table"]]
+            key_field = spec["key"]
+            miss = len(keys)
+
+            def bounds(cols: Columns) -> Tuple[np.ndarray, np.ndarray]:
+                idx = np.fromiter((keys.get(k, miss) for k in cols[key_field]), dtype=np.int64, count=len(cols[key_field]))
+                return lo_tab[idx], hi_tab[idx]
+
+            def base(cols: Columns) -> Tuple[np.ndarray, np.ndarray]:
+                lo, hi = bounds(cols)
+                x = cols[field]
+                return self._present(cols, field) & ~np.isnan(lo), (x >= lo) & (x <= hi)
+        else:
+            test = self._test(op, spec.get("value"))
+            if op == "between":
+                lo_v, hi_v = float(spec["value"][0]), float(spec["value"][1])
+                bounds = lambda cols: (np.full(len(cols[field]), lo_v), np.full(len(cols[field]), hi_v))
+
+            def base(cols: Columns) -> Tuple[np.ndarray, np.ndarray]:
+                present = self._present(cols, field)
+                return present, present & test(cols[field])
+
+        when = spec.get("when")
+        if when:
+            w_field, w_test = when["field"], self._test(when["op"], when.get("value"))
+
+            def predicate(cols: Columns) -> Tuple[np.ndarray, np.ndarray]:
+                applicable, passed = base(cols)
+                return applicable & self._present(cols, w_field) & w_test(cols[w_field]), passed
+        else:
+            predicate = base
+        return Rule(spec, predicate, bounds)
+
+    # --- evaluation -----------------------------------------------------------
+    def columns(self, records: Sequence[Dict[str, Any]]) -> Columns:
+        return self._parse(records)[0]
+
+    def _parse(self, records: Sequence[Dict[str, Any]]) -> Tuple[Columns, Dict[str, np.ndarray]]:
+        """Columns plus, per number field, a mask of records whose value is set but not a number."""
+        cols: Columns = {}
+        bad: Dict[str, np.ndarray] = {}
+        for field, kind in self.fields.items():
+            vals = [r.get(field) for r in records]
+            if kind == "number":
+                col = cols[field] = np.array([v if type(v) is float else _number(v) for v in vals], dtype=np.float64)
+                nan = np.flatnonzero(np.isnan(col))
+                wrong = [i for i in nan if not _unset(vals[i])]
+                if wrong:
+                    bad[field] = np.zeros(len(vals), dtype=bool)
+                    bad[field][wrong] = True
+            elif kind == "crop":
+                cols[field] = np.array([self._crop(v) for v in vals], dtype=object)
+            else:
+                cols[field] = np.array([str(v).strip().casefold() if v else "" for v in vals], dtype=object)
+        return cols, bad
+
+    def _crop(self, value: Any) -> str:
+        if not value:
+            return ""
+        key = str(value)
+        hit = self._crop_memo.get(key)
+        if hit is None:
+            hit = self._crop_memo[key] = _crop_key(key)
+        return hit
+
+    def masks(self, cols: Columns) -> Tuple[np.ndarray, np.ndarray]:
+        """(applicable, passed), each (rules, records) bool; 'unless' resolved in rule order."""
+        n = len(next(iter(cols.values()))) if cols else 0
+        applicable = np.zeros((len(self.rules), n), dtype=bool)
+        passed = np.zeros((len(self.rules), n), dtype=bool)
+        pos = {r.id: i for i, r in enumerate(self.rules)}
+        for i, rule in enumerate(self.rules):
+            app, ok = rule.predicate(cols)
+            for other, mode in rule.unless:
+                j = pos[other]
+                app = app & ~(applicable[j] & ~passed[j] if mode == "fail" else applicable[j])
+            applicable[i], passed[i] = app, ok & app
+        return applicable, passed
+
+    def evaluate(self, records: Sequence[Dict[str, Any]], reasons: bool = True) -> Dict[str, Any]:
+        """Columnar result for a batch: valid[], reasons[][], failed-rule counts, duration_ms."""
+        start = time.perf_counter()
+        cols, bad = self._parse(records)
+        applicable, passed = self.masks(cols)
+        fatal = np.array([r.severity == "fail" for r in self.rules], dtype=bool)
+        failed = applicable & ~passed
+        valid = ~(failed & fatal[:, None]).any(axis=0)
+        for mask in bad.values():
+            valid &= ~mask
+        out: Dict[str, Any] = {
+            "valid": valid.tolist(),
+            "failed_rules": {r.id: int(c) for r, c in zip(self.rules, failed.sum(axis=1)) if c},
+        }
+        if bad:
+            out["invalid_fields"] = {f: int(m.sum()) for f, m in bad.items()}
+        if reasons:
+            out["reasons"] = self._reasons(records, applicable, passed, cols, bad)
+        out["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return out
+
+    def _reasons(self, records: Sequence[Dict[str, Any]], applicable: np.ndarray, passed: np.ndarray,
+                 cols: Columns, bad: Optional[Dict[str, np.ndarray]] = None) -> List[List[str]]:
+        bounds = [r.bounds(cols) if r.bounds else None for r in self.rules]
+        out: List[List[str]] = [[] for _ in records]
+        for field, mask in (bad or {}).items():
+            for i in np.nonzero(mask)[0]:
+                out[i].append(f"{field} {records[i][field]!r} is not a number.")
+        for i, j in zip(*np.nonzero(applicable.T)):  # record-major: reasons keep rule order
+            rule = self.rules[j]
+            msg = rule.pass_msg if passed[j, i] else rule.fail_msg
+            if not msg:
+                continue
+            extra = {"lo": _fmt(bounds[j][0][i]), "hi": _fmt(bounds[j][1][i])} if bounds[j] else {}
+            rec = {k: _fmt(v) if isinstance(v, float) else v for k, v in records[i].items()}
+            for k, v in records[i].items():
+                if isinstance(v, str) and self.fields.get(k) == "number" and not np.isnan(cols[k][i]):
+                    rec[k] = _fmt(cols[k][i])   # numeric string as parsed: "6.50" reads like 6.5
+            try:
+                out[i].append(msg.format(**rec, **extra))
+            except (KeyError, IndexError, ValueError):
+                out[i].append(msg)
+        return [r or ["No checks applied."] for r in out]
+
+    def check(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """One record -> {"valid", "reasons", "duration_ms"} (quality_gate_tool's shape)."""
+        start = time.perf_counter()
+        res = self.evaluate([record])
+        return {
+            "valid": res["valid"][0],
+            "reasons": res["reasons"][0],
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+
+def _number(v: Any) -> float:
+    if isinstance(v, bool):
+        return np.nan
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        try:
+            x = float(v)
+            return x if np.isfinite(x) else np.nan
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+def _unset(v: Any) -> bool:
+    return v is None or isinstance(v, float) or (isinstance(v, str) and not v.strip())   # float here: NaN
+
+
+def _fmt(v: float) -> str:
+    return f"{round(v, 2):g}"
+
+
+_RULES: Optional[RuleSet] = None
+_RULES_MTIME = 0.0
+_LOCK = threading.Lock()
+
+
+def load_rules(path: str = RULES_PATH) -> RuleSet:
+    return RuleSet(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def rule_set() -> RuleSet:
+    """Compiled rules for RULES_PATH; recompiled when the file changes."""
+    global _RULES, _RULES_MTIME
+    try:
+        mtime = os.stat(RULES_PATH).st_mtime
+    except OSError:
+        mtime = _RULES_MTIME
+    if _RULES is None or mtime != _RULES_MTIME:
+        with _LOCK:
+            if _RULES is None or mtime != _RULES_MTIME:
+                _RULES, _RULES_MTIME = load_rules(), mtime
+    return _RULES
+
+
+def check_batch(records: Iterable[Dict[str, Any]], reasons: bool = True) -> Dict[str, Any]:
+    return rule_set().evaluate(list(records), reasons=reasons)
+
+
+if __name__ == "__main__":
+    # python -m src.agent.rules [records.csv|records.jsonl] [--no-reasons] ; synthetic benchmark without a file
+    import argparse, csv
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path", nargs="?")
+    ap.add_argument("--records", type=int, default=100_000)
+    ap.add_argument("--no-reasons", action="store_true")
+    a = ap.parse_args()
+
+    rs = rule_set()
+    if a.path:
+        with open(a.path, encoding="utf-8") as fh:
+            if a.path.endswith(".csv"):
+                recs = [{k: v or None for k, v in row.items()} for row in csv.DictReader(fh)]   # numbers parsed by the rules
+            else:
+                recs = [json.loads(line) for line in fh if line.strip()]
+    else:
+        rng = np.random.default_rng(0)
+        crops = ["rice", "wheat", "tomato", "tea", "cotton", None, "bajra"]
+        recs = [{"crop_type": crops[i % len(crops)], "soil_ph": float(rng.uniform(4, 9)),
+                 "temp_c": float(rng.uniform(-5, 45)), "rain_prob": float(rng.uniform(0, 1)),
+                 "n_kg_ha": float(rng.uniform(0, 700))} for i in range(a.records)]
+    t0 = time.perf_counter()
+    res = rs.evaluate(recs, reasons=not a.no_reasons)
+    dt = time.perf_counter() - t0
+    print(json.dumps({
+        "records": len(recs), "rules": len(rs.rules), "valid": int(sum(res["valid"])),
+        "failed_rules": res["failed_rules"], "ms": round(dt * 1000, 1),
+        "us_per_record": round(dt / max(1, len(recs)) * 1e6, 2),
+        "example": {"record": recs[0], "reasons": res.get("reasons", [[]])[0]},
+    }, indent=2, default=str))
@@ -0,0 +1,362 @@
+from __future__ import annotations
+import json, os, sqlite3, threading, time, uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events.event import Event
+from google.adk.sessions import _session_util
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.session import Session
+from google.adk.sessions.state import State
+
+# Durable ADK session service on one sqlite file (WAL).
+#
+# Nothing is rewritten as a growing blob: every appended event is one row, scalar
+# state keys are upserted one row per key, and the append-only lists (receipts,
+# governor_log) store only the items a turn added. Once a turn falls out of the
+# last SESSION_RECENT_TURNS, its list items are folded into one per-turn summary
+# row and deleted, together with that turn's events, so storage and reads stay
+# proportional to the recent turns.
+#
+# The served state carries the recent items under their usual keys, the newest
+# summaries under "turn_summaries", and "compaction" = {key: absolute index of
+# the first item still listed}, which is how a later append tells new items from
+# ones already stored. Stored events keep list deltas as {"$items": [from, to]}.
+#
+# Enabled through ADK's service registry (see adk_server.py):
+#   python adk_server.py api_server . --session_service_uri sqlitewal:///tmp/farmagent/sessions.sqlite
+SESSION_DB = os.getenv("SESSION_DB", "/tmp/farmagent/sessions.sqlite")
+RECENT_TURNS = int(os.getenv("SESSION_RECENT_TURNS", "10"))       # turns kept verbatim (events + list items)
+SUMMARY_KEEP = int(os.getenv("SESSION_SUMMARY_KEEP", "50"))       # per-turn summaries exposed in state
+LOG_KEYS = tuple(k for k in os.getenv("SESSION_LOG_KEYS", "receipts,governor_log").split(",") if k)
+SCHEME = "sqlitewal"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (app TEXT, user TEXT, id TEXT, created REAL, updated REAL,
+    turn INTEGER DEFAULT 0, invocation TEXT, PRIMARY KEY (app, user, id));
+CREATE TABLE IF NOT EXISTS app_state (app TEXT, key TEXT, value TEXT, PRIMARY KEY (app, key));
+CREATE TABLE IF NOT EXISTS user_state (app TEXT, user TEXT, key TEXT, value TEXT, PRIMARY KEY (app, user, key));
+CREATE TABLE IF NOT EXISTS session_state (app TEXT, user TEXT, sid TEXT, key TEXT, value TEXT,
+    PRIMARY KEY (app, user, sid, key));
+CREATE TABLE IF NOT EXISTS log_items (app TEXT, user TEXT, sid TEXT, key TEXT, seq INTEGER, turn INTEGER,
+    value TEXT, PRIMARY KEY (app, user, sid, key, seq));
+CREATE TABLE IF NOT EXISTS turn_summaries (app TEXT, user TEXT, sid TEXT, turn INTEGER, summary TEXT,
+    PRIMARY KEY (app, user, sid, turn));
+CREATE TABLE IF NOT EXISTS events (app TEXT, user TEXT, sid TEXT, seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    turn INTEGER, ts REAL, event TEXT);
+CREATE INDEX IF NOT EXISTS events_turn ON events (app, user, sid, turn);
+CREATE INDEX IF NOT EXISTS log_items_turn ON log_items (app, user, sid, turn);
+"""
+
+
+def _summarize(turn: int, items: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Per-turn digest of compacted list items: counts per tool / governor action, errors, lowest confidence."""
+    out: Dict[str, Any] = {"turn": turn, "items": {k: len(v) for k, v in items.items()}}
+    tools: Dict[str, int] = {}
+    confs: List[float] = []
+    errors = 0
+    for r in items.get("receipts", []):
+        if not isinstance(r, dict):
+            continue
+        tools[str(r.get("tool"))] = tools.get(str(r.get("tool")), 0) + 1
+        errors += str(r.get("status", "ok")).lower() not in ("ok", "success", "done")
+        if isinstance(r.get("confidence"), (int, float)):
+            confs.append(float(r["confidence"]))
+    actions: Dict[str, int] = {}
+    for g in items.get("governor_log", []):
+        if isinstance(g, dict):
+            actions[str(g.get("action"))] = actions.get(str(g.get("action")), 0) + 1
+            if isinstance(g.get("confidence_score"), (int, float)):
+                confs.append(float(g["confidence_score"]))
+    if tools:
+        out["tools"], out["errors"] = tools, errors
+    if actions:
+        out["governor"] = actions
+    if confs:
+        out["min_confidence"] = min(confs)
+    return out
+
+
+class SqliteSessionService(BaseSessionService):
+    def __init__(self, path: str = SESSION_DB, recent_turns: int = RECENT_TURNS, summary_keep: int = SUMMARY_KEEP):
+        self.path, self.recent_turns, self.summary_keep = path, max(1, recent_turns), summary_keep
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    # Calls are sub-millisecond local sqlite statements, so they run inline on the loop.
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _sql(self, query: str, args: tuple = ()) -> list:
+        with self._lock:
+            return self._db.execute(query, args).fetchall()
+
+    # --- writes ----------------------------------------------------------------
+    def _write_state(self, db: sqlite3.Connection, key: Tuple[str, str, str], turn: int,
+                     delta: Dict[str, Any], offsets: Dict[str, int]) -> Dict[str, Any]:
+        """Persist a state delta; returns the delta as stored in events (list items replaced by ranges)."""
+        app, user, sid = key
+        split = _session_util.extract_state_delta(delta)
+        db.executemany("INSERT OR REPLACE INTO app_state VALUES (?, ?, ?)",
+                       [(app, k, json.dumps(v, default=str)) for k, v in split["app"].items()])
+        db.executemany("INSERT OR REPLACE INTO user_state VALUES (?, ?, ?, ?)",
+                       [(app, user, k, json.dumps(v, default=str)) for k, v in split["user"].items()])
+        stored = dict(delta)
+        for k, v in split["session"].items():
+            if k in ("compaction", "turn_summaries"):
+                stored.pop(k, None)        # derived on read
+                continue
+            if k in LOG_KEYS and isinstance(v, list):
+                total = self._next_seq(db, key, k)
+                known = total - offsets.get(k, 0)       # items of v that are already stored
+                if known < 0 or len(v) < known:
+                    # The list was replaced or cleared: drop stored items, numbering continues after them
+                    db.execute("DELETE FROM log_items WHERE app = ? AND user = ? AND sid = ? AND key = ?",
+                               (app, user, sid, k))
+                    known = 0
+                new = v[known:]
+                db.executemany("INSERT INTO log_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               [(app, user, sid, k, total + i, turn, json.dumps(x, default=str))
+                                for i, x in enumerate(new)])
+                db.execute("INSERT OR REPLACE INTO session_state VALUES (?, ?, ?, ?, ?)",
+                           (app, user, sid, f"$next:{k}", str(total + len(new))))
+                offsets[k] = total + len(new) - len(v)
+                stored[k] = {"$items": [total, total + len(new)]}
+                continue
+            db.execute("INSERT OR REPLACE INTO session_state VALUES (?, ?, ?, ?, ?)",
+                       (app, user, sid, k, json.dumps(v, default=str)))
+        return stored
+
+    def _next_seq(self, db: sqlite3.Connection, key: Tuple[str, str, str], k: str) -> int:
+        """Absolute index the next item of list k gets (items are numbered across compactions)."""
+        row = db.execute("SELECT value FROM session_state WHERE app = ? AND user = ? AND sid = ? AND key = ?",
+                         (*key, f"$next:{k}")).fetchone()
+        return int(row[0]) if row else 0
+
+    def _compact(self, db: sqlite3.Connection, key: Tuple[str, str, str], turn: int) -> None:
+        """
+        Fold list items of turns older than the recent window into one summary row per
+        turn, and drop those turns' events (their state effects are already in session_state).
+        """
+        cutoff = turn - self.recent_turns
+        db.execute("DELETE FROM events WHERE app = ? AND user = ? AND sid = ? AND turn <= ?", (*key, cutoff))
+        rows = db.execute("SELECT key, turn, value FROM log_items WHERE app = ? AND user = ? AND sid = ? "
+                          "AND turn <= ? ORDER BY seq", (*key, cutoff)).fetchall()
+        if not rows:
+            return
+        by_turn: Dict[int, Dict[str, List[Any]]] = {}
+        for k, t, v in rows:
+            by_turn.setdefault(t, {}).setdefault(k, []).append(json.loads(v))
+        db.executemany("INSERT OR REPLACE INTO turn_summaries VALUES (?, ?, ?, ?, ?)",
+                       [(*key, t, json.dumps(_summarize(t, items), default=str)) for t, items in by_turn.items()])
+        db.execute("DELETE FROM log_items WHERE app = ? AND user = ? AND sid = ? AND turn <= ?", (*key, cutoff))
+
+    # --- reads -----------------------------------------------------------------
+    def _state(self, db: sqlite3.Connection, key: Tuple[str, str, str]) -> Dict[str, Any]:
+        app, user, sid = key
+        state: Dict[str, Any] = {}
+        nxt: Dict[str, int] = {}
+        for k, v in db.execute("SELECT key, value FROM session_state WHERE app = ? AND user = ? AND sid = ?", key):
+            if k.startswith("$next:"):
+                nxt[k[6:]] = int(v)
+            else:
+                state[k] = json.loads(v)
+        offsets: Dict[str, int] = {}
+        for k in LOG_KEYS:
+            rows = db.execute("SELECT seq, value FROM log_items WHERE app = ? AND user = ? AND sid = ? AND key = ? "
+                              "ORDER BY seq", (*key, k)).fetchall()
+            if k in nxt:
+                state[k] = [json.loads(v) for _, v in rows]
+                offsets[k] = rows[0][0] if rows else nxt[k]
+        if offsets:
+            state["compaction"] = offsets
+        summaries = db.execute("SELECT summary FROM turn_summaries WHERE app = ? AND user = ? AND sid = ? "
+                               "ORDER BY turn DESC LIMIT ?", (*key, self.summary_keep)).fetchall()
+        if summaries:
+            state["turn_summaries"] = [json.loads(s) for (s,) in reversed(summaries)]
+        for k, v in db.execute("SELECT key, value FROM app_state WHERE app = ?", (app,)):
+            state[State.APP_PREFIX + k] = json.loads(v)
+        for k, v in db.execute("SELECT key, value FROM user_state WHERE app = ? AND user = ?", (app, user)):
+            state[State.USER_PREFIX + k] = json.loads(v)
+        return state
+
+    def _events(self, db: sqlite3.Connection, key: Tuple[str, str, str], turn: int,
+                config: Optional[GetSessionConfig]) -> List[Event]:
+        if config and config.num_recent_events:
+            rows = db.execute("SELECT event FROM (SELECT seq, event FROM events WHERE app = ? AND user = ? AND sid = ? "
+                              "ORDER BY seq DESC LIMIT ?) ORDER BY seq", (*key, config.num_recent_events)).fetchall()
+        elif config and config.after_timestamp:
+            rows = db.execute("SELECT event FROM events WHERE app = ? AND user = ? AND sid = ? AND ts >= ? "
+                              "ORDER BY seq", (*key, config.after_timestamp)).fetchall()
+        else:
+            rows = db.execute("SELECT event FROM events WHERE app = ? AND user = ? AND sid = ? AND turn > ? "
+                              "ORDER BY seq", (*key, turn - self.recent_turns)).fetchall()
+        return [Event.model_validate_json(e) for (e,) in rows]
+
+    # --- BaseSessionService ----------------------------------------------------
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        sid = (session_id or "").strip() or str(uuid.uuid4())
+        key = (app_name, user_id, sid)
+        now = time.time()
+        with self._tx() as db:
+            if db.execute("SELECT 1 FROM sessions WHERE app = ? AND user = ? AND id = ?", key).fetchone():
+                raise AlreadyExistsError(f"Session with id {sid} already exists.")
+            db.execute("INSERT INTO sessions (app, user, id, created, updated) VALUES (?, ?, ?, ?, ?)", (*key, now, now))
+            self._write_state(db, key, 0, state or {}, {})
+            merged = self._state(db, key)
+        return Session(app_name=app_name, user_id=user_id, id=sid, state=merged, last_update_time=now)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            row = self._db.execute("SELECT updated, turn FROM sessions WHERE app = ? AND user = ? AND id = ?",
+                                   key).fetchone()
+            if row is None:
+                return None
+            state = self._state(self._db, key)
+            events = self._events(self._db, key, row[1], config)
+        return Session(app_name=app_name, user_id=user_id, id=session_id, state=state, events=events,
+                       last_update_time=row[0])
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        with self._lock:
+            rows = self._db.execute("SELECT user, id, updated FROM sessions WHERE app = ? AND (? IS NULL OR user = ?)",
+                                    (app_name, user_id, user_id)).fetchall()
+            return ListSessionsResponse(sessions=[
+                Session(app_name=app_name, user_id=u, id=sid, state=self._state(self._db, (app_name, u, sid)),
+                        last_update_time=updated) for u, sid, updated in rows])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        with self._tx() as db:
+            db.execute("DELETE FROM sessions WHERE app = ? AND user = ? AND id = ?", key)
+            for table in ("session_state", "log_items", "turn_summaries", "events"):
+                db.execute(f"DELETE FROM {table} WHERE app = ? AND user = ? AND sid = ?", key)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Base class trims temp: keys and applies the delta to the in-memory session
+        event = await super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        with self._tx() as db:
+            row = db.execute("SELECT turn, invocation FROM sessions WHERE app = ? AND user = ? AND id = ?",
+                             key).fetchone()
+            if row is None:
+                raise ValueError(f"Session {session.id} not found.")
+            turn, invocation = row
+            if event.invocation_id and event.invocation_id != invocation:
+                turn += 1
+                invocation = event.invocation_id
+                self._compact(db, key, turn)
+            data = event.model_dump(mode="json", exclude_none=True)
+            delta = event.actions.state_delta if event.actions else None
+            if delta:
+                offsets = dict(session.state.get("compaction") or {})
+                data["actions"]["state_delta"] = self._write_state(db, key, turn, delta, offsets)
+                session.state["compaction"] = offsets
+            db.execute("INSERT INTO events (app, user, sid, turn, ts, event) VALUES (?, ?, ?, ?, ?, ?)",
+                       (*key, turn, event.timestamp, json.dumps(data)))
+            db.execute("UPDATE sessions SET updated = ?, turn = ?, invocation = ? WHERE app = ? AND user = ? AND id = ?",
+                       (event.timestamp, turn, invocation, *key))
+        session.last_update_time = event.timestamp
+        return event
+
+    # --- extras ----------------------------------------------------------------
+    def history(self, app_name: str, user_id: str, session_id: str) -> List[Dict[str, Any]]:
+        """Every per-turn summary of a session, oldest first (the state only carries the newest)."""
+        return [json.loads(s) for (s,) in self._sql(
+            "SELECT summary FROM turn_summaries WHERE app = ? AND user = ? AND sid = ? ORDER BY turn",
+            (app_name, user_id, session_id))]
+
+    def info(self) -> Dict[str, Any]:
+        counts = {t: self._sql(f"SELECT COUNT(*) FROM {t}")[0][0]
+                  for t in ("sessions", "events", "log_items", "turn_summaries")}
+        return {**counts, "path": self.path, "recent_turns": self.recent_turns,
+                "db_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
+
+
+def session_service_factory(uri: str, **kwargs: Any) -> SqliteSessionService:
+    """sqlitewal:///abs/path.sqlite (or sqlitewal:// for SESSION_DB)."""
+    return SqliteSessionService(urlparse(uri).path or SESSION_DB)
+
+
+def register(registry: Any = None) -> None:
+    """Adds the sqlitewal:// scheme to ADK's service registry (before the server app is built)."""
+    if registry is None:
+        from google.adk.cli.service_registry import get_service_registry
+        registry = get_service_registry()
+    registry.register_session_service(SCHEME, session_service_factory)
+
+
+if __name__ == "__main__":
+    # python -m src.agent.session_store [--turns N] : per-turn write / read latency vs the in-memory service
+    import argparse, asyncio, tempfile
+    from google.adk.events.event_actions import EventActions
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=2000)
+    ap.add_argument("--events-per-turn", type=int, default=4)
+    ap.add_argument("--memory-turns", type=int, default=150,
+                    help="turns for the in-memory baseline (its reads copy every event ever appended)")
+    a = ap.parse_args()
+
+    def pct(xs: List[float], q: float) -> float:
+        xs = sorted(xs)
+        return round(xs[min(len(xs) - 1, int(len(xs) * q))] * 1000, 3)
+
+    async def bench(svc: BaseSessionService, turns: int) -> Dict[str, Any]:
+        app, user = "bench", "u"
+        s = await svc.create_session(app_name=app, user_id=user, session_id="s",
+                                     state={"receipts": [], "governor_log": []})
+        writes, reads = [], []
+        for t in range(turns):
+            s = await svc.get_session(app_name=app, user_id=user, session_id="s")
+            t0 = time.perf_counter()
+            inv = f"inv-{t}"
+            for e in range(a.events_per_turn):
+                receipts = list(s.state.get("receipts", [])) + [
+                    {"tool": "get_weather_tool", "status": "ok", "output": {"temp_c": 20 + e, "turn": t},
+                     "confidence": 0.9}]
+                governor = list(s.state.get("governor_log", [])) + [
+                    {"action": "keep_model", "confidence_score": 1.0, "reason": "baseline", "timestamp": "now"}]
+                ev = Event(invocation_id=inv, author="agent",
+                           content=types.Content(role="model", parts=[types.Part(text=f"turn {t} event {e}")]),
+                           actions=EventActions(state_delta={"receipts": receipts, "governor_log": governor,
+                                                             "last_query": f"q{t}"}))
+                await svc.append_event(s, ev)
+            writes.append((time.perf_counter() - t0) / a.events_per_turn)
+            t0 = time.perf_counter()
+            await svc.get_session(app_name=app, user_id=user, session_id="s")
+            reads.append(time.perf_counter() - t0)
+        last = writes[-len(writes) // 10:], reads[-len(reads) // 10:]
+        return {"turns": turns, "append_ms_p50": pct(writes, 0.5), "append_ms_p95": pct(writes, 0.95),
+                "get_ms_p50": pct(reads, 0.5), "get_ms_p95": pct(reads, 0.95),
+                "last10pct_append_ms_p50": pct(last[0], 0.5), "last10pct_get_ms_p50": pct(last[1], 0.5),
+                "state_receipts": len(s.state.get("receipts", []))}
+
+    out: Dict[str, Any] = {"events_per_turn": a.events_per_turn}
+    svc = SqliteSessionService(os.path.join(tempfile.mkdtemp(prefix="sessions-"), "bench.sqlite"))
+    out["sqlite"] = asyncio.run(bench(svc, a.turns))
+    out["sqlite"].update(svc.info())
+    out["in_memory"] = asyncio.run(bench(InMemorySessionService(), a.memory_turns))
+    print(json.dumps(out, indent=2))
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import asyncio, functools, json, os, random, re, time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+# Deterministic stand-ins for the model (and optionally the tools) so traffic can be
+# replayed or load-tested without model calls. StubLlm answers by role, recognised
+# from the tools on the request: the planner gets a JSON plan following the
+# prompt's patterns, the executor calls run_plan_tool once, the synthesizer gets a
+# short text. Latency is simulated (STUB_LLM_MS +/- STUB_LLM_JITTER) and token usage
+# is estimated from the prompt size, so gateway metrics stay populated.
+#   STUB_LLM=true python adk_server.py api_server .   -> the server's agents use it
+STUB_LLM_MS     = float(os.getenv("STUB_LLM_MS", "250"))
+STUB_LLM_JITTER = float(os.getenv("STUB_LLM_JITTER", "0.3"))
+STUB_TOOL_MS    = float(os.getenv("STUB_TOOL_MS", "20"))
+
+_WEATHER = re.compile(r"\b(weather|rain|temperature|forecast|humidity|wind|irrigat\w*|sow\w*)\b", re.I)
+_SOIL = re.compile(r"\b(soil|fertili[sz]er|npk|nitrogen|ph|manure|urea)\b", re.I)
+_MARKET = re.compile(r"\b(market|price|prices|mandi|sell|rate)\b", re.I)
+
+
+def _last_user_turn(req: LlmRequest) -> tuple:
+    """(text, has_image) of the newest user message in the request."""
+    for c in reversed(req.contents or []):
+        if c.role != "user":
+            continue
+        parts = c.parts or []
+        # ADK passes other agents' output as user messages starting "For context:"
+        texts = [p.text for p in parts if getattr(p, "text", None) and not p.text.startswith("For context:")]
+        if texts or any(getattr(p, "inline_data", None) for p in parts):
+            image = any(getattr(p, "inline_data", None) for p in parts) or any("(Attached:" in t for t in texts)
+            return " ".join(texts), image
+    return "", False
+
+
+def _ran_plan(req: LlmRequest) -> bool:
+    last = (req.contents or [None])[-1]
+    return bool(last and any(getattr(p, "function_response", None) for p in last.parts or []))
+
+
+def stub_plan(text: str, has_image: bool) -> Dict[str, Any]:
+    """The plan a well-behaved planner writes for this message (see PLANNER_INSTRUCTION)."""
+    tools: List[str] = []
+    if has_image:
+        tools += ["crop_id_tool", "diagnose_leaf_tool"]
+    if _WEATHER.search(text):
+        tools.append("get_weather_tool")
+    if _SOIL.search(text) or not tools:
+        tools.append("get_soil_tool")
+    if _MARKET.search(text):
+        tools.append("market_insight_tool")
+    tools.append("quality_gate_tool")
+    if has_image or _SOIL.search(text):
+        tools.append("recommend_fertilizer_tool")
+    steps = [{"id": f"s{i + 1}", "tool": t, "args": {}, "optional": t not in ("quality_gate_tool",)}
+             for i, t in enumerate(tools[:5])]
+    steps.append({"id": "sx", "tool": "exit_loop_tool_fn", "args": {}, "optional": False})
+    return {"steps": steps, "notes": "stub plan"}
+
+
+class StubLlm(BaseLlm):
+    model: str = "gemini-2.5-flash"
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return ["gemini-.*"]
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False
+                                     ) -> AsyncGenerator[LlmResponse, None]:
+        tools = set((llm_request.tools_dict or {}).keys())
+        text, has_image = _last_user_turn(llm_request)
+        if "run_plan_tool" in tools:
+            part = (types.Part(text="done") if _ran_plan(llm_request) else
+                    types.Part(function_call=types.FunctionCall(name="run_plan_tool", args={})))
+        elif "quality_gate_tool" in tools:
+            part = types.Part(text=json.dumps(stub_plan(text, has_image)))
+        else:
+            part = types.Part(text=f"Recommendation (stub) for: {text[:160]}")
+        await asyncio.sleep(max(0.0, STUB_LLM_MS * (1 + random.uniform(-STUB_LLM_JITTER, STUB_LLM_JITTER))) / 1000)
+        prompt_chars = sum(len(p.text or "") for c in llm_request.contents or [] for p in c.parts or [])
+        out_tokens = len(part.text or "") // 4 + 8
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_chars // 4, candidates_token_count=out_tokens,
+                total_token_count=prompt_chars // 4 + out_tokens),
+        )
+
+
+def install_llm() -> None:
+    """Route every gemini-* model name to StubLlm (agents resolve their model on first use)."""
+    from google.adk.models.registry import LLMRegistry
+    LLMRegistry.register(StubLlm)
+    LLMRegistry.resolve.cache_clear()
+
+
+def install_tools(latency_ms: float = STUB_TOOL_MS) -> List[str]:
+    """Replace every plan tool's function with a fixed-latency fake (signatures kept for declarations)."""
+    from .tools import registry
+    from .tools.utils import log_receipt_safe
+    stubbed = []
+    for name in registry._MODULES:
+        if name in ("run_plan_tool", "exit_loop_tool"):
+            continue
+        ft = registry.resolve(name)
+        orig = ft.func
+
+        @functools.wraps(orig)
+        def fake(*args: Any, _name: str = name, **kwargs: Any) -> Dict[str, Any]:
+            t0 = time.perf_counter()
+            time.sleep(latency_ms / 1000)
+            out = {"status": "ok", "summary": f"stub {_name}", "args": kwargs,
+                   "cost_ms": int((time.perf_counter() - t0) * 1000)}
+            log_receipt_safe(_name, "ok", out, 0.9)
+            return out
+
+        ft.func = fake
+        stubbed.append(name)
+    return stubbed
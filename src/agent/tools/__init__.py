@@ -1,13 +1,5 @@
-from .crop_id import crop_id_tool
-from .diagnose_leaf import diagnose_leaf_tool
-from .get_weather import get_weather_tool
-from .get_soil import get_soil_tool
-from .quality_gate import quality_gate_tool
-from .recommend_fertilizer import recommend_fertilizer_tool
-from .market_insight import market_insight_tool
-from .exit_loop import exit_loop_tool
-from .run_plan import run_plan_tool
-
+# Tools are attributes resolved on first access (see registry.py): importing this
+# package no longer imports every tool module.
 __all__ = [
     "crop_id_tool",
     "diagnose_leaf_tool",
@@ -19,3 +11,10 @@ __all__ = [
     "exit_loop_tool",
     "run_plan_tool",
 ]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        from .registry import resolve
+        return resolve(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,22 @@
 from typing import Optional
 from google.adk.tools import FunctionTool
 from .utils import log_receipt_safe
+from ..data.crops import extract_crop
 
 @FunctionTool
 def crop_id_tool(hint_text: Optional[str] = None) -> dict:
     """
-    Heuristic crop identification from hint text (stub).
+    Crop identification from hint text via the crop vocabulary index
+    (regional names, plurals and misspellings included).
     """
     crop, conf = "unknown", 0.2
+    out = {"crop": crop, "confidence": conf}
     if hint_text and isinstance(hint_text, str) and hint_text.strip():
-        crop, conf = hint_text.strip().lower(), 0.5
+        hit = extract_crop(hint_text)
+        if hit:
+            crop, conf = hit["crop"], hit["confidence"]
+            out = {"crop": crop, "confidence": conf, "matched": hit["matched"],
+                   "method": hit["method"], "category": hit["category"]}
 
-    out = {"crop": crop, "confidence": conf}
     log_receipt_safe("crop_id_tool", "success", out, confidence=conf)
     return out
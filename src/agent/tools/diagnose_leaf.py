@@ -1,16 +1,50 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from google.adk.tools import FunctionTool
 from .utils import log_receipt_safe
 
+def image_args(state: Dict[str, Any]) -> Dict[str, Any]:
+    """diagnose_leaf_tool args for the turn's uploads (state['image_uris'], else uploaded_image_uri)."""
+    uris = [u for u in (state.get("image_uris") or []) if u] or \
+        ([state["uploaded_image_uri"]] if state.get("uploaded_image_uri") else [])
+    if not uris:
+        return {}
+    return {"image_ref": uris[0], "image_refs": uris} if len(uris) > 1 else {"image_ref": uris[0]}
+
 @FunctionTool
-def diagnose_leaf_tool(image_ref: Optional[str] = None) -> dict:
+def diagnose_leaf_tool(image_ref: Optional[str] = None, image_refs: Optional[List[str]] = None) -> dict:
     """
-    Stub leaf disease detector based on an image reference.
+    Leaf disease detector: local CPU classifier for readable image files (all
+    images of the turn in one batch, fused; near-duplicates of earlier photos reuse
+    their cached diagnosis), heuristic stub when no image is available on this host.
+    Without trained weights the result is source="heuristic" with capped confidence.
     """
+    from ..vision.leaf_classifier import classify_many, resolve_image_path  # numpy + Pillow: first diagnosis only
+    refs = list(dict.fromkeys(r for r in (image_refs or [image_ref]) if r))
     disease, conf = "unknown", 0.0
-    if image_ref:
-        disease, conf = "possible_leaf_spot", 0.4
+    out = {"disease": disease, "confidence": conf, "image_ref": refs[0] if refs else image_ref}
+    if len(refs) > 1:
+        out["image_refs"] = refs
+
+    paths = {r: resolve_image_path(r) for r in refs}
+    readable = [r for r in refs if paths[r] is not None]
+    if readable:
+        try:
+            res = classify_many([str(paths[r]) for r in readable])
+            by_path = {im.pop("path"): im for im in res["images"]}
+            res["images"] = [{"image_ref": r, **by_path.get(str(paths[r]), {})} for r in readable]
+            res["images"] += [{"image_ref": r, "source": "stub"} for r in refs if paths[r] is None]
+            if len(refs) == 1:
+                only = res.pop("images")[0]
+                res.pop("agreement", None)
+                if only.get("cached"):
+                    res.update(cached=True, match_distance=only["match_distance"])
+            conf = res["confidence"]
+            out.update(res)
+        except Exception as e:
+            out["error"] = f"{type(e).__name__}: {e}"
+    elif refs:
+        conf = 0.4
+        out.update(disease="possible_leaf_spot", confidence=conf, source="stub")
 
-    out = {"disease": disease, "confidence": conf, "image_ref": image_ref}
     log_receipt_safe("diagnose_leaf_tool", "success", out, confidence=conf)
     return out
@@ -1,17 +1,35 @@
 from typing import Optional
 from google.adk.tools import FunctionTool
 from .utils import log_receipt_safe
+from ..data.gazetteer import resolve_location
+from ..data.soil_store import soil_store
+
+_DEFAULTS = {"ph": 6.2, "nitrogen": 0.0, "organic_matter_pct": 0.0}
 
 @FunctionTool
-def get_soil_tool(location: Optional[str] = None) -> dict:
+def get_soil_tool(location: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None) -> dict:
     """
-    Stub soil composition provider. Replace with real datasource later.
+    Soil composition from the local gridded store (nearest cell with data).
+    Falls back to neutral defaults when no store or no coordinates are available.
     """
-    out = {
-        "location": location or "unknown",
-        "ph": 6.2,
-        "nitrogen": 0.0,
-        "organic_matter_pct": 0.0,
-    }
-    log_receipt_safe("get_soil_tool", "success", out, confidence=0.6)
+    place = resolve_location(location) if lat is None or lon is None else None
+    out = {"location": place["name"] if place else location or "unknown", **_DEFAULTS, "source": "default"}
+    if place:
+        out["location_id"] = place["id"]
+    conf = 0.6
+
+    if place:
+        coords = (place["lat"], place["lon"])
+    else:
+        coords = (lat, lon) if lat is not None and lon is not None else None
+    try:
+        store = soil_store() if coords else None
+        rec = store.nearest(*coords) if store else None
+        if rec:
+            out.update({k: v for k, v in rec.items() if v is not None}, source="soil_grid")
+            conf = 0.8
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+
+    log_receipt_safe("get_soil_tool", "success", out, confidence=conf)
     return out
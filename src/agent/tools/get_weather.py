@@ -1,17 +1,38 @@
 from typing import Optional
 from google.adk.tools import FunctionTool
 from .utils import log_receipt_safe
+from ..data.forecast_store import lookup_batch
+from ..data.gazetteer import resolve_location
 
 @FunctionTool
-def get_weather_tool(location: Optional[str] = None) -> dict:
+def get_weather_tool(location: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None) -> dict:
     """
-    Stub weather data provider. Replace with real API later.
+    Forecast for a point from the local gridded snapshot (bilinear between cells).
+    Falls back to an 'unknown' record when no snapshot or no coordinates are available.
     """
+    place = resolve_location(location) if lat is None or lon is None else None
     out = {
-        "location": location or "unknown",
+        "location": place["name"] if place else location or "unknown",
         "temp_c": 0.0,
         "rain_prob": 0.0,
         "summary": "unknown",
+        "source": "default",
     }
-    log_receipt_safe("get_weather_tool", "success", out, confidence=0.5)
+    if place:
+        out["location_id"] = place["id"]
+    conf = 0.5
+
+    if place:
+        coords = (place["lat"], place["lon"])
+    else:
+        coords = (lat, lon) if lat is not None and lon is not None else None
+    try:
+        rec = lookup_batch([coords[0]], [coords[1]])[0] if coords else None
+        if rec:
+            out.update(rec, source="forecast_grid")
+            conf = 0.8
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+
+    log_receipt_safe("get_weather_tool", "success", out, confidence=conf)
     return out
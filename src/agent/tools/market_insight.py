@@ -1,17 +1,38 @@
 from typing import Optional
 from google.adk.tools import FunctionTool
 from .utils import log_receipt_safe
+from ..data.gazetteer import resolve_location
+from ..data.market_store import market_store
 
 @FunctionTool
 def market_insight_tool(crop: Optional[str] = None, region: Optional[str] = None) -> dict:
     """
-    Stub market insight provider. Replace with actual datasource later.
+    Rolling average price and trend from the local mandi price store.
+    Tries the district, then its state, then all regions for the crop.
     """
     out = {
         "crop": crop or "unknown",
         "region": region or "unknown",
         "avg_price": 0.0,
         "trend": "unknown",
+        "source": "default",
     }
-    log_receipt_safe("market_insight_tool", "success", out, confidence=0.5)
+    conf = 0.5
+
+    try:
+        store = market_store() if crop else None
+        place = resolve_location(region) if region else None
+        scopes = [region] + ([place["state_id"]] if place and place["kind"] == "district" else [])
+        rec = None
+        for i, scope in enumerate(scopes if store else []):
+            rec = store.lookup(crop, scope, fallback=i == len(scopes) - 1)
+            if rec:
+                break
+        if rec:
+            out.update(rec, source="price_store")
+            conf = 0.8 if rec["region"] != "all" or not region else 0.65
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+
+    log_receipt_safe("market_insight_tool", "success", out, confidence=conf)
     return out
@@ -0,0 +1,169 @@
+from __future__ import annotations
+import contextvars, json, os, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Opt-in: start predictable tool calls while the planner LLM is still thinking.
+ENABLE_PREFETCH = os.getenv("AGENT_SPECULATIVE_PREFETCH", "false").lower() == "true"
+PREFETCH_WORKERS = int(os.getenv("AGENT_PREFETCH_WORKERS", "4"))
+PREFETCH_TTL_S = float(os.getenv("AGENT_PREFETCH_TTL_S", "120"))
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_LOCK = threading.RLock()
+# invocation_id -> call key -> speculative call
+_PENDING: Dict[str, Dict[str, "_Spec"]] = {}
+_STATS: Dict[str, float] = {
+    "launched": 0, "hits": 0, "failed": 0, "discarded": 0,
+    "saved_ms": 0.0, "wasted_ms": 0.0,
+}
+
+
+class _Spec:
+    __slots__ = ("tool", "args", "future", "created", "cost_ms")
+
+    def __init__(self, tool: str, args: Dict[str, Any]):
+        self.tool = tool
+        self.args = args
+        self.future: Optional[Future] = None
+        self.created = time.monotonic()
+        self.cost_ms = 0.0
+
+
+def call_key(tool: str, args: Optional[Dict[str, Any]]) -> str:
+    """Normalized identity of a tool invocation (tool name + sorted, compact args)."""
+    return tool + "|" + json.dumps(args or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def predict_calls(state: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Calls the planner is near-certain to schedule (mirrors _synth_fallback_plan)."""
+    calls: List[Tuple[str, Dict[str, Any]]] = []
+    from .diagnose_leaf import image_args
+    loc = state.get("location")
+    images = image_args(state)
+    if images:
+        calls.append(("diagnose_leaf_tool", images))
+    if loc:
+        calls.append(("get_weather_tool", {"location": loc}))
+        calls.append(("get_soil_tool", {"location": loc}))
+    return calls
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+    return _POOL
+
+
+def _run(spec: _Spec) -> Any:
+    from .run_plan import _TOOL_MAP, _call  # late import: run_plan imports this module
+    start = time.perf_counter()
+    try:
+        return _call(_TOOL_MAP[spec.tool], spec.args)
+    finally:
+        spec.cost_ms = (time.perf_counter() - start) * 1000
+
+
+def _discard(spec: _Spec) -> None:
+    if spec.future.cancel():
+        return
+    # Already running or done: its cost is wasted work once it settles.
+    def _count(_f: Future, spec: _Spec = spec) -> None:
+        with _LOCK:
+            _STATS["wasted_ms"] += spec.cost_ms
+    spec.future.add_done_callback(_count)
+
+
+def _sweep_expired() -> None:
+    now = time.monotonic()
+    for inv_id in list(_PENDING):
+        specs = _PENDING[inv_id]
+        if specs and all(now - s.created > PREFETCH_TTL_S for s in specs.values()):
+            for s in _PENDING.pop(inv_id).values():
+                _STATS["discarded"] += 1
+                _discard(s)
+
+
+def start(invocation_id: Optional[str], calls: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """
+    Launch speculative calls for this turn in the background. Idempotent per
+    invocation (the planner loop may run several times). Returns #launched.
+    """
+    if not ENABLE_PREFETCH:
+        return 0
+    return submit(invocation_id, calls)
+
+
+def submit(invocation_id: Optional[str], calls: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """Unconditionally queue calls for adoption by run_plan_tool (skips duplicates)."""
+    if not invocation_id or not calls:
+        return 0
+    launched = 0
+    with _LOCK:
+        _sweep_expired()
+        specs = _PENDING.setdefault(invocation_id, {})
+        for tool, args in calls:
+            key = call_key(tool, args)
+            if key in specs:
+                continue
+            spec = _Spec(tool, dict(args))
+            # Copy the context so receipts of speculative calls keep the turn's journal keys
+            spec.future = _pool().submit(contextvars.copy_context().run, _run, spec)
+            specs[key] = spec
+            launched += 1
+        _STATS["launched"] += launched
+    return launched
+
+
+def adopt(invocation_id: Optional[str], tool: str, args: Dict[str, Any]) -> Optional[Tuple[Any, float]]:
+    """
+    Claim a speculative result matching (tool, args) exactly. Returns
+    (result, wait_ms) or None when nothing matches or the speculative call failed.
+    """
+    if not invocation_id:
+        return None
+    with _LOCK:
+        specs = _PENDING.get(invocation_id)
+        if not specs:
+            return None
+        spec = specs.pop(call_key(tool, args), None)
+    if spec is None:
+        return None
+
+    waited = time.perf_counter()
+    try:
+        result = spec.future.result()
+    except Exception:
+        with _LOCK:
+            _STATS["failed"] += 1
+        return None
+    waited_ms = (time.perf_counter() - waited) * 1000
+    with _LOCK:
+        _STATS["hits"] += 1
+        _STATS["saved_ms"] += max(0.0, spec.cost_ms - waited_ms)
+    return result, round(waited_ms, 2)
+
+
+def finish(invocation_id: Optional[str]) -> Dict[str, Any]:
+    """Discard unclaimed speculative calls for this turn and summarize it."""
+    with _LOCK:
+        specs = _PENDING.pop(invocation_id, None) if invocation_id else None
+    leftover = list((specs or {}).values())
+    for spec in leftover:
+        _discard(spec)
+    with _LOCK:
+        _STATS["discarded"] += len(leftover)
+    return {"enabled": ENABLE_PREFETCH, "discarded": [s.tool for s in leftover]}
+
+
+def prefetch_stats() -> Dict[str, Any]:
+    """Process-wide hit rate and wasted work of speculative calls."""
+    with _LOCK:
+        s = dict(_STATS)
+    launched = s["launched"]
+    s["hit_rate"] = round(s["hits"] / launched, 3) if launched else 0.0
+    s["waste_rate"] = round(s["discarded"] / launched, 3) if launched else 0.0
+    s["saved_ms"] = round(s["saved_ms"], 2)
+    s["wasted_ms"] = round(s["wasted_ms"], 2)
+    s["enabled"] = ENABLE_PREFETCH
+    return s
@@ -1,6 +1,7 @@
 from typing import Optional, Any, Dict
 from google.adk.tools import FunctionTool
 from .utils import log_receipt_safe
+from ..data.fertilizer import recommend
 
 def _last_receipt(tool_name: str) -> Dict[str, Any]:
     try:
@@ -15,24 +16,34 @@ def _last_receipt(tool_name: str) -> Dict[str, Any]:
         pass
     return {}
 
+def _num(v: Any) -> Optional[float]:
+    return float(v) if isinstance(v, (int, float)) else None
+
 @FunctionTool
-def recommend_fertilizer_tool(target_crop: Optional[str] = None) -> dict:
+def recommend_fertilizer_tool(
+    target_crop: Optional[str] = None,
+    target_yield_t_ha: Optional[float] = None,
+    ph: Optional[float] = None,
+    nitrogen: Optional[float] = None,
+    organic_matter_pct: Optional[float] = None,
+) -> dict:
     """
-    Suggest a simple NPK ratio using prior soil/crop receipts.
+    NPK recommendation from the crop × soil-band tables. Soil values come from
+    the arguments when given, else from prior soil/crop receipts.
     """
-    soil = _last_receipt("get_soil_tool")
-    crop = _last_receipt("crop_id_tool")
-
-    ph = soil.get("ph")
+    explicit = {"ph": ph, "nitrogen": nitrogen, "organic_matter_pct": organic_matter_pct}
+    soil = {k: v for k, v in explicit.items() if v is not None} or _last_receipt("get_soil_tool")
+    crop = _last_receipt("crop_id_tool") if not target_crop else {}
     crop_name = target_crop or crop.get("crop") or "unknown"
 
-    ratio, conf = "10-10-10", 0.55
-    if isinstance(ph, (int, float)):
-        if ph < 5.8:
-            ratio, conf = "12-6-6", 0.5
-        elif ph > 7.2:
-            ratio, conf = "6-12-12", 0.5
+    # Stub soil defaults are not measurements: treat them as unknown bands
+    measured = soil.get("source", "soil_grid") != "default"
+    ph = _num(soil.get("ph")) if measured else None
+    n = _num(soil.get("nitrogen")) if measured else None
+    om = _num(soil.get("organic_matter_pct")) if measured else None
 
-    out = {"crop": crop_name, "npk_ratio": ratio, "note": "heuristic"}
+    out = {"crop": crop_name, **recommend(crop_name, ph, n, om, _num(target_yield_t_ha)), "note": "band_table"}
+    known = sum(v is not None for v in (ph, n, om))
+    conf = round(0.55 + 0.08 * known - (0.05 if out["amendment"] else 0.0), 2)
     log_receipt_safe("recommend_fertilizer_tool", "success", out, confidence=conf)
     return out
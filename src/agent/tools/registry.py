@@ -0,0 +1,73 @@
+from __future__ import annotations
+import importlib, threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from google.adk.tools.base_toolset import BaseToolset
+
+# Lazy tool registration: a tool's module (and whatever it pulls in — numpy for the
+# leaf classifier, the soil / forecast / market stores) is imported the first time
+# the tool is needed, not when the agent package is imported. Text-only turns
+# never load the vision stack.
+_MODULES: Dict[str, str] = {
+    "crop_id_tool": ".crop_id",
+    "diagnose_leaf_tool": ".diagnose_leaf",
+    "get_weather_tool": ".get_weather",
+    "get_soil_tool": ".get_soil",
+    "quality_gate_tool": ".quality_gate",
+    "recommend_fertilizer_tool": ".recommend_fertilizer",
+    "market_insight_tool": ".market_insight",
+    "exit_loop_tool": ".exit_loop",
+    "run_plan_tool": ".run_plan",
+}
+
+_RESOLVED: Dict[str, Any] = {}
+_LOCK = threading.Lock()
+
+
+def resolve(name: str) -> Any:
+    """The FunctionTool called name, importing its module on first use (KeyError if unknown)."""
+    tool = _RESOLVED.get(name)
+    if tool is None:
+        module = _MODULES[name]
+        with _LOCK:
+            tool = _RESOLVED.get(name)
+            if tool is None:
+                tool = _RESOLVED[name] = getattr(importlib.import_module(module, __package__), name)
+    return tool
+
+
+class LazyToolMap(Mapping):
+    """Read-only name -> FunctionTool mapping (run_plan's _TOOL_MAP) that resolves entries on access."""
+
+    def __init__(self, names: Sequence[str]):
+        self._names = tuple(names)
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._names:
+            raise KeyError(name)
+        return resolve(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._names
+
+
+class LazyToolset(BaseToolset):
+    """Agent tool list resolved when ADK first asks for it (the first turn), then reused."""
+
+    def __init__(self, names: Sequence[str]):
+        super().__init__()
+        self.names = list(names)
+
+    async def get_tools(self, readonly_context: Optional[Any] = None) -> List[Any]:
+        return [resolve(n) for n in self.names]
+
+    def preload(self) -> None:
+        for n in self.names:
+            resolve(n)
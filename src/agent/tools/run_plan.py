@@ -1,99 +1,133 @@
 from __future__ import annotations
-import json, time
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Mapping
 from google.adk.tools import FunctionTool
 from google.adk.tools.tool_context import ToolContext
 
-# Import ADK FunctionTool wrappers
-from .crop_id import crop_id_tool
-from .diagnose_leaf import diagnose_leaf_tool
-from .get_weather import get_weather_tool
-from .get_soil import get_soil_tool
-from .quality_gate import quality_gate_tool
-from .recommend_fertilizer import recommend_fertilizer_tool
-from .market_insight import market_insight_tool
-
-from .utils import log_receipt_safe
-
-_TOOL_MAP: Dict[str, FunctionTool] = {
-    "crop_id_tool": crop_id_tool,
-    "diagnose_leaf_tool": diagnose_leaf_tool,
-    "get_weather_tool": get_weather_tool,
-    "get_soil_tool": get_soil_tool,
-    "quality_gate_tool": quality_gate_tool,
-    "recommend_fertilizer_tool": recommend_fertilizer_tool,
-    "market_insight_tool": market_insight_tool,
+from .diagnose_leaf import image_args
+from .registry import LazyToolMap
+from .utils import bind_turn, log_receipt_safe
+from . import prefetch
+from ..data.gazetteer import canonical_location
+from ..plan import compile_plan
+from ..profiling import profiled, requested
+
+# ADK FunctionTool wrappers, each imported on its first call
+_TOOL_MAP: Mapping[str, FunctionTool] = LazyToolMap([
+    "crop_id_tool",
+    "diagnose_leaf_tool",
+    "get_weather_tool",
+    "get_soil_tool",
+    "quality_gate_tool",
+    "recommend_fertilizer_tool",
+    "market_insight_tool",
+])
+
+# Location-aware tools and the argument that carries the place
+_LOCATION_ARGS = {
+    "get_weather_tool": "location",
+    "get_soil_tool": "location",
+    "market_insight_tool": "region",
 }
 
 def _safe_args(obj: Any) -> Dict[str, Any]:
     return obj if isinstance(obj, dict) else {}
 
+def _location_args(tname: str, args: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    """Key location-aware calls on the turn's resolved place ID (so prefetch/caches match)."""
+    key = _LOCATION_ARGS.get(tname)
+    if not key:
+        return args
+    value = args.get(key) or (state.get("location_resolved") or {}).get("id")
+    canon = canonical_location(value) if value else None
+    return {**args, key: canon} if canon and canon != args.get(key) else args
+
+def _turn_args(tname: str, args: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize args against turn state: resolved place IDs, and every uploaded image for diagnosis."""
+    if tname == "diagnose_leaf_tool":
+        uploads = image_args(state)
+        return {**args, **uploads} if uploads.get("image_refs") and not args.get("image_refs") else args
+    return _location_args(tname, args, state)
+
 def _call(ft: FunctionTool, args: Dict[str, Any]) -> Any:
     """Invoke the underlying function of a FunctionTool so state receipts are captured."""
     fn = getattr(ft, "func", None)
-    if callable(fn):
-        return fn(**args) if args else fn()
-    # Fallback if ADK wrapper requires run()
-    ctx = ToolContext.get_current()
-    return ft.run(args=args, tool_context=ctx)
+    if not callable(fn):
+        raise TypeError(f"{getattr(ft, 'name', ft)} has no callable func")
+    return fn(**args) if args else fn()
 
 @FunctionTool
 def run_plan_tool(tool_context: ToolContext) -> Dict[str, Any]:
     """
-    Execute the JSON plan in state['current_plan'] and echo per-step receipts for the UI.
+    Execute the compiled plan for state['current_plan'] and echo per-step receipts for the UI.
     Skips 'exit_loop_tool_fn'. Adds a synthetic receipt if no tool executed.
     """
     state = tool_context.state or {}
     state.setdefault("receipts", [])
 
-    raw = state.get("current_plan") or "{}"
-    try:
-        plan = json.loads(raw)
-    except Exception:
-        plan = {}
-
-    steps = plan.get("steps") or []
-    executed = skipped = errors = 0
-
-    for step in steps:
-        tname = step.get("tool")
-        if not tname or tname == "exit_loop_tool_fn":
-            skipped += 1
-            continue
-
-        ft = _TOOL_MAP.get(tname)
-        if not isinstance(ft, FunctionTool):
-            skipped += 1
-            log_receipt_safe(tname or "unknown", "skipped:unknown_tool", {"args": step.get("args")})
-            continue
-
-        args = _safe_args(step.get("args"))
-        start = time.perf_counter()
-        try:
-            result = _call(ft, args)
-            cost_ms = int((time.perf_counter() - start) * 1000)
-            # Synthetic record in case the tool didn't log one
-            log_receipt_safe(
-                tname,
-                "executed",
-                {"args": args, "result": result, "cost_ms": cost_ms, "synthetic": True},
-            )
-            executed += 1
-        except Exception as e:
-            cost_ms = int((time.perf_counter() - start) * 1000)
-            log_receipt_safe(
-                tname,
-                f"error:{type(e).__name__}",
-                {"args": args, "error": str(e), "cost_ms": cost_ms},
-            )
-            errors += 1
+    # Cached per plan content: parsing, gate check and tool lookup happen once per distinct plan
+    compiled = compile_plan(state.get("current_plan") or "{}")
+    steps = compiled.calls(_TOOL_MAP.get)
+    executed = skipped = errors = prefetched = 0
+    invocation_id = getattr(tool_context, "invocation_id", None)
+
+    # Opt-in profile of the tool calls (state['profile'] comes from the UI's X-Profile header)
+    with bind_turn(tool_context), profiled("run_plan_tool", requested(state.get("profile"))) as profile:
+        for step, ft in steps:
+            tname = step.tool
+            if not tname or tname == "exit_loop_tool_fn":
+                skipped += 1
+                continue
+
+            if not isinstance(ft, FunctionTool):
+                skipped += 1
+                log_receipt_safe(tname or "unknown", "skipped:unknown_tool", {"args": step.args})
+                continue
+
+            args = _turn_args(tname, _safe_args(step.args), state)
+
+            # Adopt a speculative result started while the planner was thinking
+            hit = prefetch.adopt(invocation_id, tname, args)
+            if hit is not None:
+                result, wait_ms = hit
+                log_receipt_safe(
+                    tname,
+                    "executed",
+                    {"args": args, "result": result, "cost_ms": int(wait_ms), "synthetic": True, "prefetched": True},
+                )
+                executed += 1
+                prefetched += 1
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = _call(ft, args)
+                cost_ms = int((time.perf_counter() - start) * 1000)
+                # Synthetic record in case the tool didn't log one
+                log_receipt_safe(
+                    tname,
+                    "executed",
+                    {"args": args, "result": result, "cost_ms": cost_ms, "synthetic": True},
+                )
+                executed += 1
+            except Exception as e:
+                cost_ms = int((time.perf_counter() - start) * 1000)
+                log_receipt_safe(
+                    tname,
+                    f"error:{type(e).__name__}",
+                    {"args": args, "error": str(e), "cost_ms": cost_ms, "synthetic": True},
+                )
+                errors += 1
+
+    turn_prefetch = prefetch.finish(invocation_id)
 
     # Fail-fast receipt if nothing executed
     if executed == 0:
         log_receipt_safe(
             "run_plan_tool",
             "no_tools_ran",
-            {"reason": "all steps optional or missing required inputs"}
+            {"reason": "all steps optional or missing required inputs"},
+            tool_context=tool_context,
         )
 
     # Echo per-step receipts so UI can render a line per inner tool
@@ -104,6 +138,8 @@ def run_plan_tool(tool_context: ToolContext) -> Dict[str, Any]:
             "skipped": skipped,
             "errors": errors,
             "total_steps": len(steps),
+            "prefetch": {**turn_prefetch, "adopted": prefetched, "totals": prefetch.prefetch_stats()},
+            **({"profile": profile} if profile else {}),
         },
         "receipts": receipts_snapshot,
     }
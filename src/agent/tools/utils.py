@@ -1,23 +1,51 @@
-from typing import Any, Dict
+import contextlib, contextvars
+from typing import Any, Dict, Iterator, Optional, Tuple
 
-def log_receipt_safe(tool: str, status: str, output: Dict[str, Any], confidence: float = 1.0):
+from ..journal import context_ids, record
+
+# The turn whose plan is running (bound by run_plan_tool; the planner's prefetch binds
+# ids only), so receipts logged by plain tool functions reach its session state and
+# carry its journal keys.
+_TURN: contextvars.ContextVar[Tuple[Dict[str, Any], Any]] = contextvars.ContextVar("turn", default=({}, None))
+
+
+@contextlib.contextmanager
+def bind_turn(ctx: Any, state: bool = True) -> Iterator[None]:
+    """
+    Make ctx the receipt target inside the block: its session / invocation ids key the
+    journal records and, with state=True, receipts are appended to ctx.state.
+    """
+    token = _TURN.set((context_ids(ctx), ctx if state else None))
+    try:
+        yield
+    finally:
+        _TURN.reset(token)
+
+
+def log_receipt_safe(tool: str, status: str, output: Dict[str, Any], confidence: float = 1.0,
+                     tool_context: Optional[Any] = None):
     """
-    Append a normalized receipt to the current ADK ToolContext if available.
-    Safe when called outside agent context.
+    Append a normalized receipt to the tool context's state (tool_context, else the
+    one bound by bind_turn) and journal it. Safe when called outside agent context.
     """
+    if tool_context is not None:
+        ids, context = context_ids(tool_context), tool_context
+    else:
+        ids, context = _TURN.get()
+    # Journaled whether or not a context is reachable (session state is compacted;
+    # the journal keeps every receipt for offline analysis)
+    record("receipt", **ids, tool=tool, status=status, confidence=confidence, output=output)
+    state = getattr(context, "state", None)
+    if state is None:
+        return
     try:
-        from google.adk.tools.tool_context import ToolContext
-        context = ToolContext.get_current()
-        if not context or not hasattr(context, "state"):
-            return
-        state = context.state
-        state.setdefault("receipts", [])
-        state["receipts"].append({
+        # Assign a new list: ADK records state deltas on assignment, not on in-place appends
+        state["receipts"] = list(state.get("receipts") or []) + [{
             "tool": tool,
             "status": status,
             "output": output,
             "confidence": confidence,
-        })
+        }]
         # Surface the latest confidence to the governor
         state["confidence_score"] = confidence
     except Exception:
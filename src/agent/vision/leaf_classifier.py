@@ -0,0 +1,358 @@
+from __future__ import annotations
+import os, queue, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Local CPU leaf-disease classifier with cross-request micro-batching.
+#
+# Weights: LEAF_MODEL_PATH may point to an .npz with W (F×C), b (C,), labels (C,)
+# trained on the features below, or to an .onnx model taking (B, S, S, 3) float32
+# (needs onnxruntime). Without a file the built-in colour-feature weights are used:
+# they are hand-set, not trained, so their results are labelled source="heuristic"
+# and confidence is capped at LEAF_HEURISTIC_MAX_CONF, below the 0.6 the quality gate
+# reports for a failed check (a flat grey square must not read as certain mildew).
+LEAF_MODEL_PATH = os.getenv("LEAF_MODEL_PATH") or os.getenv("LEAF_WEIGHTS", "")
+HEURISTIC_MAX_CONF = float(os.getenv("LEAF_HEURISTIC_MAX_CONF", "0.4"))
+INPUT_SIZE = int(os.getenv("LEAF_INPUT_SIZE", "64"))
+BATCH_WINDOW_MS = float(os.getenv("LEAF_BATCH_WINDOW_MS", "4"))
+MAX_BATCH = int(os.getenv("LEAF_MAX_BATCH", "16"))
+DECODE_WORKERS = int(os.getenv("LEAF_DECODE_WORKERS", "4"))
+
+LABELS = ("healthy", "leaf_spot", "chlorosis", "blight", "powdery_mildew")
+FEATURES = ("green", "yellow", "brown", "dark", "white", "bias")
+
+# Rows follow FEATURES, columns follow LABELS.
+_DEFAULT_W = np.array([
+    #  healthy  spot  chlor  blight  mildew
+    [   4.0,    1.0,  -1.0,  -2.0,   0.0],   # green fraction
+    [  -4.0,    0.0,   6.0,   0.5,   0.0],   # yellow fraction
+    [  -5.0,    4.0,  -1.0,   6.0,  -1.0],   # brown fraction
+    [  -2.0,    3.0,   0.0,   2.0,   0.0],   # dark fraction
+    [  -3.0,    0.0,   0.0,   0.0,   6.0],   # white/powder fraction
+    [   0.5,    0.0,   0.0,   0.0,   0.0],   # bias
+], dtype=np.float32)
+_DEFAULT_B = np.zeros(len(LABELS), dtype=np.float32)
+
+
+def load_image(path: str, size: int = INPUT_SIZE) -> np.ndarray:
+    """Decode + resize to (size, size, 3) uint8. JPEG draft mode decodes at reduced scale."""
+    from PIL import Image  # deferred: only the vision path needs Pillow
+    with Image.open(path) as im:
+        im.draft("RGB", (size * 2, size * 2))
+        return np.asarray(im.convert("RGB").resize((size, size), Image.BILINEAR), dtype=np.uint8)
+
+
+def extract_features(batch: np.ndarray) -> np.ndarray:
+    """(B, H, W, 3) uint8 -> (B, len(FEATURES)) float32, fully vectorized."""
+    x = batch.astype(np.float32) * (1.0 / 255.0)
+    r, g, b = x[..., 0], x[..., 1], x[..., 2]
+    lum = (r + g + b) * (1.0 / 3.0)
+    spread = x.max(axis=-1) - x.min(axis=-1)
+
+    green = (2 * g - r - b) > 0.1
+    yellow = (r > 0.45) & (g > 0.4) & (b < 0.35) & (np.abs(r - g) < 0.2)
+    brown = (r > g) & (g > b) & (r - b > 0.12) & (lum < 0.5)
+    dark = lum < 0.15
+    white = (lum > 0.75) & (spread < 0.12)
+
+    axes = (1, 2)
+    feats = np.stack([
+        green.mean(axis=axes), yellow.mean(axis=axes), brown.mean(axis=axes),
+        dark.mean(axis=axes), white.mean(axis=axes),
+        np.ones(batch.shape[0], dtype=np.float32),
+    ], axis=1)
+    return feats.astype(np.float32)
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class LeafClassifier:
+    """Loaded once per process; forward() takes a whole batch."""
+
+    def __init__(self, path: str = LEAF_MODEL_PATH):
+        start = time.perf_counter()
+        self.labels: Tuple[str, ...] = LABELS
+        self.W, self.b = _DEFAULT_W, _DEFAULT_B
+        self.source = "heuristic"
+        self.trained = bool(path)
+        self._onnx = None
+        if path and path.endswith(".onnx"):
+            import onnxruntime as ort  # optional dependency
+            self._onnx = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+            self.source = path
+        elif path:
+            with np.load(path, allow_pickle=False) as z:
+                self.W = z["W"].astype(np.float32)
+                self.b = z["b"].astype(np.float32)
+                if "labels" in z:
+                    self.labels = tuple(str(s) for s in z["labels"])
+            self.source = path
+        self.load_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        """(B, S, S, 3) uint8 -> (B, C) class probabilities."""
+        if self._onnx is not None:
+            inp = self._onnx.get_inputs()[0].name
+            logits = self._onnx.run(None, {inp: batch.astype(np.float32) * (1.0 / 255.0)})[0]
+            return _softmax(np.asarray(logits, dtype=np.float32))
+        return _softmax(extract_features(batch) @ self.W + self.b)
+
+    def reported(self, p: float) -> float:
+        """Confidence as reported to callers: capped for the untrained heuristic."""
+        return round(float(p) if self.trained else min(float(p), HEURISTIC_MAX_CONF), 3)
+
+    def result_source(self) -> str:
+        return "local_classifier" if self.trained else "heuristic"
+
+
+class _MicroBatcher:
+    """
+    Groups concurrent classify() calls arriving within BATCH_WINDOW_MS into one
+    forward pass. Callers decode/resize on their own thread (Pillow releases the
+    GIL), the worker thread only stacks arrays and runs the model.
+    """
+
+    def __init__(self, model: LeafClassifier):
+        self.model = model
+        self._q: "queue.Queue[Tuple[np.ndarray, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "images": 0, "max_batch": 0, "forward_ms": 0.0, "latency_ms": 0.0}
+        threading.Thread(target=self._loop, name="leaf-batcher", daemon=True).start()
+
+    def submit(self, arr: np.ndarray) -> Future:
+        fut: Future = Future()
+        self._q.put((arr, fut, time.perf_counter()))
+        return fut
+
+    def _loop(self) -> None:
+        while True:
+            items = [self._q.get()]
+            deadline = time.perf_counter() + BATCH_WINDOW_MS / 1000.0
+            while len(items) < MAX_BATCH:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run(items)
+
+    def _run(self, items: List[Tuple[np.ndarray, Future, float]]) -> None:
+        start = time.perf_counter()
+        try:
+            probs = self.model.forward(np.stack([a for a, _, _ in items]))
+        except Exception as e:
+            for _, fut, _ in items:
+                fut.set_exception(e)
+            return
+        done = time.perf_counter()
+        for (_, fut, queued), p in zip(items, probs):
+            fut.set_result(p)
+        with self._lock:
+            s = self.stats
+            s["batches"] += 1
+            s["images"] += len(items)
+            s["max_batch"] = max(s["max_batch"], len(items))
+            s["forward_ms"] += (done - start) * 1000
+            s["latency_ms"] += sum((done - q) * 1000 for _, _, q in items)
+
+
+_BATCHER: Optional[_MicroBatcher] = None
+_BATCHER_LOCK = threading.Lock()
+
+
+def _batcher() -> _MicroBatcher:
+    global _BATCHER
+    if _BATCHER is None:
+        with _BATCHER_LOCK:
+            if _BATCHER is None:
+                _BATCHER = _MicroBatcher(LeafClassifier())
+    return _BATCHER
+
+
+_DECODE_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def _decode_pool() -> ThreadPoolExecutor:
+    global _DECODE_POOL
+    if _DECODE_POOL is None:
+        with _BATCHER_LOCK:
+            if _DECODE_POOL is None:
+                _DECODE_POOL = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="leaf-decode")
+    return _DECODE_POOL
+
+
+def resolve_image_path(image_ref: Optional[str]) -> Optional[Path]:
+    """file:// URIs and absolute paths (what /upload returns); None if not readable here."""
+    if not image_ref or not isinstance(image_ref, str):
+        return None
+    p: Optional[Path] = None
+    if image_ref.startswith("file://"):
+        p = Path(image_ref.replace("file://", "", 1))
+    elif image_ref.startswith("/"):
+        p = Path(image_ref)
+    return p if p and p.is_file() else None
+
+
+def classify(path: str, timeout: float = 10.0) -> Dict[str, Any]:
+    """Diagnose one leaf photo via the shared micro-batcher."""
+    start = time.perf_counter()
+    arr = load_image(path)
+    b = _batcher()
+    probs = b.submit(arr).result(timeout=timeout)
+    order = np.argsort(probs)[::-1]
+    labels, m = b.model.labels, b.model
+    return {
+        "disease": labels[int(order[0])],
+        "confidence": m.reported(probs[order[0]]),
+        "source": m.result_source(),
+        "top": [{"label": labels[int(i)], "p": m.reported(probs[i])} for i in order[:3]],
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def _safe_load(path: str) -> Any:
+    try:
+        return load_image(path)
+    except Exception as e:
+        return e
+
+
+def classify_many(paths: Sequence[str], timeout: float = 10.0, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Diagnose all photos of one turn: decode in parallel, reuse cached diagnoses of
+    near-duplicate photos (perceptual hash), enqueue the rest together so the
+    batcher runs them as one forward pass, then fuse. The fused distribution is the
+    confidence-weighted mean of the per-image distributions.
+    """
+    from .phash import diagnosis_cache, image_hashes
+
+    start = time.perf_counter()
+    arrays = list(_decode_pool().map(_safe_load, paths)) if len(paths) > 1 else [_safe_load(p) for p in paths]
+    b = _batcher()
+    labels = b.model.labels
+    cache = diagnosis_cache() if use_cache else None
+    hashes: Dict[int, Tuple[int, int]] = {}
+    cached: Dict[int, Dict[str, Any]] = {}
+    if cache is not None:
+        for i, a in enumerate(arrays):
+            if isinstance(a, Exception):
+                continue
+            try:
+                hashes[i] = image_hashes(a)
+                hit = cache.get(hashes[i])
+            except Exception:
+                continue
+            if hit and tuple(hit.get("labels", ())) == labels:
+                cached[i] = hit
+    futs = {i: b.submit(a) for i, a in enumerate(arrays) if not isinstance(a, Exception) and i not in cached}
+
+    images: List[Dict[str, Any]] = []
+    weighted = np.zeros(len(labels), dtype=np.float64)
+    total_w = 0.0
+    for i, path in enumerate(paths):
+        if isinstance(arrays[i], Exception):
+            images.append({"path": path, "error": f"{type(arrays[i]).__name__}: {arrays[i]}"})
+            continue
+        if i in cached:
+            probs = np.asarray(cached[i]["probs"], dtype=np.float64)
+        else:
+            probs = futs[i].result(timeout=timeout)
+        k = int(np.argmax(probs))
+        conf = float(probs[k])
+        weighted += conf * probs
+        total_w += conf
+        im = {"path": path, "disease": labels[k], "confidence": b.model.reported(conf)}
+        if i in cached:
+            im.update(cached=True, match_distance=cached[i]["match_distance"])
+        elif i in hashes:
+            try:
+                cache.put(hashes[i], {"labels": list(labels), "probs": [round(float(p), 5) for p in probs],
+                                      "heuristic": not b.model.trained})
+            except Exception:
+                pass
+        images.append(im)
+
+    out: Dict[str, Any] = {"disease": "unknown", "confidence": 0.0, "images": images, "top": [],
+                           "source": b.model.result_source()}
+    if total_w > 0:
+        fused = weighted / total_w
+        order = np.argsort(fused)[::-1]
+        out["disease"] = labels[int(order[0])]
+        out["confidence"] = b.model.reported(fused[order[0]])
+        out["top"] = [{"label": labels[int(i)], "p": b.model.reported(fused[i])} for i in order[:3]]
+        ok = [im for im in images if "disease" in im]
+        out["agreement"] = round(sum(im["disease"] == out["disease"] for im in ok) / len(ok), 3)
+    if cache is not None:
+        out["cache_hits"] = len(cached)
+    out["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return out
+
+
+def classifier_stats() -> Dict[str, Any]:
+    """Model load time, batch sizes and per-image latency since process start."""
+    b = _BATCHER
+    if b is None:
+        return {"loaded": False}
+    with b._lock:
+        s = dict(b.stats)
+    n = s["images"] or 1
+    return {
+        "loaded": True,
+        "model": b.model.source,
+        "model_load_ms": b.model.load_ms,
+        "batches": s["batches"],
+        "images": s["images"],
+        "avg_batch": round(s["images"] / (s["batches"] or 1), 2),
+        "max_batch": s["max_batch"],
+        "avg_forward_ms": round(s["forward_ms"] / (s["batches"] or 1), 3),
+        "avg_image_latency_ms": round(s["latency_ms"] / n, 3),
+    }
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python -m src.agent.vision.leaf_classifier [--threads N] [image ...]
+    import argparse, json, tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("images", nargs="*")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=256)
+    ap.add_argument("--per-turn", type=int, nargs="*", help="also time classify_many for these image counts")
+    a = ap.parse_args()
+
+    paths = list(a.images)
+    if not paths:
+        from PIL import Image
+        rng = np.random.default_rng(0)
+        tmp = tempfile.mkdtemp(prefix="leafbench-")
+        for i in range(8):
+            p = os.path.join(tmp, f"leaf{i}.jpg")
+            Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(p)
+            paths.append(p)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(a.threads) as ex:
+        lat = sorted(r["latency_ms"] for r in ex.map(classify, (paths[i % len(paths)] for i in range(a.requests))))
+    wall = time.perf_counter() - t0
+    print(json.dumps({
+        **classifier_stats(),
+        "requests": a.requests,
+        "throughput_rps": round(a.requests / wall, 1),
+        "p50_ms": lat[len(lat) // 2],
+        "p95_ms": lat[int(len(lat) * 0.95) - 1],
+    }, indent=2))
+
+    for n in a.per_turn or []:
+        batch = [paths[i % len(paths)] for i in range(n)]
+        runs = sorted(classify_many(batch, use_cache=False)["latency_ms"] for _ in range(20))
+        print(f"classify_many images={n:<3} p50_ms={runs[len(runs) // 2]}")
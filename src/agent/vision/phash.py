@@ -0,0 +1,203 @@
+from __future__ import annotations
+import json, os, sqlite3, threading, time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Perceptual-hash diagnosis cache: resent or slightly recropped leaf photos reuse
+# the earlier diagnosis instead of paying for classification / vision tokens again.
+#
+# Each image gets a 64-bit pHash (DCT of the 32×32 luminance) and a 64-bit dHash
+# (horizontal gradient). A lookup is one vectorized XOR + popcount over all live
+# entries: pHash within PHASH_MAX_DISTANCE, confirmed by dHash. Entries live in a
+# small sqlite file so the UI process and the agent process share them; each
+# process keeps its own in-memory columns and pulls new rows every PHASH_SYNC_S.
+CACHE_DB = os.getenv("PHASH_CACHE_DB", "/tmp/farmagent/diagnosis_cache.sqlite")
+MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "10"))
+DHASH_MAX_DISTANCE = int(os.getenv("DHASH_MAX_DISTANCE", "16"))
+TTL_S = float(os.getenv("PHASH_TTL_S", str(7 * 24 * 3600)))
+SYNC_S = float(os.getenv("PHASH_SYNC_S", "1"))
+ENABLED = os.getenv("PHASH_CACHE", "true").lower() == "true"
+
+_N = 32
+# Orthonormal DCT-II basis, only the 8 lowest frequencies are used
+_DCT = (np.sqrt(2.0 / _N) * np.cos(np.pi * (2 * np.arange(_N)[None, :] + 1) * np.arange(8)[:, None] / (2 * _N)))
+_DCT[0] /= np.sqrt(2.0)
+_BITS = (1 << np.arange(64, dtype=np.uint64)).astype(np.uint64)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int((bits.ravel().astype(np.uint64) * _BITS).sum())
+
+
+def _gray(arr: np.ndarray) -> np.ndarray:
+    a = arr.astype(np.float32)
+    return a[..., 0] * 0.299 + a[..., 1] * 0.587 + a[..., 2] * 0.114 if a.ndim == 3 else a
+
+
+def _block_mean(g: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    r = np.linspace(0, g.shape[0], rows + 1).astype(int)[:-1]
+    c = np.linspace(0, g.shape[1], cols + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(g, r, axis=0), c, axis=1)
+    counts = np.outer(np.diff(np.append(r, g.shape[0])), np.diff(np.append(c, g.shape[1])))
+    return sums / counts
+
+
+def image_hashes(arr: np.ndarray) -> Tuple[int, int]:
+    """(pHash, dHash) of an (H, W[, 3]) uint8 image, e.g. the classifier's decoded input."""
+    g = _gray(arr)
+    small = _block_mean(g, _N, _N) if g.shape != (_N, _N) else g
+    low = _DCT @ small @ _DCT.T                       # 8×8 lowest frequencies
+    coeffs = low.ravel()
+    ph = _pack(low > np.median(coeffs[1:]))           # DC term excluded from the median
+    d = _block_mean(g, 8, 9)
+    return ph, _pack(d[:, 1:] > d[:, :-1])
+
+
+def hash_file(path: str) -> Tuple[int, int]:
+    from .leaf_classifier import load_image
+    return image_hashes(load_image(path))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class DiagnosisCache:
+    def __init__(self, path: str = CACHE_DB, ttl_s: float = TTL_S):
+        self.path, self.ttl_s = path, ttl_s
+        self._lock = threading.Lock()
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._ph = np.zeros(0, dtype=np.uint64)
+        self._dh = np.zeros(0, dtype=np.uint64)
+        self._ts = np.zeros(0, dtype=np.float64)
+        self._results: Dict[int, Dict[str, Any]] = {}
+        self._last_id = 0
+        self._synced = 0.0
+        self.stats = {"hits": 0, "misses": 0, "puts": 0}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS diagnosis (id INTEGER PRIMARY KEY, phash TEXT, dhash TEXT, ts REAL, result TEXT)")
+        self._db.execute("DELETE FROM diagnosis WHERE ts < ?", (time.time() - ttl_s,))
+
+    def _sync(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._synced < SYNC_S:
+            return
+        self._synced = now
+        rows = self._db.execute(
+            "SELECT id, phash, dhash, ts, result FROM diagnosis WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+        if rows:
+            self._ids = np.concatenate([self._ids, np.array([r[0] for r in rows], dtype=np.int64)])
+            self._ph = np.concatenate([self._ph, np.array([int(r[1], 16) for r in rows], dtype=np.uint64)])
+            self._dh = np.concatenate([self._dh, np.array([int(r[2], 16) for r in rows], dtype=np.uint64)])
+            self._ts = np.concatenate([self._ts, np.array([r[3] for r in rows], dtype=np.float64)])
+            self._results.update((r[0], json.loads(r[4])) for r in rows)
+            self._last_id = rows[-1][0]
+        # Expired rows are masked out on lookup and dropped once they are most of the columns
+        live = self._ts >= time.time() - self.ttl_s
+        if len(live) > 1024 and live.sum() < len(live) // 2:
+            for rid in self._ids[~live].tolist():
+                self._results.pop(rid, None)
+            self._ids, self._ph, self._dh, self._ts = self._ids[live], self._ph[live], self._dh[live], self._ts[live]
+            self._db.execute("DELETE FROM diagnosis WHERE ts < ?", (time.time() - self.ttl_s,))
+
+    def get(self, hashes: Tuple[int, int], max_distance: int = MAX_DISTANCE) -> Optional[Dict[str, Any]]:
+        """Most similar live entry (newest on ties): its result plus 'match_distance', or None."""
+        ph, dh = hashes
+        with self._lock:
+            self._sync()
+            d = np.bitwise_count(self._ph ^ np.uint64(ph))
+            ok = (d <= max_distance) & (np.bitwise_count(self._dh ^ np.uint64(dh)) <= DHASH_MAX_DISTANCE) \
+                & (self._ts >= time.time() - self.ttl_s)
+            idx = np.flatnonzero(ok)
+            self.stats["hits" if len(idx) else "misses"] += 1
+            if not len(idx):
+                return None
+            best = idx[np.lexsort((-self._ids[idx], d[idx]))[0]]
+            return {**self._results[int(self._ids[best])], "match_distance": int(d[best])}
+
+    def put(self, hashes: Tuple[int, int], result: Dict[str, Any]) -> None:
+        ph, dh = hashes
+        with self._lock:
+            self._db.execute("INSERT INTO diagnosis (phash, dhash, ts, result) VALUES (?, ?, ?, ?)",
+                             (f"{ph:016x}", f"{dh:016x}", time.time(), json.dumps(result)))
+            self.stats["puts"] += 1
+            self._sync(force=True)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "entries": len(self._ids), "hit_rate": round(self.stats["hits"] / n, 3) if n else 0.0,
+                    "max_distance": MAX_DISTANCE, "ttl_s": self.ttl_s, "path": self.path}
+
+
+_CACHE: Optional[DiagnosisCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def diagnosis_cache() -> Optional[DiagnosisCache]:
+    """Process-wide cache, or None when disabled (PHASH_CACHE=false) or the db is unavailable."""
+    global _CACHE
+    if _CACHE is None and ENABLED:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                try:
+                    _CACHE = DiagnosisCache()
+                except Exception:
+                    return None
+    return _CACHE
+
+
+def lookup_file(path: str) -> Optional[Dict[str, Any]]:
+    """Cached diagnosis for a near-duplicate of the photo at path (gateway use)."""
+    cache = diagnosis_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(hash_file(path))
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    # python -m src.agent.vision.phash [--entries N] : hash speed, lookup latency, recrop robustness
+    import argparse, tempfile
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=20_000)
+    ap.add_argument("--lookups", type=int, default=2_000)
+    a = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = np.clip(rng.normal(0, 1, (120, 160, 3)).cumsum(0).cumsum(1) * 4 + 128, 0, 255).astype(np.uint8)
+    t0 = time.perf_counter()
+    h0 = image_hashes(base)
+    for _ in range(200):
+        image_hashes(base)
+    hash_us = (time.perf_counter() - t0) / 201 * 1e6
+    crop = base[4:-4, 6:-6]
+    noisy = np.clip(base.astype(int) + rng.integers(-8, 9, base.shape), 0, 255).astype(np.uint8)
+    other = np.clip(rng.normal(0, 1, (120, 160, 3)).cumsum(0).cumsum(1) * 4 + 128, 0, 255).astype(np.uint8)
+
+    cache = DiagnosisCache(os.path.join(tempfile.mkdtemp(prefix="phash-"), "bench.sqlite"))
+    hashes = [(int(x), int(y)) for x, y in rng.integers(0, 2**63, (a.entries, 2), dtype=np.int64)]
+    with cache._db:
+        cache._db.executemany("INSERT INTO diagnosis (phash, dhash, ts, result) VALUES (?, ?, ?, '{}')",
+                              [(f"{p:016x}", f"{d:016x}", time.time()) for p, d in hashes])
+    cache.put(h0, {"disease": "leaf_spot"})
+    t0 = time.perf_counter()
+    for i in range(a.lookups):
+        cache.get(hashes[i % len(hashes)])
+    lookup_us = (time.perf_counter() - t0) / a.lookups * 1e6
+    print(json.dumps({
+        "hash_us": round(hash_us, 1), "entries": a.entries + 1, "lookup_us": round(lookup_us, 1),
+        "distance_recrop": hamming(h0[0], image_hashes(crop)[0]),
+        "distance_noise": hamming(h0[0], image_hashes(noisy)[0]),
+        "distance_unrelated": hamming(h0[0], image_hashes(other)[0]),
+        "recrop_hit": cache.get(image_hashes(crop)) is not None,
+        "unrelated_hit": cache.get(image_hashes(other)) is not None,
+    }, indent=2))
@@ -0,0 +1,48 @@
+import threading
+import time
+
+import pytest
+
+from frontend.admission import PRIORITY_IMAGE, PRIORITY_TEXT, AdmissionController, Rejected
+
+
+def _controller(timeout_s=5.0):
+    return AdmissionController(initial=1, min_limit=1, max_limit=1, queue_max=4, queue_timeout_s=timeout_s)
+
+
+def _wait_queued(ctl, n):
+    deadline = time.monotonic() + 5
+    while ctl.metrics()["queue_depth"] < n:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_slot_times_out_with_503():
+    ctl = _controller(timeout_s=0.1)
+    with ctl.slot():
+        with pytest.raises(Rejected) as exc:
+            with ctl.slot():
+                pass
+    assert exc.value.status == 503
+    m = ctl.metrics()
+    assert m["rejected_timeout"] == 1 and m["queue_depth"] == 0 and m["in_flight"] == 0
+
+
+def test_text_turns_are_admitted_before_image_turns():
+    ctl = _controller()
+    order = []
+
+    def turn(name, priority):
+        with ctl.slot(priority):
+            order.append(name)
+
+    with ctl.slot():
+        image = threading.Thread(target=turn, args=("image", PRIORITY_IMAGE))
+        image.start()
+        _wait_queued(ctl, 1)
+        text = threading.Thread(target=turn, args=("text", PRIORITY_TEXT))
+        text.start()
+        _wait_queued(ctl, 2)
+    image.join(5)
+    text.join(5)
+    assert order == ["text", "image"]
@@ -0,0 +1,48 @@
+import pytest
+
+from src.agent.data.crops import extract_crop, resolve_crop
+
+QUALITY_GATE = 0.6
+
+
+@pytest.mark.parametrize("text", [
+    "Give me a plan",
+    "best time to apply urea",
+    "which variety is best",
+    "my farm near nagpur",
+    "I want to know the mandi rate",
+    "the leaves are curling and turning pale",
+    "rabi season",
+    "is it the same problem as last week",
+    "prices rose this week",
+    "paani jama hai in field",
+])
+def test_ordinary_words_are_not_crops(text):
+    assert extract_crop(text) is None
+
+
+@pytest.mark.parametrize("text, crop", [
+    ("gehun ki fasal", "wheat"),
+    ("tomatoes in my field", "tomato"),
+    ("my til crop has spots", "sesame"),
+    ("गेहूं", "wheat"),
+])
+def test_exact_and_regional_names(text, crop):
+    assert extract_crop(text)["crop"] == crop
+
+
+@pytest.mark.parametrize("text, crop", [
+    ("my tomatto crop has spots", "tomato"),
+    ("cauliflwer leaves are yellow", "cauliflower"),
+    ("groundnutt field", "groundnut"),
+    ("tomatto", "tomato"),
+])
+def test_misspellings_in_crop_context_stay_below_the_gate(text, crop):
+    hit = extract_crop(text)
+    assert hit["crop"] == crop and hit["method"] == "fuzzy"
+    assert hit["confidence"] < QUALITY_GATE
+
+
+def test_resolve_single_name():
+    assert resolve_crop("Paddy")["crop"] == "rice"
+    assert resolve_crop("brinjl")["confidence"] < QUALITY_GATE
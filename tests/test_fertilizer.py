@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from src.agent.data.fertilizer import GRADES, fertilizer_table, recommend, recommend_batch
+
+
+@pytest.mark.parametrize("crop, row", [
+    ("rice", "rice"), ("Paddy", "rice"), ("jowar", "sorghum"), ("guava", "category:fruit"),
+    ("cumin", "category:spice"), ("unknownium", "default"), (None, "default"),
+])
+def test_crop_rows_fall_back_to_category_then_default(crop, row):
+    t = fertilizer_table()
+    assert t.rows[t.crop_row(crop)] == row
+
+
+def test_unknown_soil_gives_the_reference_rates():
+    out = recommend("rice")
+    assert out["npk_kg_ha"] == {"N": 120.0, "P2O5": 60.0, "K2O": 40.0}
+    assert out["bands"] == {"ph": "unknown", "nitrogen": "unknown", "organic_matter": "unknown"}
+    assert out["yield_factor"] == 1.0 and out["amendment"] is None
+    # Urea tops up the N that DAP already supplies
+    assert out["products_kg_ha"] == {"urea": 209.8, "dap": 130.4, "mop": 66.7}
+
+
+def test_soil_bands_and_yield_scale_the_rates():
+    poor = recommend("rice", ph=5.2, nitrogen=200, organic_matter_pct=0.6, target_yield=10)
+    assert poor["bands"] == {"ph": "acidic", "nitrogen": "low", "organic_matter": "low"}
+    assert poor["yield_factor"] == 1.5   # 10 t/ha against 5 t/ha, clipped
+    assert poor["npk_kg_ha"]["N"] == pytest.approx(120 * 1.25 * 1.1 * 1.5, abs=0.5)
+    assert poor["amendment"].startswith("apply agricultural lime")
+    rich = recommend("rice", ph=7.0, nitrogen=700, organic_matter_pct=2.0)
+    assert rich["npk_kg_ha"]["N"] == pytest.approx(120 * 0.75 * 0.9, abs=0.5)
+
+
+def test_batch_matches_single_recommendations():
+    crops = ["rice", "tomato", None, "guava", "wheat"]
+    ph = [5.0, None, 7.0, 8.7, np.nan]
+    n = np.array([200.0, 400.0, 600.0, np.nan, 300.0])
+    batch = recommend_batch(crops, ph, n, 1.0, [5.0, 40.0, None, 30.0, 0.0])
+    for i, crop in enumerate(crops):
+        one = recommend(crop, ph[i], None if np.isnan(n[i]) else n[i], 1.0, [5.0, 40.0, None, 30.0, 0.0][i])
+        assert one["npk_kg_ha"]["N"] == round(float(batch["N"][i]), 1)
+        assert one["npk_ratio"] == GRADES[int(batch["grade"][i])]
+    assert batch["yield_factor"][4] == 1.0   # non-positive target yields are ignored
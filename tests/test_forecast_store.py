@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from src.agent.data import forecast_store as fs
+
+ISSUED = 1_700_000_000.0
+
+
+@pytest.fixture
+def snap(tmp_path):
+    # 3 hourly steps over a 2x2 grid of 1-degree cells, NW corner at (30N, 70E); step t is 20 + t everywhere
+    temp = np.stack([np.full((2, 2), 20.0 + t) for t in range(3)])
+    temp[0, 0, 1] = 30.0
+    rain = np.full((3, 2, 2), 0.7)
+    root = fs.publish(str(tmp_path), {"temp_c": temp, "rain_prob": rain},
+                      {"north": 30.0, "west": 70.0, "cell": 1.0, "issued": ISSUED})
+    return fs.ForecastSnapshot(root)
+
+
+def test_step_for_rounds_to_the_nearest_step_and_stops_at_the_horizon(snap):
+    assert snap.step_for(ISSUED - 7200) == 0
+    assert snap.step_for(ISSUED + 5400) == 2     # 1.5 h rounds to the 2 h step
+    assert snap.step_for(ISSUED + 2 * 3600 + 1700) == 2
+    assert snap.step_for(ISSUED + 3 * 3600) is None
+    assert snap.step_for(ISSUED + 30 * 86400) is None
+
+
+def test_lookup_is_bilinear_between_cell_centres(snap):
+    centre = snap.lookup(29.5, 70.5, when=ISSUED)
+    assert centre["temp_c"] == 20.0 and centre["rain_prob"] == 0.7 and centre["summary"] == "rain likely"
+    assert snap.lookup(29.5, 71.0, when=ISSUED)["temp_c"] == 25.0   # halfway to the 30.0 cell
+    assert snap.lookup(29.5, 70.5, when=ISSUED + 3600)["temp_c"] == 21.0
+
+
+def test_outside_the_grid_or_past_the_horizon_is_none(snap):
+    assert snap.lookup(35.0, 70.5, when=ISSUED) is None
+    assert snap.lookup(29.5, 70.5, when=ISSUED + 6 * 3600) is None
+    vals = snap.sample([29.5, 28.5], [70.5, 71.5], when=ISSUED + 6 * 3600)
+    assert all(np.isnan(v).all() and v.shape == (2,) for v in vals.values())
+
+
+def test_store_follows_current_after_publish(tmp_path, monkeypatch):
+    monkeypatch.setattr(fs, "FORECAST_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(fs, "FORECAST_CHECK_S", 0.0)
+    monkeypatch.setattr(fs, "_SNAPSHOT", None)
+    monkeypatch.setattr(fs, "_SNAPSHOT_TARGET", None)
+    meta = {"north": 30.0, "west": 70.0, "cell": 1.0}
+    fs.publish(str(tmp_path), {"temp_c": np.full((2, 2), 18.0), "rain_prob": np.zeros((2, 2))}, meta)
+    assert fs.lookup_batch([29.5], [70.5])[0]["temp_c"] == 18.0
+    fs.publish(str(tmp_path), {"temp_c": np.full((2, 2), 24.0), "rain_prob": np.zeros((2, 2))}, meta)
+    assert fs.lookup_batch([29.5], [70.5])[0]["temp_c"] == 24.0
@@ -0,0 +1,65 @@
+import pytest
+
+from src.agent.data.gazetteer import Gazetteer, extract_location, parse_coords, resolve_location, resolve_turn
+
+
+def _id(hit):
+    return hit and (hit["id"], hit["method"])
+
+
+@pytest.mark.parametrize("text, want", [
+    ("Pune", ("in:mh:pune", "exact")),
+    ("Poona, MH", ("in:mh:pune", "exact")),
+    ("Nashk", ("in:mh:nashik", "fuzzy")),
+    ("in:mh:pune", ("in:mh:pune", "id")),
+    ("18.52, 73.85", ("geo:18.520,73.850", "coords")),
+    ("", None),
+])
+def test_resolve_explicit_locations(text, want):
+    assert _id(resolve_location(text)) == want
+
+
+@pytest.mark.parametrize("text, want", [
+    ("kya hua, gaya?", None),                       # everyday word, no qualifier
+    ("Anand ka khet sookh raha hai", None),         # a given name
+    ("weather in gaya", ("in:br:gaya", "qualified")),
+    ("gaya district mein baarish", ("in:br:gaya", "qualified")),
+    ("Gaya Bihar ka mausam", ("in:br:gaya", "qualified")),
+    ("rain near Hassan", ("in:ka:hassan", "qualified")),
+    ("tomato prices pune", ("in:mh:pune", "text")),
+    ("in maha", ("in:mh", "qualified")),
+])
+def test_extract_requires_qualifiers_for_ambiguous_names(text, want):
+    assert _id(extract_location(text)) == want
+
+
+def test_duplicate_names_pick_by_state(tmp_path):
+    tsv = tmp_path / "places.tsv"
+    tsv.write_text("\n".join("\t".join(row) for row in [
+        ("in:mh", "Maharashtra", "state", "MH", "19.6", "75.5", "mh"),
+        ("in:br", "Bihar", "state", "BR", "25.6", "85.1", "br"),
+        ("in:mh:aurangabad", "Aurangabad", "district", "MH", "19.88", "75.34", ""),
+        ("in:br:aurangabad", "Aurangabad", "district", "BR", "24.75", "84.37", ""),
+    ]) + "\n")
+    g = Gazetteer([tsv])
+    assert g.resolve("Aurangabad")["id"] == "in:mh:aurangabad"          # first definition
+    assert g.resolve("Aurangabad, BR")["id"] == "in:br:aurangabad"
+    assert g.resolve("Aurangabad / Bihar")["id"] == "in:br:aurangabad"
+    assert g.extract("paddy in Aurangabad, Bihar")["id"] == "in:br:aurangabad"
+
+
+def test_parse_coords_rejects_out_of_range():
+    assert parse_coords("18.5 73.8") == (18.5, 73.8)
+    assert parse_coords("91, 10") is None and parse_coords("pune") is None
+
+
+def test_resolve_turn_keeps_the_session_location_over_bare_mentions():
+    state = {"location": "in:mh:pune"}
+    assert resolve_turn(state, "tomato prices pune vs nashik")["id"] == "in:mh:pune"
+    assert resolve_turn(state, "what about weather in Nashik")["id"] == "in:mh:nashik"
+    assert state["location"] == "in:mh:nashik" and state["location_resolved"]["method"] == "qualified"
+
+    fresh = {}
+    assert resolve_turn(fresh, "nashik onion rates")["id"] == "in:mh:nashik"   # bare mention fills an empty slot
+    assert resolve_turn({}, "kya hua") is None
+    assert resolve_turn({"location": "Poona"})["id"] == "in:mh:pune"
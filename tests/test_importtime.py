@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cold_start_imports_stay_within_budget():
+    # Fresh interpreters, so the result doesn't depend on what the test session already imported.
+    # On a slow machine set IMPORT_BUDGET_SCALE rather than loosening the budgets.
+    proc = subprocess.run([sys.executable, "importtime_budget.py", "--runs", "2"], cwd=ROOT,
+                          capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr[-2000:]
@@ -0,0 +1,79 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from frontend.jobs import JobQueue
+
+
+def _insert(path, rows):
+    db = sqlite3.connect(path)
+    db.executemany("INSERT INTO jobs (id, status, created, started, owner, lease, request) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)", [(*r, json.dumps({"q": r[0]})) for r in rows])
+    db.commit()
+    db.close()
+
+
+def _wait_done(jobs, job_id):
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id)["status"] != "done":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_recover_requeues_queued_and_fails_running(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    JobQueue(lambda r: r, path=path, workers=1)   # creates the table
+    now = time.time()
+    _insert(path, [("ran", "running", now, now, "old-boot", now - 1),
+                   ("waiting", "queued", now, None, "old-boot", now - 1)])
+
+    seen = []
+    jobs = JobQueue(lambda r: seen.append(r["q"]) or {"answer": r["q"]}, path=path, workers=1)
+    _wait_done(jobs, "waiting")
+
+    assert jobs.get("waiting")["result"] == {"answer": "waiting"}
+    ran = jobs.get("ran")
+    assert ran["status"] == "error" and ran["error"] == "interrupted by restart"
+    assert seen == ["waiting"]
+
+
+def test_live_lease_is_left_alone_whatever_the_owner(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    JobQueue(lambda r: r, path=path, workers=1)
+    now = time.time()
+    # A restarted worker can get its predecessor's PID back; ownership is the lease, not the PID
+    _insert(path, [("reused-pid", "queued", now, None, str(os.getpid()), None),
+                   ("sibling", "running", now, now, "live-boot", now + 60)])
+
+    jobs = JobQueue(lambda r: {"answer": r["q"]}, path=path, workers=1)
+    _wait_done(jobs, "reused-pid")
+    assert jobs.get("sibling")["status"] == "running"
+
+
+def test_heartbeat_renews_lease_of_running_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    release = threading.Event()
+    jobs = JobQueue(lambda r: release.wait(5) and {}, path=path, workers=1, lease_s=0.3)
+    job_id = jobs.submit({"q": "slow"})
+    time.sleep(0.8)   # several lease lengths: without renewal the sweep would fail the job
+    lease, = jobs._sql("SELECT lease FROM jobs WHERE id = ?", (job_id,))[0]
+    assert jobs.get(job_id)["status"] == "running" and lease > time.time()
+    release.set()
+    _wait_done(jobs, job_id)
+
+
+def test_pre_lease_table_is_migrated(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT, created REAL, started REAL, "
+               "finished REAL, owner INTEGER, request TEXT, result TEXT, error TEXT)")
+    db.execute("INSERT INTO jobs (id, status, created, owner, request) VALUES ('old', 'queued', ?, 1, '{\"q\": 1}')",
+               (time.time(),))
+    db.commit()
+    db.close()
+
+    jobs = JobQueue(lambda r: {"answer": r["q"]}, path=path, workers=1)
+    _wait_done(jobs, "old")
+    assert jobs.get("old")["result"] == {"answer": 1}
@@ -0,0 +1,70 @@
+import gzip
+import os
+import time
+
+import pytest
+
+from src.agent import journal as jn
+from src.agent.journal import Journal, context_ids, read, segments
+
+
+@pytest.fixture(autouse=True)
+def no_background_flush(monkeypatch):
+    monkeypatch.setattr(jn, "FLUSH_MS", 1e9)   # the writer thread never wakes; tests flush explicitly
+
+
+def test_records_round_trip_through_gzip_segments(tmp_path):
+    j = Journal(tmp_path)
+    j.record("receipt", {"tool": "get_soil_tool", "status": "ok"})
+    j.record("turn", {"ms": 12.5})
+    assert j.flush() == 2
+    j.record("receipt", {"tool": "get_weather_tool", "status": "ok"})
+    assert j.flush() == 1 and j.flush() == 0
+
+    recs = list(read(tmp_path))
+    assert [r["kind"] for r in recs] == ["receipt", "turn", "receipt"]
+    assert recs[0]["tool"] == "get_soil_tool" and recs[0]["pid"] == os.getpid()
+    assert [r["tool"] for r in read(tmp_path, ["receipt"])] == ["get_soil_tool", "get_weather_tool"]
+    assert list(read(tmp_path, since=recs[-1]["ts"] + 1)) == []
+    # One gzip member per batch; the segment still reads as a single gzip file
+    assert len(segments(tmp_path)) == 1 and j.status()["batches"] == 2
+    assert gzip.decompress(segments(tmp_path)[0].read_bytes()).count(b"\n") == 3
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path, monkeypatch):
+    monkeypatch.setattr(jn, "QUEUE_MAX", 2)
+    j = Journal(tmp_path)
+    for i in range(5):
+        j.record("receipt", {"i": i})
+    assert j.stats["dropped"] == 3 and j.flush() == 2
+
+
+def test_segments_rotate_by_size_and_oldest_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(jn, "SEGMENT_BYTES", 1)       # every batch opens a new segment
+    monkeypatch.setattr(jn, "MAX_BYTES", 1)           # keep only the segment being written
+    j, now = Journal(tmp_path), time.time()
+    for i in range(3):
+        monkeypatch.setattr(jn.time, "time", lambda t=now + i: t)   # distinct segment names
+        j.record("receipt", {"i": i})
+        j.flush()
+    assert j.stats["segments"] == 3 and j.stats["pruned"] >= 2
+    assert [r["i"] for r in read(tmp_path)] == [2]
+
+
+def test_truncated_segment_keeps_earlier_records(tmp_path):
+    j = Journal(tmp_path)
+    j.record("receipt", {"i": 1})
+    j.flush()
+    j.record("receipt", {"i": 2})
+    j.flush()
+    seg = segments(tmp_path)[0]
+    seg.write_bytes(seg.read_bytes()[:-10])          # crash mid-write of the last member
+    assert [r["i"] for r in read(tmp_path)] == [1]
+
+
+def test_context_ids():
+    class Ctx:
+        invocation_id = "inv-1"
+        session = type("S", (), {"id": "s-1"})()
+    assert context_ids(Ctx()) == {"session_id": "s-1", "invocation_id": "inv-1"}
+    assert context_ids(None) == {}
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from src.agent.data.market_store import MarketStore, _norm_crop, ingest_csv
+
+
+@pytest.mark.parametrize("name, crop", [
+    ("Paddy(Dhan)(Common)", "rice"),
+    ("Bengal Gram(Gram)(Whole)", "chickpea"),
+    ("Green Chilli", "chilli"),
+    ("Bhindi(Ladies Finger)", "okra"),
+    ("Arhar (Tur/Red Gram)(Whole)", "pigeon pea"),
+])
+def test_agmarknet_commodity_names(name, crop):
+    assert _norm_crop(name) == crop
+
+
+def test_agmarknet_csv_is_found_by_canonical_crop(tmp_path):
+    csv = tmp_path / "prices.csv"
+    csv.write_text("State,District,Market,Commodity,Variety,Arrival_Date,Modal_Price\n"
+                   "Maharashtra,Pune,Pune,Paddy(Dhan)(Common),Other,01/06/2024,2100\n"
+                   "Maharashtra,Pune,Pune,Paddy(Dhan)(Common),Other,02/06/2024,2150\n"
+                   "Bihar,Gaya,Gaya,Bengal Gram(Gram)(Whole),Desi,02/06/2024,5400\n")
+    store = MarketStore(str(tmp_path / "store"))
+    ingest_csv(store, str(csv))
+    assert store.lookup("rice")["samples"] == 2
+    assert store.lookup("chickpea")["avg_price"] == 5400
+
+
+def _rows(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(19000, 19060, n))
+    crops = np.array(["rice", "wheat"], dtype=object)[rng.integers(0, 2, n)]
+    regions = np.array(["pune", "kota"], dtype=object)[rng.integers(0, 2, n)]
+    return days, crops, regions, 1500 + rng.normal(0, 50, n)
+
+
+def _same(a, b):
+    drop = lambda x: {k: v for k, v in x.items() if k != "last_price"}   # same-day order may differ
+    return drop(a) == drop(b)
+
+
+def test_late_rows_are_merged_and_reingest_is_idempotent(tmp_path):
+    days, crops, regions, prices = _rows()
+    store = MarketStore(str(tmp_path / "a"))
+    store.ingest_arrays(days[200:], crops[200:], regions[200:], prices[200:])
+    store.ingest_arrays(days[:300], crops[:300], regions[:300], prices[:300])   # late + overlapping rows
+    store.ingest_arrays(days, crops, regions, prices)                             # full re-ingest
+    ref = MarketStore(str(tmp_path / "b"))
+    ref.ingest_arrays(days, crops, regions, prices)
+    assert store.stats["rows"] == len(days) and store.stats["late_rows"]
+    for crop in ("rice", "wheat"):
+        for region in ("pune", "kota", None):
+            assert _same(store.lookup(crop, region), ref.lookup(crop, region))
+            d, _ = store.series(crop, region)
+            assert (np.diff(d) >= 0).all()
+
+
+@pytest.mark.parametrize("region", ["", "*"])
+def test_row_without_region_is_counted_once(tmp_path, region):
+    store = MarketStore(str(tmp_path))
+    store.ingest_arrays([19000, 19001], ["rice", "rice"], ["pune", "pune"], [2000, 2010])
+    store.ingest_arrays([19002], ["rice"], [region], [2020])
+    assert store.lookup("rice")["samples"] == 3
+    assert len(store.series("rice", "*")[0]) == 3
+
+
+def test_reader_gets_keys_from_the_summary_it_loads(tmp_path):
+    store = MarketStore(str(tmp_path))
+    store.ingest_arrays([19000], ["rice"], ["pune"], [2000])
+    store.save()
+    store.ingest_arrays([19001], ["wheat"], ["kota"], [2300])
+    store.save()
+    (tmp_path / "keys.json").write_text('{"keys": {}}')   # a stale keys.json is not consulted
+    reader = MarketStore(str(tmp_path))
+    assert reader.lookup("wheat", "kota")["samples"] == 1
+    assert reader.lookup("rice", "pune")["samples"] == 1
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.agent.vision import phash
+from src.agent.vision.phash import DiagnosisCache, hamming, hash_file, image_hashes
+
+
+def _leaf(seed):
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal(0, 1, (120, 160, 3)).cumsum(0).cumsum(1) * 4 + 128, 0, 255).astype(np.uint8)
+
+
+def test_recrops_and_noise_stay_close_unrelated_images_do_not():
+    base = _leaf(0)
+    h0 = image_hashes(base)
+    noisy = np.clip(base.astype(int) + np.random.default_rng(1).integers(-8, 9, base.shape), 0, 255).astype(np.uint8)
+    assert hamming(h0[0], image_hashes(base[4:-4, 6:-6])[0]) <= phash.MAX_DISTANCE
+    assert hamming(h0[0], image_hashes(noisy)[0]) <= phash.MAX_DISTANCE
+    assert hamming(h0[0], image_hashes(_leaf(2))[0]) > 2 * phash.MAX_DISTANCE
+
+
+def test_hash_file_matches_the_decoded_image(tmp_path):
+    path = tmp_path / "leaf.png"
+    Image.fromarray(_leaf(0)).resize((448, 448)).save(path)
+    from src.agent.vision.leaf_classifier import load_image
+    assert hash_file(str(path)) == image_hashes(load_image(str(path)))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(phash, "SYNC_S", 0.0)
+    return DiagnosisCache(str(tmp_path / "cache.sqlite"))
+
+
+def test_near_duplicate_hits_and_unrelated_misses(cache):
+    base = _leaf(0)
+    cache.put(image_hashes(base), {"disease": "leaf_spot"})
+    hit = cache.get(image_hashes(base[4:-4, 6:-6]))
+    assert hit["disease"] == "leaf_spot" and 0 <= hit["match_distance"] <= phash.MAX_DISTANCE
+    assert cache.get(image_hashes(_leaf(2))) is None
+    assert cache.info()["hits"] == 1 and cache.info()["misses"] == 1
+
+
+def test_closest_then_newest_entry_wins(cache):
+    h = image_hashes(_leaf(0))
+    cache.put(h, {"disease": "old"})
+    cache.put((h[0] ^ 0b111, h[1]), {"disease": "further"})
+    cache.put(h, {"disease": "new"})
+    assert cache.get(h) == {"disease": "new", "match_distance": 0}
+
+
+def test_processes_share_entries_and_expired_ones_are_ignored(cache):
+    other = DiagnosisCache(cache.path)
+    h = image_hashes(_leaf(0))
+    cache.put(h, {"disease": "rust"})
+    assert other.get(h)["disease"] == "rust"
+    expired = DiagnosisCache(cache.path, ttl_s=0.0)
+    assert expired.get(h) is None
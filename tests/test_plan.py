@@ -0,0 +1,58 @@
+import json
+
+from src.agent.plan import Plan, PlanStep, compile_plan, plan_cache_stats
+
+PLAN = {"steps": [{"id": "s1", "tool": "get_weather_tool", "args": {"location": "Pune"}},
+                  {"id": "s2", "tool": "exit_loop_tool_fn"}], "notes": "weather"}
+
+
+def test_encoding_is_canonical_and_round_trips():
+    plan = Plan.from_dict(PLAN)
+    shuffled = {"notes": "weather", "steps": [{"args": {"location": "Pune"}, "tool": "get_weather_tool", "id": "s1"},
+                                              {"tool": "exit_loop_tool_fn", "id": "s2"}]}
+    assert Plan.from_dict(shuffled).encode() == plan.encode()
+    assert " " not in plan.encode()
+    assert Plan.from_dict(json.loads(plan.encode())) == plan
+
+
+def test_malformed_steps_get_defaults():
+    plan = Plan.from_dict({"steps": ["junk", {"tool": "get_soil_tool", "args": "x"}], "notes": None})
+    assert plan.steps == (PlanStep("s1", ""), PlanStep("s2", "get_soil_tool"))
+    assert plan.notes == ""
+
+
+def test_compile_caches_by_content_across_spellings():
+    pretty = json.dumps(PLAN, indent=2) + "\n"
+    first = compile_plan(pretty)
+    before = plan_cache_stats()
+    # Same text, the parsed dict, the Plan and its compact encoding all hit the entry
+    for source in (pretty, PLAN, Plan.from_dict(PLAN), first.encoded):
+        assert compile_plan(source) is first
+    after = plan_cache_stats()
+    assert after["hits"] - before["hits"] == 4 and after["misses"] == before["misses"]
+
+
+def test_quality_gate_is_injected_into_exit_or_optional_only_plans():
+    exit_only = compile_plan({"steps": [{"tool": "exit_loop_tool"}]})
+    assert not exit_only.valid
+    assert [s.tool for s in exit_only.plan.steps] == ["quality_gate_tool", "exit_loop_tool"]
+    optional = compile_plan({"steps": [{"tool": "get_soil_tool", "optional": True}]})
+    assert optional.valid
+    assert [s.tool for s in optional.plan.steps] == ["get_soil_tool", "quality_gate_tool", "exit_loop_tool_fn"]
+    assert [s.tool for s in compile_plan(PLAN).plan.steps] == ["get_weather_tool", "exit_loop_tool_fn"]
+
+
+def test_invalid_input_compiles_to_an_empty_plan():
+    for source in ("not json", "", None, {"steps": [{"tool": "rm_rf_tool"}]}):
+        compiled = compile_plan(source)
+        assert not compiled.valid
+    assert compile_plan("not json").plan == Plan()
+
+
+def test_tools_resolve_once_per_compiled_plan():
+    compiled = compile_plan({"steps": [{"tool": "get_weather_tool"}, {"tool": "get_soil_tool"}], "notes": "resolve"})
+    seen = []
+    resolve = lambda name: seen.append(name) or name.upper()
+    assert [t for _, t in compiled.calls(resolve)] == ["GET_WEATHER_TOOL", "GET_SOIL_TOOL"]
+    compiled.calls(resolve)
+    assert seen == ["get_weather_tool", "get_soil_tool"]
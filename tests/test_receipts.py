@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.agent.tools import utils
+
+
+@pytest.fixture
+def journaled(monkeypatch):
+    records = []
+    monkeypatch.setattr(utils, "record", lambda kind, **fields: records.append((kind, fields)))
+    return records
+
+
+def _ctx():
+    return SimpleNamespace(state={}, invocation_id="inv-1", session=SimpleNamespace(id="s-1"))
+
+
+def test_receipt_reaches_tool_context_state(journaled):
+    ctx = _ctx()
+    utils.log_receipt_safe("get_soil_tool", "ok", {"ph": 6.5}, 0.8, tool_context=ctx)
+    utils.log_receipt_safe("get_weather_tool", "ok", {}, 0.9, tool_context=ctx)
+    assert [r["tool"] for r in ctx.state["receipts"]] == ["get_soil_tool", "get_weather_tool"]
+    assert ctx.state["confidence_score"] == 0.9
+    assert journaled[0][1]["session_id"] == "s-1" and journaled[0][1]["invocation_id"] == "inv-1"
+
+
+def test_bound_turn_is_used_by_plain_tool_functions(journaled):
+    ctx = _ctx()
+    with utils.bind_turn(ctx):
+        utils.log_receipt_safe("crop_id_tool", "success", {"crop": "rice"})
+    utils.log_receipt_safe("crop_id_tool", "success", {})   # outside any turn: journal only
+    assert len(ctx.state["receipts"]) == 1
+    assert journaled[0][1]["invocation_id"] == "inv-1" and "invocation_id" not in journaled[1][1]
+
+
+def test_ids_only_binding_leaves_state_alone(journaled):
+    ctx = _ctx()
+    with utils.bind_turn(ctx, state=False):
+        utils.log_receipt_safe("get_soil_tool", "ok", {})
+    assert "receipts" not in ctx.state and journaled[0][1]["session_id"] == "s-1"
@@ -0,0 +1,52 @@
+import argparse
+
+import replay
+from src.agent.journal import Journal
+
+
+def _report(latency, rps=10.0, errors=0.0, hit_rate=0.5):
+    return {"throughput_rps": rps, "errors": {"rate": errors},
+            "latency_ms": {"turn": {"n": 10, "p50": latency, "p90": latency * 2, "p99": latency * 3},
+                           "schedule_lag": {"n": 10, "p50": 500.0}},
+            "caches": {"plan": {"hit_rate": hit_rate}}}
+
+
+def test_compare_flags_slower_turns_and_lower_hit_rates():
+    rows, regressions = replay.compare(_report(100.0), _report(130.0, hit_rate=0.4), 0.10, 0.02)
+    assert set(regressions) == {"turn.p50", "turn.p90", "turn.p99", "cache.plan.hit_rate"}
+    assert ["turn.p50", "100", "130", "+30.0%", "REGRESSION"] in rows
+    assert not any(r[0].startswith("schedule_lag") for r in rows)
+
+
+def test_compare_ignores_noise_and_improvements():
+    _, regressions = replay.compare(_report(100.0), _report(105.0, rps=12.0, errors=0.01), 0.10, 0.02)
+    assert regressions == []
+    _, regressions = replay.compare(_report(100.0), _report(100.0, rps=8.0), 0.10, 0.02)
+    assert regressions == ["throughput_rps"]
+
+
+def test_compare_handles_zero_and_missing_baselines():
+    base, new = _report(0.0), _report(0.3)
+    new["latency_ms"]["tool:soil"] = {"n": 1, "p50": 3.0}
+    rows, regressions = replay.compare(base, new, 0.10, 0.02)
+    assert regressions == []   # sub-millisecond growth from 0 is noise
+    assert ["tool:soil.p50", "-", "3", "", ""] in rows
+    _, regressions = replay.compare(base, _report(5.0), 0.10, 0.02)
+    assert "turn.p50" in regressions
+
+
+def test_report_counts_one_latency_sample_per_tool_call(tmp_path):
+    j = Journal(tmp_path)
+    for ms in (10, 30):
+        # The tool's own receipt and run_plan's synthetic one describe the same call
+        j.record("receipt", {"tool": "soil", "status": "ok", "output": {"cost_ms": ms - 1}})
+        j.record("receipt", {"tool": "soil", "status": "executed", "output": {"cost_ms": ms, "synthetic": True}})
+    j.record("receipt", {"tool": "soil", "status": "error:ValueError",
+                         "output": {"cost_ms": 50, "synthetic": True}})
+    j.flush()
+
+    a = argparse.Namespace(target="root", trace="t.jsonl", speed=0, concurrency=1, stub_tools=False)
+    results = [{"ok": True, "ms": 12.0, "lag_ms": 0.0}]
+    rep = replay.report(a, [{"t": 0}], results, 1.0, tmp_path, {})
+    assert rep["latency_ms"]["tool:soil"]["n"] == 3
+    assert rep["latency_ms"]["tool:soil"]["max"] == 50
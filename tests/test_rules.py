@@ -0,0 +1,50 @@
+from src.agent.rules import load_rules, rule_set
+
+
+def test_numeric_strings_are_checked_like_numbers():
+    rs = rule_set()
+    as_text, as_number = rs.check({"crop_type": "rice", "soil_ph": "6.5"}), rs.check({"crop_type": "rice", "soil_ph": 6.5})
+    assert as_text["valid"] and as_text["reasons"] == as_number["reasons"]
+    out = rs.check({"crop_type": "rice", "soil_ph": " 9.50 "})
+    assert not out["valid"] and "pH 9.5 outside rice range (5–6.5)." in out["reasons"]
+
+
+def test_non_numeric_values_are_invalid_not_missing():
+    rs = rule_set()
+    out = rs.check({"crop_type": "rice", "soil_ph": "acidic"})
+    assert not out["valid"]
+    assert out["reasons"][0] == "soil_ph 'acidic' is not a number."
+    assert "No checks applied." not in out["reasons"]
+    res = rs.evaluate([{"soil_ph": "acidic"}, {"soil_ph": ""}, {"soil_ph": None}, {"soil_ph": True}])
+    assert res["valid"] == [False, True, True, False]
+    assert res["invalid_fields"] == {"soil_ph": 2}
+    assert res["reasons"][1] == ["No checks applied."]
+
+
+def test_crop_lookup_and_unless_chain():
+    rs = rule_set()
+    ok = rs.check({"crop_type": "Paddy", "soil_ph": 5.2})   # regional name -> rice table (5.0-6.5)
+    assert ok["valid"] and ok["reasons"][0] == "pH 5.2 suits Paddy (5–6.5)."
+    generic = rs.check({"crop_type": "quinoa", "soil_ph": 7.0})   # no table row -> generic range
+    assert generic["valid"] and "pH in healthy range." in generic["reasons"]
+    absurd = rs.check({"soil_ph": 14.0})
+    assert absurd["reasons"][0] == "pH value 14 is not plausible."
+    assert not any("healthy range" in r for r in absurd["reasons"])   # suppressed by ph_plausible:fail
+
+
+def test_warnings_do_not_invalidate():
+    out = rule_set().check({"crop_type": "wheat", "temp_c": 1.0, "rain_prob": 0.8})
+    assert out["valid"]
+    assert "Frost risk at 1°C." in out["reasons"]
+    assert any(r.startswith("Rain likely") for r in out["reasons"])
+
+
+def test_batch_matches_single_record_checks(tmp_path):
+    rs = load_rules()
+    recs = [{"crop_type": c, "soil_ph": ph, "temp_c": t, "n_kg_ha": n}
+            for c, ph, t, n in [("rice", 6.0, 30, 120), ("tea", 7.5, 20, -5), (None, "5.0", None, 700), ("maize", None, 50, 0)]]
+    batch = rs.evaluate(recs)
+    for i, rec in enumerate(recs):
+        one = rs.check(rec)
+        assert (batch["valid"][i], batch["reasons"][i]) == (one["valid"], one["reasons"])
+    assert batch["failed_rules"]["n_nonneg"] == 1
@@ -0,0 +1,49 @@
+import asyncio
+
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+
+from src.agent.session_store import SqliteSessionService
+
+APP, USER, SID = "app", "u", "s"
+
+
+def _turn(svc, session, n):
+    """One turn that appends a receipt the way ADK does: the whole list in the delta."""
+    receipts = list(session.state.get("receipts") or []) + [{"tool": "t", "status": "ok", "n": n}]
+    event = Event(invocation_id=f"inv-{n}", author="agent", actions=EventActions(state_delta={"receipts": receipts}))
+    asyncio.run(svc.append_event(session, event))
+
+
+def test_compaction_offsets_stay_consistent(tmp_path):
+    svc = SqliteSessionService(str(tmp_path / "s.sqlite"), recent_turns=2)
+    session = asyncio.run(svc.create_session(app_name=APP, user_id=USER, session_id=SID, state={"receipts": []}))
+    for n in range(5):
+        # Every turn starts from a fresh read, as the server does between requests
+        session = asyncio.run(svc.get_session(app_name=APP, user_id=USER, session_id=SID))
+        _turn(svc, session, n)
+
+    got = asyncio.run(svc.get_session(app_name=APP, user_id=USER, session_id=SID))
+    offset = got.state["compaction"]["receipts"]
+    listed = [r["n"] for r in got.state["receipts"]]
+    assert listed == list(range(offset, 5))
+    assert offset > 0 and got.state["turn_summaries"]
+
+    # Appending on top of the compacted state stores only the new item
+    _turn(svc, got, 5)
+    again = asyncio.run(svc.get_session(app_name=APP, user_id=USER, session_id=SID))
+    offset = again.state["compaction"]["receipts"]
+    assert [r["n"] for r in again.state["receipts"]] == list(range(offset, 6))
+    assert sum(s["items"].get("receipts", 0) for s in svc.history(APP, USER, SID)) == offset
+
+
+def test_events_outside_the_recent_window_are_pruned(tmp_path):
+    svc = SqliteSessionService(str(tmp_path / "s.sqlite"), recent_turns=2)
+    asyncio.run(svc.create_session(app_name=APP, user_id=USER, session_id=SID, state={"receipts": []}))
+    for n in range(8):
+        session = asyncio.run(svc.get_session(app_name=APP, user_id=USER, session_id=SID))
+        _turn(svc, session, n)
+    turns = [t for (t,) in svc._sql("SELECT DISTINCT turn FROM events ORDER BY turn")]
+    assert turns == [7, 8]   # turn numbers start at 1
+    got = asyncio.run(svc.get_session(app_name=APP, user_id=USER, session_id=SID))
+    assert len(got.events) == 2 and [r["n"] for r in got.state["receipts"]] == [6, 7]
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from src.agent.data.soil_store import SoilStore, build
+
+# 3x4 grid of 0.5-degree cells, lower-left corner at (19N, 73E) -> north edge 20.5N; -9999 is no data
+PH = [[6.0, 6.5, 7.0, 7.5],
+      [5.5, -9999, 8.0, 6.8],
+      [5.0, 5.2, 5.4, -9999]]
+
+
+def _asc(path, values, sep=" "):
+    head = [("ncols", 4), ("nrows", 3), ("xllcorner", 73.0), ("yllcorner", 19.0), ("cellsize", 0.5),
+            ("NODATA_value", -9999)]
+    lines = [f"{k}{sep}{v}" for k, v in head] + [" ".join(str(x) for x in row) for row in values]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    nitrogen = [[v * 40 if v != -9999 else -9999 for v in row] for row in PH]
+    grids = {"ph": _asc(tmp_path / "ph.asc", PH), "nitrogen": _asc(tmp_path / "n.asc", nitrogen, sep="\t")}
+    meta = build(str(tmp_path / "store"), grids)
+    assert meta == {"north": 20.5, "west": 73.0, "cell": 0.5, "nrows": 3, "ncols": 4, "fields": ["ph", "nitrogen"]}
+    return SoilStore(str(tmp_path / "store"))
+
+
+def test_nearest_reads_the_containing_cell(store):
+    rec = store.nearest(20.25, 73.75)   # row 0, col 1
+    assert rec["ph"] == 6.5 and rec["nitrogen"] == 260.0 and rec["cell_distance_km"] == 0.0
+    assert store.nearest(21.0, 73.75) is None and store.nearest(20.0, 72.9) is None
+
+
+def test_no_data_cell_falls_back_to_the_nearest_valid_one(store):
+    rec = store.nearest(19.6, 73.76)   # in the hole at row 1, col 1; closest valid centre is row 2, col 1
+    assert rec["ph"] == 5.2 and rec["cell_distance_km"] > 0
+    assert store.nearest(19.75, 73.75, max_ring=0) is None
+
+
+def test_batch_matches_single_lookups(store):
+    lats, lons = [20.25, 19.6, 19.25, 25.0], [73.75, 73.76, 74.75, 73.1]
+    out = store.batch(lats, lons)
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        rec = store.nearest(lat, lon)
+        assert (rec is None and np.isnan(out["ph"][i])) or out["ph"][i] == pytest.approx(rec["ph"])
+
+
+def test_area_mean_skips_no_data(store):
+    rec = store.area_mean(19.75, 73.75, 60.0)   # the hole and its four edge neighbours (~55 km away)
+    assert rec["cells"] == 5
+    assert rec["ph"] == pytest.approx(np.mean([6.5, 5.5, 8.0, 5.2]), abs=1e-3)
+
+
+def test_mismatched_grids_are_rejected(tmp_path):
+    ok = _asc(tmp_path / "ph.asc", PH)
+    (tmp_path / "bad.asc").write_text(open(ok).read().replace("xllcorner 73.0", "xllcorner 74.0"))
+    with pytest.raises(ValueError):
+        build(str(tmp_path / "store"), {"ph": ok, "nitrogen": str(tmp_path / "bad.asc")})
+    assert not (tmp_path / "store" / "meta.json").exists()
+
+
+def test_points_are_averaged_per_cell(tmp_path):
+    csv = tmp_path / "points.csv"
+    csv.write_text("lat,lon,ph,nitrogen,organic_matter_pct\n"
+                   "18.505,73.805,6.0,200,1.0\n18.501,73.809,7.0,,2.0\n18.515,73.825,5.0,100,0.5\n")
+    build(str(tmp_path / "store"), {}, points=str(csv), cell=0.01)
+    store = SoilStore(str(tmp_path / "store"))
+    rec = store.nearest(18.505, 73.805)
+    assert rec["ph"] == 6.5 and rec["organic_matter_pct"] == 1.5
+    assert store.nearest(18.515, 73.825)["ph"] == 5.0
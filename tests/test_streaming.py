@@ -0,0 +1,63 @@
+import asyncio
+import base64
+import io
+import json
+
+from PIL import Image
+
+from frontend.streaming import InlineFile, JSONStreamBody, inline_image, materialize
+
+
+def _payload(tmp_path):
+    blob = tmp_path / "leaf.bin"
+    blob.write_bytes(bytes(range(256)) * 700)   # spans several CHUNKs, length not a multiple of 3
+    return {"parts": [{"text": "what is this?"}, {"inlineData": {"mimeType": "image/jpeg", "data": InlineFile(blob)}},
+                      {"inlineData": {"mimeType": "image/png", "data": InlineFile(b"\x89PNG")}}]}
+
+
+def test_stream_body_is_the_json_of_the_materialized_payload(tmp_path):
+    payload = _payload(tmp_path)
+    body = JSONStreamBody(payload)
+    sync = b"".join(body)
+    assert json.loads(sync) == materialize(payload)
+    assert len(sync) == len(body) == int(body.headers()["Content-Length"])
+    assert b"".join(body) == sync   # re-iterable, e.g. for a retried request
+
+
+def test_async_stream_matches_sync(tmp_path):
+    body = JSONStreamBody(_payload(tmp_path))
+
+    async def drain():
+        return b"".join([c async for c in body])
+
+    assert asyncio.run(drain()) == b"".join(body)
+
+
+def _jpeg(path, size):
+    Image.new("RGB", size, (40, 120, 40)).save(path, format="JPEG")
+    return path
+
+
+def _decoded(part):
+    return Image.open(io.BytesIO(base64.b64decode(materialize(part)["inlineData"]["data"])))
+
+
+def test_large_image_is_downscaled(tmp_path):
+    part = inline_image(_jpeg(tmp_path / "big.jpg", (4000, 3000)), 1024)
+    assert part["inlineData"]["mimeType"] == "image/jpeg"
+    assert max(_decoded(part).size) <= 1024
+
+
+def test_small_image_and_zero_limit_send_the_file(tmp_path):
+    small = _jpeg(tmp_path / "small.jpg", (800, 600))
+    assert inline_image(small, 1024)["inlineData"]["data"].source == small
+    big = _jpeg(tmp_path / "big.jpg", (2000, 1500))
+    assert inline_image(big, 0)["inlineData"]["data"].source == big
+
+
+def test_unreadable_image_falls_back_to_the_file(tmp_path):
+    bad = tmp_path / "note.png"
+    bad.write_bytes(b"not an image")
+    part = inline_image(bad, 1024)
+    assert part["inlineData"]["mimeType"] == "image/png"
+    assert part["inlineData"]["data"].source == bad